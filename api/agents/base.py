@@ -1,33 +1,47 @@
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, AsyncIterator, List
 from pydantic import BaseModel
 from tenacity import retry, stop_after_attempt, wait_exponential
 from crewai import Agent, Task
 import logging
+from services.metrics import record_llm_usage, record_retry, record_prompt_savings
+from .prompts import CONTEXT_BUDGETS, build_system_prefix, fit_context
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+DEFAULT_MAX_TOKENS = 4096
+
 class AgentParameters(BaseModel):
     temperature: float = 0.7
     max_tokens: Optional[int] = None
     top_p: float = 1.0
     frequency_penalty: float = 0.0
     presence_penalty: float = 0.0
+    # "economy" sends the agent's calls to each provider's cheaper model
+    model_tier: str = "standard"
 
 class BaseAgent:
+    # Output format every call of the agent asks for. It belongs to the stable
+    # system prefix rather than to each task, so a provider can cache it.
+    instructions: str = ""
+
     def __init__(
         self,
         name: str,
         role: str,
         goal: str,
         backstory: str,
-        parameters: AgentParameters = AgentParameters()
+        parameters: AgentParameters = AgentParameters(),
+        llm_router: Optional[Any] = None
     ):
         self.name = name
         self.role = role
         self.goal = goal
         self.backstory = backstory
         self.parameters = parameters
+        # An LLMRouter over one or more providers; without one tasks run through CrewAI
+        self.llm_router = llm_router
+        self.system_prefix = build_system_prefix(role, goal, backstory, self.instructions)
         self.agent = self._create_agent()
 
     def _create_agent(self) -> Agent:
@@ -50,16 +64,94 @@ class BaseAgent:
             logger.error(f"Error creating agent {self.name}: {str(e)}")
             raise
 
+    def context(self, value: Any, budget: str) -> str:
+        # Upstream outputs are passed as budgeted summaries, not raw dumps
+        text, saved = fit_context(value, CONTEXT_BUDGETS[budget])
+        record_prompt_savings(self.name, "context_budget", saved)
+        return text
+
+    def _task(self, prompt: str) -> Task:
+        # CrewAI adds role, goal and backstory itself, but not the instructions
+        return self.agent.create_task(description=f"{prompt}\n\n{self.instructions}")
+
+    def _llm_options(self) -> Dict[str, Any]:
+        return {
+            "max_tokens": self.parameters.max_tokens or DEFAULT_MAX_TOKENS,
+            "temperature": self.parameters.temperature,
+            "top_p": self.parameters.top_p,
+            "frequency_penalty": self.parameters.frequency_penalty,
+            "presence_penalty": self.parameters.presence_penalty,
+            "tier": self.parameters.model_tier,
+        }
+
+    async def run_prompt(self, prompt: str) -> Dict[str, Any]:
+        if self.llm_router is None:
+            return await self.execute_task(self._task(prompt))
+        # No retry sleep here: the router fails over to another provider instead
+        try:
+            logger.info(f"Agent {self.name} sending prompt")
+            response = await self.llm_router.complete(self.system_prefix, prompt, self._llm_options())
+            record_llm_usage(self.name, prompt, response.text, usage=response.usage)
+            logger.info(f"Agent {self.name} completed task successfully via {response.provider}")
+            return {"status": "success", "result": response.text}
+        except Exception as e:
+            logger.error(f"Error executing task with agent {self.name}: {str(e)}")
+            raise
+
     @retry(
         stop=stop_after_attempt(3),
-        wait=wait_exponential(multiplier=1, min=4, max=10)
+        wait=wait_exponential(multiplier=1, min=4, max=10),
+        before_sleep=record_retry
     )
     async def execute_task(self, task: Task) -> Dict[str, Any]:
         try:
             logger.info(f"Agent {self.name} executing task: {task.description}")
             result = await self.agent.execute(task)
+            record_llm_usage(self.name, task.description, result)
             logger.info(f"Agent {self.name} completed task successfully")
             return {"status": "success", "result": result}
         except Exception as e:
             logger.error(f"Error executing task with agent {self.name}: {str(e)}")
-            raise
\ No newline at end of file
+            raise
+
+    async def stream_prompt(self, prompt: str) -> AsyncIterator[str]:
+        if self.llm_router is not None:
+            logger.info(f"Agent {self.name} streaming prompt")
+            completion = []
+            usage = None
+            try:
+                async for chunk in self.llm_router.stream(self.system_prefix, prompt, self._llm_options()):
+                    # Providers that report usage send it after the last text chunk
+                    if isinstance(chunk, str):
+                        completion.append(chunk)
+                        yield chunk
+                    else:
+                        usage = chunk
+                record_llm_usage(self.name, prompt, "".join(completion), usage=usage)
+                logger.info(f"Agent {self.name} finished streaming task successfully")
+            except Exception as e:
+                logger.error(f"Error streaming task with agent {self.name}: {str(e)}")
+                raise
+            return
+
+        llm = getattr(self.agent, "llm", None)
+        if llm is None or not hasattr(llm, "astream"):
+            # No streaming-capable model behind this agent; yield the whole completion
+            result = await self.run_prompt(prompt)
+            yield str(result["result"])
+            return
+
+        logger.info(f"Agent {self.name} streaming prompt")
+        messages: List[Any] = [("system", self.system_prefix), ("human", prompt)]
+        completion = []
+        try:
+            async for chunk in llm.astream(messages):
+                text = getattr(chunk, "content", chunk)
+                if text:
+                    completion.append(text)
+                    yield text
+            record_llm_usage(self.name, messages, "".join(completion))
+            logger.info(f"Agent {self.name} finished streaming task successfully")
+        except Exception as e:
+            logger.error(f"Error streaming task with agent {self.name}: {str(e)}")
+            raise
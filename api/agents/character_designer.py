@@ -1,14 +1,23 @@
 from .base import BaseAgent, AgentParameters
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
 
 class CharacterDesigner(BaseAgent):
-    def __init__(self, parameters: Dict[str, Any] = None):
+    instructions = """For each character provide:
+1. Name and role
+2. Physical description
+3. Personality traits
+4. Background story
+5. Character arc
+6. Relationships with other characters"""
+
+    def __init__(self, parameters: Dict[str, Any] = None, llm_router: Optional[Any] = None):
         super().__init__(
             name="Character Designer",
             role="Character Development Specialist",
             goal="Create diverse and engaging characters",
             backstory="Expert in designing memorable characters for children's stories",
-            parameters=AgentParameters(**(parameters or {}))
+            parameters=AgentParameters(**(parameters or {})),
+            llm_router=llm_router
         )
 
     async def design_characters(
@@ -17,20 +26,24 @@ class CharacterDesigner(BaseAgent):
         diversity_options: List[str],
         story_context: str
     ) -> Dict[str, Any]:
-        task = self.agent.create_task(
-            description=f"""
-            Design story characters with:
-            - Character Type: {character_type}
-            - Diversity Options: {', '.join(diversity_options)}
-            - Story Context: {story_context}
-            
-            For each character provide:
-            1. Name and role
-            2. Physical description
-            3. Personality traits
-            4. Background story
-            5. Character arc
-            6. Relationships with other characters
-            """
-        )
-        return await self.execute_task(task)
\ No newline at end of file
+        return await self.run_prompt(f"""Design story characters with:
+- Character Type: {character_type}
+- Diversity Options: {', '.join(diversity_options)}
+- Story Context:
+{self.context(story_context, "outline")}""")
+
+    async def redesign_character(
+        self,
+        name: str,
+        characters: str,
+        story_context: str,
+        instructions: Optional[str] = None
+    ) -> Dict[str, Any]:
+        # One call that rewrites a single character and keeps the rest verbatim
+        return await self.run_prompt(f"""Redesign the character "{name}" in this character set.
+Return the complete set with every other character copied unchanged.
+{f"- Requested changes: {instructions}" if instructions else ""}
+- Story Context:
+{self.context(story_context, "outline")}
+- Current Characters:
+{characters}""")
@@ -1,29 +1,26 @@
 from .base import BaseAgent, AgentParameters
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 
 class CulturalValidator(BaseAgent):
-    def __init__(self, parameters: Dict[str, Any] = None):
+    instructions = """Check:
+1. Cultural accuracy
+2. Traditional elements
+3. Language usage
+4. Historical context"""
+
+    def __init__(self, parameters: Dict[str, Any] = None, llm_router: Optional[Any] = None):
         super().__init__(
             name="Cultural Validator",
             role="Cultural Authenticity Expert",
             goal="Ensure cultural accuracy and representation",
             backstory="Deep knowledge of African cultures and traditions",
-            parameters=AgentParameters(**(parameters or {}))
+            parameters=AgentParameters(**(parameters or {})),
+            llm_router=llm_router
         )
 
     async def validate_content(self, content: str, region: str, accuracy_level: str) -> Dict[str, Any]:
-        task = self.agent.create_task(
-            description=f"""
-            Validate cultural authenticity for:
-            - Content: {content}
-            - Region: {region}
-            - Required Accuracy: {accuracy_level}
-            
-            Check:
-            1. Cultural accuracy
-            2. Traditional elements
-            3. Language usage
-            4. Historical context
-            """
-        )
-        return await self.execute_task(task)
\ No newline at end of file
+        return await self.run_prompt(f"""Validate cultural authenticity for:
+- Region: {region}
+- Required Accuracy: {accuracy_level}
+- Content:
+{self.context(content, "content")}""")
@@ -1,16 +1,39 @@
 from .base import BaseAgent, AgentParameters
-from typing import Dict, Any
+from typing import Dict, Any, AsyncIterator, Optional
 
 class PlotStrategist(BaseAgent):
-    def __init__(self, parameters: Dict[str, Any] = None):
+    instructions = """Provide:
+1. Detailed scene breakdown
+2. Plot points and transitions
+3. Character interactions
+4. Conflict development
+5. Resolution pathway"""
+
+    def __init__(self, parameters: Dict[str, Any] = None, llm_router: Optional[Any] = None):
         super().__init__(
             name="Plot Strategist",
             role="Narrative Flow Expert",
             goal="Craft engaging plot structures",
             backstory="Specialist in creating compelling story arcs",
-            parameters=AgentParameters(**(parameters or {}))
+            parameters=AgentParameters(**(parameters or {})),
+            llm_router=llm_router
         )
 
+    def _plot_prompt(
+        self,
+        complexity: str,
+        arc_type: str,
+        outline: str,
+        characters: Dict[str, Any]
+    ) -> str:
+        return f"""Develop detailed plot with:
+- Complexity Level: {complexity}
+- Arc Type: {arc_type}
+- Story Outline:
+{self.context(outline, "outline")}
+- Characters:
+{self.context(characters, "characters")}"""
+
     async def develop_plot(
         self,
         complexity: str,
@@ -18,20 +41,14 @@ class PlotStrategist(BaseAgent):
         outline: str,
         characters: Dict[str, Any]
     ) -> Dict[str, Any]:
-        task = self.agent.create_task(
-            description=f"""
-            Develop detailed plot with:
-            - Complexity Level: {complexity}
-            - Arc Type: {arc_type}
-            - Story Outline: {outline}
-            - Characters: {characters}
-            
-            Provide:
-            1. Detailed scene breakdown
-            2. Plot points and transitions
-            3. Character interactions
-            4. Conflict development
-            5. Resolution pathway
-            """
-        )
-        return await self.execute_task(task)
\ No newline at end of file
+        return await self.run_prompt(self._plot_prompt(complexity, arc_type, outline, characters))
+
+    async def stream_plot(
+        self,
+        complexity: str,
+        arc_type: str,
+        outline: str,
+        characters: Dict[str, Any]
+    ) -> AsyncIterator[str]:
+        async for chunk in self.stream_prompt(self._plot_prompt(complexity, arc_type, outline, characters)):
+            yield chunk
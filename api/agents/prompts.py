@@ -0,0 +1,80 @@
+import os
+import re
+from typing import Dict, Any, List, Tuple
+from services.metrics import estimate_tokens
+
+# Upper bounds, in tokens, for upstream outputs embedded in downstream prompts
+CONTEXT_BUDGETS = {
+    "outline": int(os.getenv("PROMPT_BUDGET_OUTLINE", "800")),
+    "characters": int(os.getenv("PROMPT_BUDGET_CHARACTERS", "600")),
+    "content": int(os.getenv("PROMPT_BUDGET_CONTENT", "1500")),
+}
+
+STRUCTURAL_LINE = re.compile(r"^(#{1,6}\s|\d+[.)]\s|[-*•]\s|[A-Z][\w '/-]{0,40}:)")
+SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+
+def build_system_prefix(role: str, goal: str, backstory: str, instructions: str = "") -> str:
+    # Byte-identical for every call of an agent so providers can cache it;
+    # nothing request-specific may go in here
+    parts = [f"You are a {role}. {backstory}. Your goal: {goal}."]
+    if instructions:
+        parts.append(instructions.strip())
+    return "\n\n".join(parts)
+
+
+def _first_sentence(line: str) -> str:
+    # A leading "1." or "Scene:" marker is not a sentence of its own
+    marker = STRUCTURAL_LINE.match(line)
+    prefix = marker.group(0) if marker else ""
+    return prefix + SENTENCE_END.split(line[len(prefix):], 1)[0]
+
+
+def _flatten(value: Any, path: str = "") -> List[str]:
+    # Nested dicts and lists become "a / b: leaf" lines instead of a Python repr
+    if isinstance(value, dict):
+        lines = []
+        for key, item in value.items():
+            lines += _flatten(item, f"{path} / {key}" if path else str(key))
+        return lines
+    if isinstance(value, (list, tuple)):
+        lines = []
+        for item in value:
+            lines += [f"- {line}" for line in _flatten(item)] if not path else _flatten(item, path)
+        return lines
+    text = re.sub(r"\s+", " ", str(value)).strip()
+    return [f"{path}: {text}" if path else text]
+
+
+def summarize_text(text: str, budget: int) -> str:
+    # Extractive and deterministic, so identical inputs give identical prompts:
+    # structural lines (headings, numbered or bulleted items, "Label:" lines)
+    # are kept first, then the opening sentence of other paragraphs, always in
+    # their original order, until the budget is spent
+    lines = [re.sub(r"[ \t]+", " ", line).strip() for line in text.splitlines()]
+    lines = [line for line in lines if line]
+    compact = "\n".join(lines)
+    if estimate_tokens(compact) <= budget:
+        return compact
+
+    ranked = sorted(range(len(lines)), key=lambda i: (not STRUCTURAL_LINE.match(lines[i]), i))
+    chosen: Dict[int, str] = {}
+    used = 0
+    for index in ranked:
+        line = _first_sentence(lines[index])
+        cost = estimate_tokens(line)
+        if used + cost > budget:
+            continue
+        chosen[index] = line
+        used += cost
+    if not chosen:
+        return compact[:budget * 4]
+    return "\n".join(chosen[index] for index in sorted(chosen))
+
+
+def fit_context(value: Any, budget: int) -> Tuple[str, int]:
+    # Returns the budgeted text and the tokens saved against embedding the raw
+    # value with str(), which is what the prompts used to do
+    text = value if isinstance(value, str) else "\n".join(_flatten(value))
+    fitted = summarize_text(text, budget)
+    return fitted, max(0, estimate_tokens(str(value)) - estimate_tokens(fitted))
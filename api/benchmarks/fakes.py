@@ -0,0 +1,215 @@
+import asyncio
+import io
+import random
+import time
+from typing import Dict, Any, List, AsyncIterator, Optional, Tuple
+from PIL import Image
+from services.llm_router import LLMProvider, LLMResponse, LLMUsage
+
+
+class LatencyModel:
+    # Log-normal latency around a mean, plus an independent failure rate
+    def __init__(self, mean: float, sigma: float = 0.35, error_rate: float = 0.0, seed: int = 0):
+        self.mean = mean
+        self.sigma = sigma
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+
+    def sample(self) -> float:
+        if self.mean <= 0:
+            return 0.0
+        # The -sigma^2/2 shift keeps the distribution's mean at `mean`
+        return self.mean * self.random.lognormvariate(-self.sigma ** 2 / 2, self.sigma)
+
+    def should_fail(self) -> bool:
+        return self.random.random() < self.error_rate
+
+    async def wait(self, label: str) -> None:
+        await asyncio.sleep(self.sample())
+        if self.should_fail():
+            raise RuntimeError(f"Injected failure in {label}")
+
+
+class FakeParameters:
+    def __init__(self, **values: Any):
+        self.values = values
+
+    def model_dump(self) -> Dict[str, Any]:
+        return dict(self.values)
+
+
+class FakeAgent:
+    # With a router, the canned text is sent through it as the prompt (to an
+    # echoing FakeProvider) so routing and batching are exercised
+    def __init__(self, name: str, latency: LatencyModel, router: Optional[Any] = None):
+        self.name = name
+        self.latency = latency
+        self.router = router
+        self.parameters = FakeParameters(temperature=0.7)
+
+    async def _complete(self, text: str) -> Dict[str, Any]:
+        if self.router is not None:
+            response = await self.router.complete(self.name, text, {})
+            return {"status": "success", "result": response.text}
+        await self.latency.wait(self.name)
+        return {"status": "success", "result": text}
+
+
+class FakeNarrativeArchitect(FakeAgent):
+    async def generate_outline(self, theme: str, age_group: str, tone: str) -> Dict[str, Any]:
+        return await self._complete(
+            f"Premise: a {tone} story about {theme} for ages {age_group}.\n\n"
+            "Plot points: the call, the journey, the return.\n\n"
+            "Key scenes: village, river, forest, homecoming."
+        )
+
+
+class FakeCulturalValidator(FakeAgent):
+    async def validate_content(self, content: str, region: str, accuracy_level: str) -> Dict[str, Any]:
+        return await self._complete(f"Validated for {region} at {accuracy_level} accuracy.")
+
+
+class FakeCharacterDesigner(FakeAgent):
+    async def design_characters(self, character_type: str, diversity_options: List[str], story_context: str) -> Dict[str, Any]:
+        return await self._complete(f"Characters ({character_type}): Amara, Kofi, the wise tortoise.")
+
+    async def redesign_character(self, name: str, characters: str, story_context: str, instructions: str = None) -> Dict[str, Any]:
+        return await self._complete(f"{characters} ({name} redesigned{': ' + instructions if instructions else ''})")
+
+
+class FakePlotStrategist(FakeAgent):
+    def __init__(self, name: str, latency: LatencyModel, scenes: int = 6, router: Optional[Any] = None):
+        super().__init__(name, latency, router)
+        self.scenes = scenes
+
+    def _plot(self, complexity: str, arc_type: str) -> str:
+        blocks = [f"Plot ({complexity}, {arc_type})"]
+        blocks += [f"Scene: {i + 1}. Amara and Kofi reach landmark {i + 1}." for i in range(self.scenes)]
+        return "\n\n".join(blocks)
+
+    async def develop_plot(self, complexity: str, arc_type: str, outline: str, characters: Any) -> Dict[str, Any]:
+        return await self._complete(self._plot(complexity, arc_type))
+
+    async def stream_plot(self, complexity: str, arc_type: str, outline: str, characters: Any) -> AsyncIterator[str]:
+        text = self._plot(complexity, arc_type)
+        if self.router is not None:
+            async for chunk in self.router.stream(self.name, text, {}):
+                if isinstance(chunk, str):
+                    yield chunk
+            return
+        # Spread the completion latency evenly over the streamed blocks
+        chunks = [block + "\n\n" for block in text.split("\n\n")]
+        delay = self.latency.sample() / len(chunks)
+        for chunk in chunks:
+            await asyncio.sleep(delay)
+            yield chunk
+        if self.latency.should_fail():
+            raise RuntimeError(f"Injected failure in {self.name}")
+
+
+class FakeProvider(LLMProvider):
+    # An LLM provider with injected latency and failures, for router tests.
+    # Without a fixed text it answers with the prompt.
+    def __init__(self, name: str, latency: LatencyModel, text: Optional[str] = "ok", chunks: int = 4):
+        self.name = name
+        self.latency = latency
+        self.text = text
+        self.chunks = chunks
+        self.calls = 0
+        self.cancelled = 0
+
+    def _text(self, prompt: str) -> str:
+        return prompt if self.text is None else self.text
+
+    def _usage(self, prompt: str) -> LLMUsage:
+        return LLMUsage(len(prompt) // 4, len(self._text(prompt)) // 4)
+
+    async def complete(self, system: str, prompt: str, options: Dict[str, Any]) -> LLMResponse:
+        self.calls += 1
+        try:
+            await self.latency.wait(self.name)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        return LLMResponse(self._text(prompt), self._usage(prompt), self.name)
+
+    async def stream(self, system: str, prompt: str, options: Dict[str, Any]) -> AsyncIterator[Any]:
+        self.calls += 1
+        text = self._text(prompt)
+        size = max(1, len(text) // self.chunks)
+        delay = self.latency.sample()
+        try:
+            # Most of the latency is time to first token
+            await asyncio.sleep(delay * 0.8)
+            if self.latency.should_fail():
+                raise RuntimeError(f"Injected failure in {self.name}")
+            for start in range(0, len(text), size):
+                await asyncio.sleep(delay * 0.2 / self.chunks)
+                yield text[start:start + size]
+        except (asyncio.CancelledError, GeneratorExit):
+            self.cancelled += 1
+            raise
+        yield self._usage(prompt)
+
+
+class FakeBatchProvider(FakeProvider):
+    # Emulates Message Batches: a batch of any size finishes after one
+    # turnaround latency, and each request can fail on its own
+    supports_batch = True
+
+    def __init__(self, name: str, latency: LatencyModel, turnaround: LatencyModel, text: Optional[str] = None):
+        super().__init__(name, latency, text)
+        self.turnaround = turnaround
+        self.batches: Dict[str, Tuple[float, Dict[str, Tuple[str, str, Dict[str, Any]]]]] = {}
+        self.batched_requests = 0
+
+    async def submit_batch(self, requests: Dict[str, Tuple[str, str, Dict[str, Any]]]) -> str:
+        batch_id = f"msgbatch_{len(self.batches) + 1}"
+        self.batches[batch_id] = (time.monotonic() + self.turnaround.sample(), dict(requests))
+        self.batched_requests += len(requests)
+        return batch_id
+
+    async def batch_results(self, batch_id: str) -> Optional[Dict[str, Any]]:
+        ready_at, requests = self.batches[batch_id]
+        if time.monotonic() < ready_at:
+            return None
+        results: Dict[str, Any] = {}
+        for custom_id, (system, prompt, options) in requests.items():
+            if self.turnaround.should_fail():
+                results[custom_id] = RuntimeError("Batch request errored")
+                continue
+            usage = self._usage(prompt)
+            usage.batch = True
+            results[custom_id] = LLMResponse(self._text(prompt), usage, self.name)
+        return results
+
+
+def _placeholder_png(size: int = 64) -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (size, size), (200, 120, 40)).save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+class FakeImageGenerator:
+    def __init__(self, latency: Dict[str, LatencyModel]):
+        self.latency = latency
+        self.image = _placeholder_png()
+
+    async def generate_illustration(
+        self,
+        prompt: str,
+        style: Dict[str, Any],
+        engine: str = "dalle",
+        with_retries: bool = True
+    ) -> bytes:
+        await self.latency["dalle" if engine == "dalle" else "stability"].wait(f"image:{engine}")
+        return self.image
+
+
+def fake_agents(latency: LatencyModel, scenes: int, router: Optional[Any] = None) -> Dict[str, Any]:
+    return {
+        "narrative_architect": FakeNarrativeArchitect("Narrative Architect", latency, router),
+        "cultural_validator": FakeCulturalValidator("Cultural Validator", latency, router),
+        "character_designer": FakeCharacterDesigner("Character Designer", latency, router),
+        "plot_strategist": FakePlotStrategist("Plot Strategist", latency, scenes, router),
+    }
@@ -0,0 +1,331 @@
+import argparse
+import asyncio
+import json
+import os
+import platform
+import resource
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.admission import AdmissionController
+from services.asset_manager import AssetManager
+from services.blob_store import BlobStore
+from services.cache import ResultCache, MemoryCacheBackend
+from services.llm_batch import LLMBatcher
+from services.llm_router import LLMRouter
+from services.loop_monitor import LoopLagMonitor
+from services.rate_limiter import EngineLimits, EngineLimiter
+from services.story_batch import StoryBatchRunner
+from services.story_pipeline import StoryPipeline
+from services.story_writer import StoryWriter
+from benchmarks.fakes import LatencyModel, FakeImageGenerator, FakeBatchProvider, fake_agents
+from mongomock_motor import AsyncMongoMockClient
+
+# Offline benchmark for StoryPipeline: fake agents and image engines with
+# configurable latency/error distributions, mongomock Mongo and an in-memory cache.
+#
+#   python -m benchmarks.run --stories 200 --concurrency 20 --output bench.json
+#   python -m benchmarks.run --compare bench.json
+#   python -m benchmarks.run --stories 200 --batch   # one StoryBatchRunner batch
+
+
+class BenchmarkPipeline(StoryPipeline):
+    def __init__(self, *args: Any, agents: Dict[str, Any], **kwargs: Any):
+        self._fake_agents = agents
+        super().__init__(*args, **kwargs)
+
+    def _agent(self, role: str, parameters: Dict[str, Any]) -> Any:
+        return self._fake_agents[role]
+
+
+def story_parameters(index: int, duplicate_ratio: float) -> Dict[str, Any]:
+    # A share of requests repeat earlier parameters to exercise the caches
+    variant = 0 if (index % 100) < duplicate_ratio * 100 else index
+    return {
+        "theme": f"Folktale {variant}",
+        "age_group": "6-8",
+        "tone": "Lighthearted",
+        "region": "West Africa",
+        "accuracy": "High",
+        "character_type": "Animals",
+        "diversity_options": ["Gender", "Age"],
+        "complexity": "Medium",
+        "arc_type": "Hero's Journey",
+        "illustration_style": {"engine": "dalle" if index % 2 == 0 else "stable-diffusion"},
+    }
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if platform.system() == "Darwin" else 1024), 1)
+
+
+def build_pipeline(
+    args: argparse.Namespace,
+    mongo_client: AsyncMongoMockClient,
+    asset_dir: str,
+    router: Optional[LLMRouter] = None
+) -> StoryPipeline:
+    llm_latency = LatencyModel(args.llm_latency, args.latency_sigma, args.llm_error_rate, args.seed)
+    image_latency = {
+        "dalle": LatencyModel(args.image_latency, args.latency_sigma, args.image_error_rate, args.seed + 1),
+        "stability": LatencyModel(args.image_latency, args.latency_sigma, args.image_error_rate, args.seed + 2),
+    }
+    asset_manager = AssetManager(
+        mongo_client,
+        blob_store=BlobStore(mongo_client.african_stories, os.path.join(asset_dir, "blobs"))
+    )
+    asset_manager.asset_dir = asset_dir
+    engine_limits = EngineLimits({
+        "dalle": EngineLimiter(args.image_concurrency, args.image_rpm),
+        "stability": EngineLimiter(args.image_concurrency, args.image_rpm),
+    })
+    return BenchmarkPipeline(
+        mongo_client,
+        ResultCache(MemoryCacheBackend()),
+        FakeImageGenerator(image_latency),
+        asset_manager,
+        engine_limits=engine_limits,
+        writer=StoryWriter(mongo_client.african_stories, durability=args.durability),
+        stream_plot=not args.no_stream,
+        agents=fake_agents(llm_latency, args.scenes, router),
+    )
+
+
+async def drive_pipeline(
+    pipeline: StoryPipeline,
+    parameters: Dict[str, Any],
+    admission: Optional[AdmissionController] = None,
+    tenant: str = "bench"
+) -> None:
+    if admission is None:
+        await pipeline.generate_story(parameters)
+        return
+    async with admission.admit(tenant) as granted:
+        await pipeline.generate_story(granted.apply(parameters))
+
+
+async def drive_api(client: Any, parameters: Dict[str, Any]) -> None:
+    response = await client.post("/api/story/generate", json=parameters, timeout=None)
+    response.raise_for_status()
+
+
+def build_admission(args: argparse.Namespace) -> Optional[AdmissionController]:
+    if args.admission_in_flight <= 0:
+        return None
+    return AdmissionController(
+        max_in_flight=args.admission_in_flight,
+        max_queue=args.admission_queue,
+        max_wait=args.admission_max_wait,
+        # Seeded with a story's rough duration until real ones are measured
+        expected_duration=args.llm_latency * 3 + args.image_latency
+    )
+
+
+def build_batch_router(args: argparse.Namespace) -> LLMRouter:
+    # Batch turnaround stands in for the provider's queueing of a whole batch
+    return LLMRouter([FakeBatchProvider(
+        "fake-batch",
+        LatencyModel(args.llm_latency, args.latency_sigma, args.llm_error_rate, args.seed + 3),
+        LatencyModel(args.batch_turnaround, args.latency_sigma, args.llm_error_rate, args.seed + 4)
+    )], hedge=False)
+
+
+async def run_batch(
+    args: argparse.Namespace,
+    pipeline: StoryPipeline,
+    router: LLMRouter,
+    admission: Optional[AdmissionController] = None
+) -> List[float]:
+    batcher = LLMBatcher(
+        router,
+        pipeline.db,
+        window=args.batch_window,
+        poll_interval=args.batch_poll_interval
+    )
+    runner = StoryBatchRunner(
+        pipeline,
+        batcher,
+        max_concurrency=args.concurrency,
+        max_stories=args.stories,
+        admission=admission
+    )
+    batch_id = await runner.create([story_parameters(i, args.duplicate_ratio) for i in range(args.stories)])
+    await runner.run(batch_id)
+    pipeline.batch_stats = {**batcher.stats(), "provider_batched_requests": router.providers[0].batched_requests}
+    # Every story of the batch starts with it, so its total time is its latency
+    return [
+        story["timings"]["total_ms"] / 1000
+        async for story in pipeline.db.stories.find({"status": "completed"})
+    ]
+
+
+async def run_benchmark(args: argparse.Namespace) -> Dict[str, Any]:
+    mongo_client = AsyncMongoMockClient()
+    asset_dir = tempfile.mkdtemp(prefix="story-bench-")
+    router = build_batch_router(args) if args.batch else None
+    pipeline = build_pipeline(args, mongo_client, asset_dir, router)
+
+    admission = build_admission(args)
+    clients: Dict[str, Any] = {}
+    if args.target == "api":
+        # Route the real FastAPI app onto the fake pipeline and in-memory Mongo
+        import httpx
+        import main
+        main.story_pipeline = pipeline
+        main.mongo_client = mongo_client
+        main.asset_manager = pipeline.asset_manager
+        # Unlimited unless --admission-in-flight is given
+        main.admission = admission or AdmissionController(max_in_flight=args.stories, max_queue=args.stories)
+        # Tenants are told apart by client address
+        clients = {
+            f"tenant-{index}": httpx.AsyncClient(
+                transport=httpx.ASGITransport(app=main.app, client=(f"10.0.{index // 256}.{index % 256}", 50000)),
+                base_url="http://bench"
+            )
+            for index in range(args.tenants)
+        }
+
+    monitor = LoopLagMonitor(interval=0.01, warn_threshold=float("inf"))
+    monitor.start()
+    semaphore = asyncio.Semaphore(args.concurrency)
+    latencies: List[float] = []
+    failures: Dict[str, int] = {}
+
+    async def one_story(index: int) -> None:
+        async with semaphore:
+            parameters = story_parameters(index, args.duplicate_ratio)
+            tenant = f"tenant-{index % args.tenants}"
+            started = time.monotonic()
+            try:
+                if clients:
+                    await drive_api(clients[tenant], parameters)
+                else:
+                    await drive_pipeline(pipeline, parameters, admission, tenant)
+                latencies.append(time.monotonic() - started)
+            except Exception as e:
+                failures[type(e).__name__] = failures.get(type(e).__name__, 0) + 1
+
+    started = time.monotonic()
+    if router is not None:
+        latencies = await run_batch(args, pipeline, router, admission)
+        failures = {"StoryFailed": args.stories - len(latencies)} if len(latencies) < args.stories else {}
+    else:
+        await asyncio.gather(*(one_story(i) for i in range(args.stories)))
+    elapsed = time.monotonic() - started
+    await monitor.stop()
+    for client in clients.values():
+        await client.aclose()
+
+    # Average per-stage breakdown from the timings stored on each story
+    stage_totals: Dict[str, List[int]] = {}
+    async for story in mongo_client.african_stories.stories.find({"status": "completed"}):
+        for stage, ms in story.get("timings", {}).get("stages_ms", {}).items():
+            stage_totals.setdefault(stage, []).append(ms)
+
+    latencies_ms = [latency * 1000 for latency in latencies]
+    return {
+        "created_at": datetime.utcnow().isoformat(),
+        "config": vars(args),
+        "results": {
+            "completed": len(latencies),
+            "failed": sum(failures.values()),
+            "failures": failures,
+            "wall_seconds": round(elapsed, 3),
+            "stories_per_minute": round(len(latencies) / elapsed * 60, 2) if elapsed else 0.0,
+            "latency_ms": {
+                "p50": round(percentile(latencies_ms, 50), 1),
+                "p95": round(percentile(latencies_ms, 95), 1),
+                "p99": round(percentile(latencies_ms, 99), 1),
+                "mean": round(statistics.fmean(latencies_ms), 1) if latencies_ms else 0.0,
+                "max": round(max(latencies_ms), 1) if latencies_ms else 0.0,
+            },
+            "stage_mean_ms": {
+                stage: round(statistics.fmean(values), 1) for stage, values in sorted(stage_totals.items())
+            },
+            "event_loop": monitor.stats(),
+            "coalescing": {
+                "story": pipeline.story_flights.stats(),
+                "stage": pipeline.stage_memo.flights.stats(),
+            },
+            "llm_batch": getattr(pipeline, "batch_stats", None),
+            "admission": admission.stats() if admission is not None else None,
+            "peak_rss_mb": peak_rss_mb(),
+        },
+    }
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any]) -> None:
+    rows = [
+        ("stories_per_minute", current["results"]["stories_per_minute"], baseline["results"]["stories_per_minute"]),
+        ("p50_ms", current["results"]["latency_ms"]["p50"], baseline["results"]["latency_ms"]["p50"]),
+        ("p95_ms", current["results"]["latency_ms"]["p95"], baseline["results"]["latency_ms"]["p95"]),
+        ("p99_ms", current["results"]["latency_ms"]["p99"], baseline["results"]["latency_ms"]["p99"]),
+        ("max_loop_lag_ms", current["results"]["event_loop"]["max_lag_ms"], baseline["results"]["event_loop"]["max_lag_ms"]),
+        ("peak_rss_mb", current["results"]["peak_rss_mb"], baseline["results"]["peak_rss_mb"]),
+    ]
+    print(f"{'metric':<22}{'baseline':>12}{'current':>12}{'change':>10}")
+    for name, now, before in rows:
+        change = f"{(now - before) / before * 100:+.1f}%" if before else "n/a"
+        print(f"{name:<22}{before:>12}{now:>12}{change:>10}")
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Offline StoryPipeline benchmark")
+    parser.add_argument("--target", choices=["pipeline", "api"], default="pipeline")
+    parser.add_argument("--stories", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--scenes", type=int, default=6)
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="mean seconds per agent call")
+    parser.add_argument("--image-latency", type=float, default=1.0, help="mean seconds per image call")
+    parser.add_argument("--latency-sigma", type=float, default=0.35)
+    parser.add_argument("--llm-error-rate", type=float, default=0.0)
+    parser.add_argument("--image-error-rate", type=float, default=0.0)
+    parser.add_argument("--image-concurrency", type=int, default=8)
+    parser.add_argument("--image-rpm", type=float, default=6000)
+    parser.add_argument("--duplicate-ratio", type=float, default=0.0)
+    parser.add_argument("--durability", choices=["stage", "coalesced", "final"], default="stage")
+    parser.add_argument("--no-stream", action="store_true", help="disable plot streaming")
+    parser.add_argument("--tenants", type=int, default=1, help="spread requests round-robin over this many tenants")
+    parser.add_argument("--admission-in-flight", type=int, default=0, help="admission control slots (0 disables it)")
+    parser.add_argument("--admission-queue", type=int, default=64)
+    parser.add_argument("--admission-max-wait", type=float, default=60.0)
+    parser.add_argument("--batch", action="store_true", help="run all stories as one batch with batched agent calls")
+    parser.add_argument("--batch-turnaround", type=float, default=1.0, help="mean seconds for a provider batch to finish")
+    parser.add_argument("--batch-window", type=float, default=0.05, help="seconds without new calls before a batch is sent")
+    parser.add_argument("--batch-poll-interval", type=float, default=0.05)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="write results JSON to this path")
+    parser.add_argument("--compare", help="baseline results JSON to compare against")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    args = parse_args(argv)
+    report = asyncio.run(run_benchmark(args))
+    print(json.dumps(report["results"], indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(report, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,40 @@
-from fastapi import FastAPI, HTTPException
-from crewai import Agent, Task, Crew, Process
+from services.startup import startup_report, LazyClient
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import StreamingResponse, Response, JSONResponse
+from prometheus_client import generate_latest, CONTENT_TYPE_LATEST
 from typing import Dict, List
-import anthropic
-import openai
 from motor.motor_asyncio import AsyncIOMotorClient
-from redis import Redis
+from bson import ObjectId
 from dotenv import load_dotenv
 import os
 import json
-from stability_sdk import client
-import stability_sdk.interfaces.gooseai.generation.generation_pb2 as generation
+import asyncio
+import orjson
 from services.story_pipeline import StoryPipeline
+from services.story_versions import StoryNotReady, StoryEditConflict
+from services.story_batch import StoryBatchRunner
+from services.admission import AdmissionController, AdmissionRejected, AdmissionTicket
+from services.llm_batch import LLMBatcher
+from services.agent_pool import AgentPool
+from services.llm_router import LLMRouter
 from services.image_generator import ImageGenerator
 from services.asset_manager import AssetManager
+from services.rate_limiter import EngineLimits
+from services.image_scheduler import ImageScheduler
+from services.loop_monitor import LoopLagMonitor
+from services.cache import ResultCache, RedisCacheBackend, Serializer, LRUCache
+from services.stage_memo import StageMemo
+from services.single_flight import SingleFlight, RedisLeaseStore
+from services.event_bus import StoryEventBus, RedisEventRelay
+from services.job_queue import RedisJobQueue
+from services.worker import StoryWorkerPool
+from services.story_writer import StoryWriter
+from services.file_serving import immutable_file_response
+from services.backup import BackupEngine
+from services.exporter import ExportEngine, EXPORT_FORMATS, EXPORT_NAME
+from services.pagination import stream_page, decode_cursor, STORY_VIEWS, ILLUSTRATION_VIEWS, VERSION_VIEWS
+from redis.asyncio import ConnectionPool, Redis
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 import logging
 from datetime import datetime
 
@@ -25,42 +47,403 @@ logger = logging.getLogger(__name__)
 
 app = FastAPI()
 
+startup_report.mark("imports")
+
+# SDK clients are imported and built on first use; most requests never touch
+# all of them, and their imports dominate cold start
+def create_claude_client():
+    import anthropic
+    return anthropic.Anthropic(api_key=os.getenv("ANTHROPIC_API_KEY"))
+
+def create_agent_llm_client():
+    import anthropic
+    return anthropic.AsyncAnthropic(api_key=os.getenv("ANTHROPIC_API_KEY"))
+
+def create_openai_client():
+    import openai
+    return openai.AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+
+def create_stability_client():
+    from stability_sdk import client
+    return client.StabilityInference(key=os.getenv("STABILITY_API_KEY"))
+
+def create_semantic_cache():
+    # Deferred with numpy, which only this tier needs
+    from services.semantic_cache import SemanticCache
+    return SemanticCache.from_env()
+
 # Initialize clients
-claude_client = anthropic.Anthropic(api_key=os.getenv("ANTHROPIC_API_KEY"))
-openai_client = openai.OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-stability_client = client.StabilityInference(key=os.getenv("STABILITY_API_KEY"))
+claude_client = LazyClient("anthropic", create_claude_client)
+openai_client = LazyClient("openai", create_openai_client)
+# AGENT_LLM=router sends agent prompts to the providers in LLM_PROVIDERS,
+# routed by latency and error rate with hedging and failover; the default
+# keeps them on CrewAI
+llm_router = (
+    LLMRouter.from_env({
+        "anthropic": LazyClient("anthropic_async", create_agent_llm_client),
+        "openai": openai_client,
+    })
+    if os.getenv("AGENT_LLM", "crewai") == "router"
+    else None
+)
+stability_client = LazyClient("stability", create_stability_client)
 mongo_client = AsyncIOMotorClient(os.getenv("MONGODB_URI"))
-redis_client = Redis(host='localhost', port=6379, db=0)
+redis_client = Redis(connection_pool=ConnectionPool.from_url(
+    os.getenv("REDIS_URL", "redis://localhost:6379/0"),
+    max_connections=int(os.getenv("REDIS_MAX_CONNECTIONS", "50"))
+))
+cache_backend = RedisCacheBackend(redis_client)
+cache_serializer = Serializer(
+    fmt=os.getenv("CACHE_SERIALIZER", "orjson"),
+    compress=os.getenv("CACHE_COMPRESSION", "zstd") == "zstd"
+)
+cache = ResultCache(
+    cache_backend,
+    serializer=cache_serializer,
+    local=LRUCache(max_entries=int(os.getenv("CACHE_LOCAL_ENTRIES", "1024")))
+)
+# Identical concurrent stories and stage calls run once; a Redis lease extends
+# this across workers, whose followers poll the cache for the leader's result
+flight_leases = RedisLeaseStore(redis_client, prefix="flight") if os.getenv("SINGLE_FLIGHT_REDIS", "1") == "1" else None
+flight_lease_ttl = float(os.getenv("SINGLE_FLIGHT_LEASE_TTL", "30"))
+# SEMANTIC_CACHE=1 lets outlines be reused for near-duplicate themes, matched
+# by embedding similarity; it stays off without sentence-transformers unless
+# SEMANTIC_CACHE_MODEL=hashed
+semantic_cache = create_semantic_cache() if os.getenv("SEMANTIC_CACHE", "0") == "1" else None
+# Agent stage outputs share the Redis pool but keep their own LRU tier and TTL
+stage_memo = StageMemo(
+    ResultCache(
+        cache_backend,
+        serializer=cache_serializer,
+        local=LRUCache(
+            max_entries=int(os.getenv("STAGE_CACHE_LOCAL_ENTRIES", "2048")),
+            ttl=int(os.getenv("STAGE_CACHE_LOCAL_TTL", "900"))
+        )
+    ),
+    expire=int(os.getenv("STAGE_CACHE_TTL", "86400")),
+    flights=SingleFlight("stage", flight_leases, lease_ttl=flight_lease_ttl),
+    semantic=semantic_cache
+)
+startup_report.mark("clients")
+
+# Blocking Stability gRPC calls run in threads; PIL work can use processes
+stability_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("STABILITY_THREADS", "8")),
+    thread_name_prefix="stability"
+)
+image_workers = int(os.getenv("IMAGE_WORKER_PROCESSES", "0"))
+image_executor = ProcessPoolExecutor(max_workers=image_workers) if image_workers > 0 else None
+rendition_workers = int(os.getenv("RENDITION_WORKER_PROCESSES", "2"))
+rendition_executor = ProcessPoolExecutor(max_workers=rendition_workers) if rendition_workers > 0 else None
+# PDF/EPUB rendering is CPU bound and can be long; it never runs on the loop
+export_workers = int(os.getenv("EXPORT_WORKER_PROCESSES", "2"))
+export_executor = ProcessPoolExecutor(max_workers=export_workers) if export_workers > 0 else None
+loop_monitor = LoopLagMonitor()
+
+# Events also go through Redis pub/sub, so stories run by standalone workers
+# (or another API worker) stream to subscribers on this one
+story_events = StoryEventBus(
+    relay=RedisEventRelay(redis_client) if os.getenv("STORY_EVENTS_REDIS", "1") == "1" else None
+)
+background_tasks = set()
 
 # Initialize services
-image_generator = ImageGenerator(openai_client, stability_client)
-asset_manager = AssetManager(mongo_client)
-story_pipeline = StoryPipeline(mongo_client, redis_client, image_generator, asset_manager)
+image_generator = ImageGenerator(
+    openai_client,
+    stability_client,
+    io_executor=stability_executor,
+    image_executor=image_executor
+)
+asset_manager = AssetManager(mongo_client, rendition_executor=rendition_executor)
+backup_engine = BackupEngine(
+    mongo_client.african_stories,
+    asset_dir=asset_manager.asset_dir,
+    root=os.getenv("BACKUP_DIR", "backups"),
+    segment_size=int(os.getenv("BACKUP_SEGMENT_SIZE", "1000"))
+)
+engine_limits = EngineLimits.from_env()
+export_engine = ExportEngine(
+    mongo_client.african_stories,
+    asset_manager.blob_store,
+    executor=export_executor,
+    root=os.getenv("EXPORT_DIR", "exports"),
+    max_bytes=int(os.getenv("EXPORT_CACHE_MAX_MB", "2048")) * 1024 * 1024
+)
+story_pipeline = StoryPipeline(
+    mongo_client,
+    cache,
+    image_generator,
+    asset_manager,
+    engine_limits=engine_limits,
+    image_scheduler=ImageScheduler.from_env(image_generator, engine_limits),
+    stage_memo=stage_memo,
+    events=story_events,
+    stream_plot=os.getenv("STREAM_PLOT", "1") == "1",
+    writer=StoryWriter(
+        mongo_client.african_stories,
+        durability=os.getenv("STORY_WRITE_DURABILITY", "stage"),
+        flush_interval=float(os.getenv("STORY_WRITE_FLUSH_INTERVAL", "2.0")),
+        illustration_batch_size=int(os.getenv("STORY_WRITE_ILLUSTRATION_BATCH", "8"))
+    ),
+    agent_pool=AgentPool(llm_router, max_agents=int(os.getenv("AGENT_POOL_SIZE", "32"))),
+    story_flights=SingleFlight("story", flight_leases, lease_ttl=flight_lease_ttl)
+)
+
+# Bounds the stories running in this worker; the rest queue per tenant, are
+# turned away with 429 + Retry-After, or are degraded as the load rises
+# Economy models are only reachable through the LLM router
+admission = AdmissionController.from_env(model_tiers=llm_router is not None)
+
+# Catalog batches advance their stories together and, with the LLM router,
+# send each wave of agent calls as one provider batch (Anthropic Message
+# Batches), checkpointed in Mongo
+batch_runner = StoryBatchRunner(
+    story_pipeline,
+    LLMBatcher(
+        llm_router,
+        mongo_client.african_stories,
+        window=float(os.getenv("LLM_BATCH_WINDOW", "1.0")),
+        poll_interval=float(os.getenv("LLM_BATCH_POLL_INTERVAL", "30.0"))
+    ) if llm_router is not None else None,
+    max_concurrency=int(os.getenv("BATCH_MAX_CONCURRENCY", "500")),
+    max_stories=int(os.getenv("BATCH_MAX_STORIES", "1000")),
+    admission=admission
+)
+
+# Generation jobs are durable in Redis; STORY_WORKERS > 0 also runs workers here
+job_queue = RedisJobQueue(
+    redis_client,
+    visibility_timeout=float(os.getenv("JOB_VISIBILITY_TIMEOUT", "300"))
+)
+# Standalone workers (worker.py) build their pool here too, so queued jobs
+# take background admission slots like in-process ones
+def create_worker_pool(concurrency: int) -> StoryWorkerPool:
+    return StoryWorkerPool(
+        job_queue,
+        story_pipeline,
+        concurrency=concurrency,
+        max_attempts=int(os.getenv("JOB_MAX_ATTEMPTS", "3")),
+        retry_delay=float(os.getenv("JOB_RETRY_DELAY", "5.0")),
+        max_retry_delay=float(os.getenv("JOB_MAX_RETRY_DELAY", "300.0")),
+        admission=admission
+    )
+
+worker_pool = create_worker_pool(int(os.getenv("STORY_WORKERS", "0")))
+startup_report.mark("services")
+
+def parse_story_id(story_id: str):
+    return ObjectId(story_id) if ObjectId.is_valid(story_id) else story_id
+
+def format_sse(event: str, data: Dict) -> bytes:
+    return b"event: " + event.encode() + b"\ndata: " + orjson.dumps(data, default=str) + b"\n\n"
+
+def _finish_background_task(task: asyncio.Task) -> None:
+    background_tasks.discard(task)
+    if not task.cancelled() and task.exception():
+        logger.error(f"Background story generation failed: {str(task.exception())}")
+
+def tenant_of(request: Request) -> str:
+    # The client's address rather than anything it sends, so a client cannot
+    # claim a fresh queue share per request
+    return request.client.host if request.client else "anonymous"
+
+def too_busy(error: AdmissionRejected) -> HTTPException:
+    return HTTPException(status_code=429, detail=str(error), headers={"Retry-After": str(error.retry_after)})
+
+def admission_ticket(request: Request) -> AdmissionTicket:
+    try:
+        return admission.enqueue(tenant_of(request))
+    except AdmissionRejected as e:
+        raise too_busy(e)
 
 @app.post("/api/story/generate")
-async def generate_story(parameters: Dict):
+async def generate_story(parameters: Dict, request: Request):
+    try:
+        granted = await admission_ticket(request).wait()
+    except AdmissionRejected as e:
+        raise too_busy(e)
     try:
-        result = await story_pipeline.generate_story(parameters)
+        parameters = granted.apply(parameters)
+        story_id = await story_pipeline.create_story(parameters)
+        result = await story_pipeline.run_story(story_id, parameters)
         
         return {
             "status": "success",
-            "story_id": str(result["_id"]),
-            "story": result
+            "story_id": str(story_id),
+            "story": result,
+            "degradation": granted.level
         }
     except Exception as e:
         logger.error(f"Error generating story: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        granted.release()
 
-@app.get("/api/story/{story_id}")
-async def get_story(story_id: str):
+async def run_admitted_story(ticket: AdmissionTicket, story_id: ObjectId, parameters: Dict) -> Dict:
     try:
-        story = await mongo_client.african_stories.stories.find_one({"_id": story_id})
+        granted = await ticket.wait()
+    except AdmissionRejected as e:
+        await story_pipeline.writer.fail(story_id, str(e))
+        await story_events.publish(story_id, "failed", {"error": str(e)})
+        raise
+    try:
+        degraded = granted.apply(parameters)
+        if degraded is not parameters:
+            # Recorded so the story shows what it was generated with
+            await mongo_client.african_stories.stories.update_one({"_id": story_id}, {"$set": {"parameters": degraded}})
+        return await story_pipeline.run_story(story_id, degraded)
+    finally:
+        granted.release()
+
+@app.post("/api/story/start", status_code=202)
+async def start_story(parameters: Dict, request: Request):
+    # Rejected up front when the worker is too busy; otherwise the story waits
+    # for a slot in the background
+    ticket = admission_ticket(request)
+    try:
+        story_id = await story_pipeline.create_story(parameters)
+        # Opens the story's channel, so a client subscribing right away follows
+        # it live even while it waits for admission
+        await story_events.publish(story_id, "queued", {"story_id": str(story_id), "progress": 0})
+        # The pipeline reports progress through the event stream below
+        task = asyncio.create_task(run_admitted_story(ticket, story_id, parameters))
+        background_tasks.add(task)
+        task.add_done_callback(_finish_background_task)
+        return {
+            "status": "accepted",
+            "story_id": str(story_id),
+            "events_url": f"/api/story/{story_id}/events"
+        }
+    except Exception as e:
+        ticket.cancel()
+        logger.error(f"Error starting story: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/admission/stats")
+async def get_admission_stats():
+    return admission.stats()
+
+@app.post("/api/story/jobs", status_code=202)
+async def enqueue_story(parameters: Dict, priority: int = 0):
+    try:
+        story_id = await story_pipeline.create_story(parameters)
+        await job_queue.enqueue(
+            str(story_id),
+            {"story_id": str(story_id), "parameters": parameters},
+            priority=priority
+        )
+        # Workers publish the story's progress through the relay
+        await story_events.publish(story_id, "queued", {"story_id": str(story_id), "progress": 0})
+        return {
+            "status": "queued",
+            "story_id": str(story_id),
+            "events_url": f"/api/story/{story_id}/events"
+        }
+    except Exception as e:
+        logger.error(f"Error queueing story: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+def start_batch(batch_id: ObjectId, resume: bool = False, claimed: bool = False) -> None:
+    task = asyncio.create_task(batch_runner.run(batch_id, resume=resume, claimed=claimed))
+    background_tasks.add(task)
+    task.add_done_callback(_finish_background_task)
+
+@app.post("/api/story/batch", status_code=202)
+async def create_story_batch(body: Dict):
+    # {"stories": [parameters, ...]}; follow progress at status_url
+    if not isinstance(body.get("stories"), list):
+        raise HTTPException(status_code=400, detail="stories must be a list of story parameters")
+    try:
+        batch_id = await batch_runner.create(body["stories"])
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error creating batch: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+    start_batch(batch_id)
+    return {"status": "accepted", "batch_id": str(batch_id), "status_url": f"/api/batches/{batch_id}"}
+
+@app.get("/api/batches/{batch_id}")
+async def get_story_batch(batch_id: str):
+    state = await batch_runner.status(parse_story_id(batch_id))
+    if state is None:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    return state
+
+@app.post("/api/batches/{batch_id}/resume", status_code=202)
+async def resume_story_batch(batch_id: str):
+    # Runs the stories an interrupted batch left unfinished; agent calls whose
+    # provider batch was already submitted are collected, not sent again
+    state = await batch_runner.status(parse_story_id(batch_id))
+    if state is None:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    # Claimed on the batch document, so a resume sent to another worker is refused too
+    if not await batch_runner.claim(parse_story_id(batch_id)):
+        raise HTTPException(status_code=409, detail="Batch is already running")
+    start_batch(parse_story_id(batch_id), resume=True, claimed=True)
+    return {"status": "accepted", "batch_id": batch_id, "status_url": f"/api/batches/{batch_id}"}
+
+@app.get("/api/jobs/stats")
+async def get_job_stats():
+    return await job_queue.depth()
+
+@app.get("/api/story/{story_id}/events")
+async def stream_story_events(story_id: str):
+    live = story_events.has_channel(story_id)
+    story = None
+    if not live:
+        # Not running in this worker; send a snapshot of the stored document
+        story = await mongo_client.african_stories.stories.find_one({"_id": parse_story_id(story_id)})
         if not story:
             raise HTTPException(status_code=404, detail="Story not found")
-        return story
+
+    async def event_stream():
+        if not live:
+            event = story["status"] if story["status"] in ("completed", "failed") else "snapshot"
+            yield format_sse(event, {"story": story})
+            return
+        async for message in story_events.subscribe(story_id):
+            yield format_sse(message["event"], message["data"])
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+def check_page_params(view: str, views: Dict, cursor: str = None) -> None:
+    # Validated up front: once streaming starts the status code is already sent
+    if view not in views:
+        raise HTTPException(status_code=400, detail=f"view must be one of {list(views)}")
+    if cursor:
+        try:
+            decode_cursor(cursor)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/api/stories")
+async def list_stories(status: str = None, limit: int = None, cursor: str = None, view: str = "summary"):
+    check_page_params(view, STORY_VIEWS, cursor)
+    query = {"status": status} if status else {}
+    return StreamingResponse(
+        stream_page(mongo_client.african_stories.stories, query, STORY_VIEWS[view], cursor, limit),
+        media_type="application/json"
+    )
+
+@app.get("/api/story/{story_id}")
+async def get_story(story_id: str, view: str = "full"):
+    check_page_params(view, STORY_VIEWS)
+    try:
+        story = await mongo_client.african_stories.stories.find_one(
+            {"_id": parse_story_id(story_id)},
+            STORY_VIEWS[view]
+        )
     except Exception as e:
         logger.error(f"Error retrieving story: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
+    if not story:
+        raise HTTPException(status_code=404, detail="Story not found")
+    return Response(orjson.dumps(story, default=str), media_type="application/json")
 
 @app.post("/api/story/{story_id}/rollback")
 async def rollback_story(story_id: str):
@@ -73,38 +456,252 @@ async def rollback_story(story_id: str):
         logger.error(f"Error rolling back story: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+async def run_regeneration(edit) -> Dict:
+    try:
+        return await edit
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except (StoryNotReady, StoryEditConflict) as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error regenerating story: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+# Partial regeneration: only the requested output is recomputed. Outputs that
+# depend on it are rewritten too with cascade, and marked stale otherwise.
+@app.post("/api/story/{story_id}/regenerate/illustration/{scene}")
+async def regenerate_illustration(story_id: str, scene: int, body: Dict = None):
+    return await run_regeneration(story_pipeline.regenerate_illustration(
+        parse_story_id(story_id),
+        scene,
+        prompt=(body or {}).get("prompt")
+    ))
+
+@app.post("/api/story/{story_id}/regenerate/character")
+async def regenerate_character(story_id: str, body: Dict, cascade: bool = False):
+    if not body.get("name"):
+        raise HTTPException(status_code=400, detail="name is required")
+    return await run_regeneration(story_pipeline.regenerate_character(
+        parse_story_id(story_id),
+        body["name"],
+        instructions=body.get("instructions"),
+        cascade=cascade
+    ))
+
+@app.post("/api/story/{story_id}/regenerate/plot")
+async def regenerate_plot(story_id: str, cascade: bool = True):
+    return await run_regeneration(story_pipeline.regenerate_plot(parse_story_id(story_id), cascade=cascade))
+
+@app.get("/api/story/{story_id}/versions")
+async def get_story_versions(
+    story_id: str,
+    key: str = None,
+    limit: int = None,
+    cursor: str = None,
+    view: str = "full"
+):
+    # Versions of the story's outputs, newest first and paged like the
+    # listings; `key` narrows it to one output, e.g. "plot" or "illustration:2"
+    check_page_params(view, VERSION_VIEWS, cursor)
+    return StreamingResponse(
+        story_pipeline.versions.history(parse_story_id(story_id), key, VERSION_VIEWS[view], cursor, limit),
+        media_type="application/json"
+    )
+
 @app.get("/api/story/{story_id}/illustrations")
-async def get_story_illustrations(story_id: str):
+async def get_story_illustrations(
+    story_id: str,
+    size: int = None,
+    format: str = "webp",
+    limit: int = None,
+    cursor: str = None,
+    view: str = "summary"
+):
+    # `size` points each url at a resized WebP/AVIF rendition; every record also
+    # lists all sizes so clients can build a srcset
+    check_page_params(view, ILLUSTRATION_VIEWS, cursor)
+    renditions = asset_manager.renditions
+    if size is not None and size not in renditions.sizes:
+        raise HTTPException(status_code=400, detail=f"size must be one of {list(renditions.sizes)}")
+
+    def with_renditions(record: Dict) -> Dict:
+        if record.get("blob"):
+            record["renditions"] = renditions.urls(record["blob"], format)
+            if size is not None:
+                record["url"] = record["renditions"][str(size)]
+        return record
+
+    return StreamingResponse(
+        stream_page(
+            mongo_client.african_stories.illustrations,
+            {"story_id": parse_story_id(story_id)},
+            ILLUSTRATION_VIEWS[view],
+            cursor,
+            limit,
+            transform=with_renditions
+        ),
+        media_type="application/json"
+    )
+
+@app.get("/api/assets/{digest}")
+async def get_asset(digest: str, request: Request, size: int = None, format: str = "webp"):
+    if not asset_manager.blob_store.is_digest(digest):
+        raise HTTPException(status_code=404, detail="Asset not found")
+    renditions = asset_manager.renditions
+    if size is None:
+        blob = await asset_manager.blob_store.get(digest)
+        if not blob or not os.path.exists(blob["path"]):
+            raise HTTPException(status_code=404, detail="Asset not found")
+        return immutable_file_response(request, blob["path"], digest, blob["content_type"])
+
+    if size not in renditions.sizes:
+        raise HTTPException(status_code=400, detail=f"size must be one of {list(renditions.sizes)}")
+    fmt = renditions.resolve_format(format)
+    path = await renditions.get(digest, size, fmt)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Asset not found")
+    return immutable_file_response(request, path, f"{digest}-{size}.{fmt}", renditions.content_type(fmt))
+
+@app.get("/api/story/{story_id}/export/{format}")
+async def export_story(story_id: str, format: str, wait: bool = False):
+    # Starts or follows an export: 202 with progress while it renders, then
+    # 200 with download_url. Unchanged stories are served from the cache.
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {list(EXPORT_FORMATS)}")
+    story = await mongo_client.african_stories.stories.find_one({"_id": parse_story_id(story_id)})
+    if not story:
+        raise HTTPException(status_code=404, detail="Story not found")
+    if story.get("status") != "completed":
+        raise HTTPException(status_code=409, detail="Story is not complete yet")
     try:
-        illustrations = await asset_manager.get_story_illustrations(story_id)
-        return illustrations
+        if wait:
+            state = await export_engine.wait(story, format)
+        else:
+            state = await export_engine.export(story, format)
     except Exception as e:
-        logger.error(f"Error retrieving illustrations: {str(e)}")
+        logger.error(f"Error exporting story: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
+    return JSONResponse(state, status_code=200 if state["status"] == "ready" else 202)
+
+@app.get("/api/exports/{name}")
+async def get_export(name: str, request: Request):
+    if not EXPORT_NAME.match(name):
+        raise HTTPException(status_code=404, detail="Export not found")
+    path = os.path.join(export_engine.root, name)
+    if not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="Export not found")
+    version, fmt = name.split(".")
+    return immutable_file_response(request, path, version, EXPORT_FORMATS[fmt], download_name=f"story.{fmt}")
 
 @app.post("/api/story/{story_id}/backup")
 async def backup_story_assets(story_id: str):
     try:
-        backup_dir = f"backups/story_{story_id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
-        await asset_manager.backup_assets(backup_dir)
-        return {"status": "success", "backup_dir": backup_dir}
+        return {"status": "success", **await backup_engine.backup(story_id)}
     except Exception as e:
         logger.error(f"Error backing up assets: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/api/story/{story_id}/restore")
+async def restore_story_assets(story_id: str, snapshot_id: str = None):
+    return await restore_backup(snapshot_id or await backup_engine.latest_snapshot(story_id))
+
+@app.post("/api/backup")
+async def backup_all_assets():
+    try:
+        return {"status": "success", **await backup_engine.backup()}
+    except Exception as e:
+        logger.error(f"Error backing up assets: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/api/backup/restore")
+async def restore_all_assets(snapshot_id: str = None):
+    return await restore_backup(snapshot_id or await backup_engine.latest_snapshot())
+
+async def restore_backup(snapshot_id: str):
+    if not snapshot_id:
+        raise HTTPException(status_code=404, detail="No backup found")
+    try:
+        return {"status": "success", **await backup_engine.restore(snapshot_id)}
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error restoring backup: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/metrics")
+async def get_metrics():
+    return Response(content=generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+@app.get("/api/cache/stats")
+async def get_cache_stats():
+    return {
+        "stages": stage_memo.stats(),
+        "coalescing": {
+            "story": story_pipeline.story_flights.stats(),
+            "stage": stage_memo.flights.stats(),
+        },
+        "semantic": semantic_cache.stats() if semantic_cache else None,
+    }
+
+@app.get("/api/health/loop")
+async def get_loop_health():
+    return loop_monitor.stats()
+
+@app.get("/api/health/startup")
+async def get_startup_report():
+    return {**startup_report.summary(), "agent_pool": story_pipeline.agent_pool.stats()}
+
+@app.get("/api/images/engines")
+async def get_image_engines():
+    return story_pipeline.image_scheduler.summary()
+
+@app.get("/api/llm/providers")
+async def get_llm_providers():
+    if llm_router is None:
+        return {"router": False, "providers": {}}
+    return {"router": True, "providers": llm_router.summary()}
+
 @app.on_event("startup")
 async def startup_event():
+    loop_monitor.start()
+    story_events.start()
+    if worker_pool.concurrency > 0:
+        worker_pool.start()
+
     # Create indexes
     db = mongo_client.african_stories
-    await db.stories.create_index("created_at")
-    await db.stories.create_index([("status", 1), ("created_at", -1)])
-    await db.illustrations.create_index([("story_id", 1), ("created_at", -1)])
+    # Listing endpoints page on (created_at, _id), newest first
+    await db.stories.create_index([("created_at", -1), ("_id", -1)])
+    await db.stories.create_index([("status", 1), ("created_at", -1), ("_id", -1)])
+    await db.illustrations.create_index([("story_id", 1), ("created_at", -1), ("_id", -1)])
+    await db.illustrations.create_index("blob")
+    await db.story_outputs.create_index([("story_id", 1), ("created_at", -1), ("_id", -1)])
+    await db.story_outputs.create_index([("story_id", 1), ("key", 1), ("created_at", -1), ("_id", -1)])
+    startup_report.ready()
+
+    if os.getenv("AGENT_PREWARM", "1") == "1":
+        task = asyncio.create_task(story_pipeline.agent_pool.prewarm())
+        background_tasks.add(task)
+        task.add_done_callback(_finish_background_task)
 
 @app.on_event("shutdown")
 async def shutdown_event():
+    await worker_pool.stop()
+    await loop_monitor.stop()
+    await story_events.stop()
+    stability_executor.shutdown(wait=False)
+    if image_executor:
+        image_executor.shutdown(wait=False)
+    if rendition_executor:
+        rendition_executor.shutdown(wait=False)
+    if export_executor:
+        export_executor.shutdown(wait=False)
+    if semantic_cache:
+        await semantic_cache.save()
+
     # Close connections
     mongo_client.close()
-    redis_client.close()
+    await cache.close()
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,337 @@
+import asyncio
+import copy
+import logging
+import math
+import os
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import Dict, Any, List, AsyncIterator, Deque, Sequence, Tuple
+from prometheus_client import Counter, Gauge
+from .agent_pool import AGENT_CLASSES
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+ADMISSION_IN_FLIGHT = Gauge("story_admission_in_flight", "Stories holding an admission slot", ["kind"])
+ADMISSION_QUEUED = Gauge("story_admission_queued", "Stories waiting for an admission slot", ["kind"])
+ADMISSION_DECISIONS = Counter("story_admission_total", "Admission decisions", ["outcome"])
+ADMISSION_DEGRADED = Counter("story_admission_degraded_total", "Stories admitted at reduced quality", ["level"])
+
+# What each load level gives up, cumulatively: illustrated scenes first, then
+# image size, then the agents' model
+DEGRADATION_LEVELS: List[Dict[str, Any]] = [
+    {},
+    {"max_scenes": 4},
+    {"max_scenes": 3, "image_size": 512},
+    {"max_scenes": 2, "image_size": 512, "model_tier": "economy"},
+]
+
+
+def degrade(parameters: Dict[str, Any], level: int, model_tiers: bool = True) -> Dict[str, Any]:
+    # Story parameters for the given level. Degraded stories get their own
+    # cache keys, so they never stand in for a full-quality story. Without
+    # model_tiers the agents' model is left alone: only agents calling the LLM
+    # router can switch to an economy model.
+    if level <= 0:
+        return parameters
+    settings = DEGRADATION_LEVELS[min(level, len(DEGRADATION_LEVELS) - 1)]
+    degraded = copy.deepcopy(parameters)
+    degraded["degradation"] = level
+    if "max_scenes" in settings:
+        degraded["max_scenes"] = min(settings["max_scenes"], degraded.get("max_scenes", settings["max_scenes"]))
+    if "image_size" in settings:
+        degraded["illustration_style"] = {**(degraded.get("illustration_style") or {}), "size": settings["image_size"]}
+    if "model_tier" in settings and model_tiers:
+        agent_parameters = degraded["agent_parameters"] = degraded.get("agent_parameters") or {}
+        for role in AGENT_CLASSES:
+            agent_parameters[role] = {**(agent_parameters.get(role) or {}), "model_tier": settings["model_tier"]}
+    return degraded
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class Admission:
+    # A granted slot; released exactly once, when the story is done
+    def __init__(
+        self,
+        controller: "AdmissionController",
+        tenant: str,
+        level: int,
+        waited: float,
+        background: bool = False
+    ):
+        self.controller = controller
+        self.tenant = tenant
+        self.level = level
+        self.waited = waited
+        self.background = background
+        self.started_at = time.monotonic()
+        self.released = False
+
+    def apply(self, parameters: Dict[str, Any]) -> Dict[str, Any]:
+        return degrade(parameters, self.level, self.controller.model_tiers)
+
+    def release(self) -> None:
+        if not self.released:
+            self.released = True
+            self.controller._release(self, time.monotonic() - self.started_at)
+
+
+class AdmissionTicket:
+    # A place in the queue, taken synchronously so an over-full worker can
+    # answer 429 before accepting the request
+    def __init__(self, controller: "AdmissionController", tenant: str, future: asyncio.Future, background: bool = False):
+        self.controller = controller
+        self.tenant = tenant
+        self.future = future
+        self.background = background
+        self.enqueued_at = time.monotonic()
+
+    async def wait(self) -> Admission:
+        return await self.controller._wait(self)
+
+    def cancel(self) -> None:
+        # For a request abandoned before it waited
+        self.controller._abandon(self)
+
+
+class SlotPool:
+    # Slots for one class of work, with per-tenant queues served round-robin
+    def __init__(self, max_in_flight: int):
+        self.max_in_flight = max_in_flight
+        self.in_flight = 0
+        self.queued = 0
+        self.queues: "OrderedDict[str, Deque[asyncio.Future]]" = OrderedDict()
+        self.tenants: Dict[str, int] = {}
+
+    def has_free_slot(self) -> bool:
+        return self.in_flight < self.max_in_flight and not self.queues
+
+    def start(self, tenant: str) -> None:
+        self.in_flight += 1
+        self.tenants[tenant] = self.tenants.get(tenant, 0) + 1
+
+    def finish(self, tenant: str) -> None:
+        self.in_flight -= 1
+        self.tenants[tenant] -= 1
+        if not self.tenants[tenant]:
+            del self.tenants[tenant]
+
+    def push(self, tenant: str, future: asyncio.Future) -> None:
+        self.queues.setdefault(tenant, deque()).append(future)
+        self.queued += 1
+
+    def drop(self, tenant: str, future: asyncio.Future) -> None:
+        queue = self.queues.get(tenant)
+        if queue is not None and future in queue:
+            queue.remove(future)
+            self.queued -= 1
+            if not queue:
+                del self.queues[tenant]
+
+    def pop(self) -> Tuple[str, asyncio.Future]:
+        tenant, queue = next(iter(self.queues.items()))
+        future = queue.popleft()
+        self.queued -= 1
+        if queue:
+            self.queues.move_to_end(tenant)
+        else:
+            del self.queues[tenant]
+        return tenant, future
+
+
+class AdmissionController:
+    # Bounds the stories running in this worker at max_in_flight. Requests
+    # beyond that wait in per-tenant queues served round-robin, so one tenant's
+    # burst cannot starve the others. A request is turned away with a
+    # Retry-After once the queue (or the tenant's share of it) is full or its
+    # expected wait exceeds max_wait, which keeps admitted requests' latency
+    # bounded. As the load rises, admitted stories are degraded a level at a
+    # time (see DEGRADATION_LEVELS) so they finish sooner and cost less.
+    # Background work (catalog batches, queued jobs) has its own pool of
+    # max_background slots: a batch story can sit on a provider batch for
+    # hours, so it must not hold a slot interactive requests need. Background
+    # tickets wait round-robin without a limit and are never rejected or
+    # degraded, nor counted in the interactive load.
+    def __init__(
+        self,
+        max_in_flight: int = 16,
+        max_queue: int = 64,
+        tenant_queue_share: float = 0.5,
+        max_wait: float = 60.0,
+        degrade_at: Sequence[float] = (0.75, 1.25, 2.0),
+        expected_duration: float = 60.0,
+        model_tiers: bool = True,
+        max_background: int = 500
+    ):
+        self.interactive = SlotPool(max_in_flight)
+        self.background = SlotPool(max_background)
+        self.max_queue = max_queue
+        self.max_tenant_queue = max(1, int(max_queue * tenant_queue_share))
+        self.max_wait = max_wait
+        # Load, as (in flight + queued) / max_in_flight, at which each level starts
+        self.degrade_at = sorted(degrade_at)
+        # EWMA of interactive story durations, for wait estimates and Retry-After
+        self.duration = expected_duration
+        # Whether degraded agents can switch to an economy model
+        self.model_tiers = model_tiers
+        self.counts = {"admitted": 0, "rejected": 0, "timed_out": 0, "degraded": 0}
+
+    @classmethod
+    def from_env(cls, model_tiers: bool = True) -> "AdmissionController":
+        return cls(
+            max_in_flight=int(os.getenv("ADMISSION_MAX_IN_FLIGHT", "16")),
+            max_queue=int(os.getenv("ADMISSION_MAX_QUEUE", "64")),
+            tenant_queue_share=float(os.getenv("ADMISSION_TENANT_QUEUE_SHARE", "0.5")),
+            max_wait=float(os.getenv("ADMISSION_MAX_WAIT", "60.0")),
+            degrade_at=[float(value) for value in os.getenv("ADMISSION_DEGRADE_AT", "0.75,1.25,2.0").split(",")],
+            expected_duration=float(os.getenv("ADMISSION_EXPECTED_DURATION", "60.0")),
+            model_tiers=model_tiers,
+            max_background=int(os.getenv("ADMISSION_MAX_BACKGROUND", "500"))
+        )
+
+    @property
+    def max_in_flight(self) -> int:
+        return self.interactive.max_in_flight
+
+    @property
+    def in_flight(self) -> int:
+        return self.interactive.in_flight
+
+    @property
+    def queued(self) -> int:
+        return self.interactive.queued
+
+    def _pool(self, background: bool) -> SlotPool:
+        return self.background if background else self.interactive
+
+    def load(self) -> float:
+        return (self.interactive.in_flight + self.interactive.queued) / self.interactive.max_in_flight
+
+    def level(self) -> int:
+        load = self.load()
+        return sum(1 for threshold in self.degrade_at if load >= threshold)
+
+    def expected_wait(self) -> float:
+        # Slots free up at about max_in_flight per story duration
+        return self.duration * (self.interactive.queued + 1) / self.interactive.max_in_flight
+
+    def retry_after(self) -> int:
+        return max(1, math.ceil(self.expected_wait()))
+
+    def _reject(self, reason: str) -> None:
+        self.counts["rejected"] += 1
+        ADMISSION_DECISIONS.labels(outcome="rejected").inc()
+        raise AdmissionRejected(reason, self.retry_after())
+
+    def _update_gauges(self) -> None:
+        ADMISSION_IN_FLIGHT.labels(kind="interactive").set(self.interactive.in_flight)
+        ADMISSION_IN_FLIGHT.labels(kind="background").set(self.background.in_flight)
+        ADMISSION_QUEUED.labels(kind="interactive").set(self.interactive.queued)
+        ADMISSION_QUEUED.labels(kind="background").set(self.background.queued)
+
+    def enqueue(self, tenant: str, background: bool = False) -> AdmissionTicket:
+        pool = self._pool(background)
+        future = asyncio.get_running_loop().create_future()
+        if pool.has_free_slot():
+            self._start(pool, tenant)
+            future.set_result(None)
+            return AdmissionTicket(self, tenant, future, background)
+        if not background:
+            if pool.queued >= self.max_queue:
+                self._reject("Too many stories in progress")
+            if len(pool.queues.get(tenant, ())) >= self.max_tenant_queue:
+                self._reject("Too many queued stories for this tenant")
+            if self.expected_wait() > self.max_wait:
+                self._reject("Expected wait is too long")
+        pool.push(tenant, future)
+        self._update_gauges()
+        return AdmissionTicket(self, tenant, future, background)
+
+    async def acquire(self, tenant: str, background: bool = False) -> Admission:
+        return await self.enqueue(tenant, background).wait()
+
+    @asynccontextmanager
+    async def admit(self, tenant: str, background: bool = False) -> AsyncIterator[Admission]:
+        admission = await self.acquire(tenant, background)
+        try:
+            yield admission
+        finally:
+            admission.release()
+
+    async def _wait(self, ticket: AdmissionTicket) -> Admission:
+        future = ticket.future
+        timeout = None if ticket.background else max(0.0, ticket.enqueued_at + self.max_wait - time.monotonic())
+        try:
+            await asyncio.wait_for(asyncio.shield(future), timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            self._abandon(ticket)
+            if isinstance(e, asyncio.TimeoutError):
+                self.counts["timed_out"] += 1
+                ADMISSION_DECISIONS.labels(outcome="timed_out").inc()
+                raise AdmissionRejected("Timed out waiting for capacity", self.retry_after()) from None
+            raise
+        waited = time.monotonic() - ticket.enqueued_at
+        # The level reflects the load when the story starts
+        level = 0 if ticket.background else min(self.level(), len(DEGRADATION_LEVELS) - 1)
+        if level:
+            self.counts["degraded"] += 1
+            ADMISSION_DEGRADED.labels(level=str(level)).inc()
+        return Admission(self, ticket.tenant, level, waited, ticket.background)
+
+    def _abandon(self, ticket: AdmissionTicket) -> None:
+        future = ticket.future
+        pool = self._pool(ticket.background)
+        if future.done() and not future.cancelled():
+            # Already granted; hand the slot on
+            self._finish(pool, ticket.tenant)
+        else:
+            future.cancel()
+            pool.drop(ticket.tenant, future)
+            self._update_gauges()
+
+    def _start(self, pool: SlotPool, tenant: str) -> None:
+        pool.start(tenant)
+        self.counts["admitted"] += 1
+        ADMISSION_DECISIONS.labels(outcome="admitted").inc()
+        self._update_gauges()
+
+    def _finish(self, pool: SlotPool, tenant: str) -> None:
+        pool.finish(tenant)
+        self._dispatch(pool)
+
+    def _release(self, admission: Admission, elapsed: float) -> None:
+        if not admission.background:
+            self.duration = 0.2 * elapsed + 0.8 * self.duration
+        self._finish(self._pool(admission.background), admission.tenant)
+
+    def _dispatch(self, pool: SlotPool) -> None:
+        # Round-robin over tenants with waiting requests
+        while pool.in_flight < pool.max_in_flight and pool.queues:
+            tenant, future = pool.pop()
+            if future.done():
+                continue
+            self._start(pool, tenant)
+            future.set_result(None)
+        self._update_gauges()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self.counts,
+            "in_flight": self.interactive.in_flight,
+            "queued": self.interactive.queued,
+            "background_in_flight": self.background.in_flight,
+            "queued_background": self.background.queued,
+            "load": round(self.load(), 3),
+            "level": self.level(),
+            "expected_duration_s": round(self.duration, 2),
+            "tenants_in_flight": dict(self.interactive.tenants),
+            "tenants_queued": {tenant: len(queue) for tenant, queue in self.interactive.queues.items()},
+            "background_tenants_in_flight": dict(self.background.tenants),
+            "background_tenants_queued": {tenant: len(queue) for tenant, queue in self.background.queues.items()},
+        }
@@ -0,0 +1,88 @@
+import asyncio
+import importlib
+import logging
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Tuple, TYPE_CHECKING
+from .cache import canonical_json
+from .startup import startup_report
+
+if TYPE_CHECKING:
+    from agents.base import BaseAgent
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Imported on first use: the agent modules pull in CrewAI, the heaviest import
+AGENT_CLASSES = {
+    "narrative_architect": "agents.narrative_architect:NarrativeArchitect",
+    "cultural_validator": "agents.cultural_validator:CulturalValidator",
+    "character_designer": "agents.character_designer:CharacterDesigner",
+    "plot_strategist": "agents.plot_strategist:PlotStrategist",
+}
+
+
+class AgentPool:
+    # One agent instance per (role, parameter set), built on first request and
+    # shared by every story that asks for the same parameters. The least
+    # recently used instances are dropped beyond max_agents.
+    def __init__(
+        self,
+        llm_router: Optional[Any] = None,
+        max_agents: int = 32,
+        classes: Optional[Dict[str, str]] = None
+    ):
+        self.llm_router = llm_router
+        self.max_agents = max_agents
+        self.classes = classes or AGENT_CLASSES
+        self.agents: "OrderedDict[Tuple[str, bytes], BaseAgent]" = OrderedDict()
+        self.hits = 0
+        self.built = 0
+        self.evicted = 0
+        self.build_seconds = 0.0
+
+    def _agent_class(self, role: str) -> type:
+        if role not in self.classes:
+            raise ValueError(f"Unknown agent role: {role}")
+        module_name, class_name = self.classes[role].split(":")
+        started = time.perf_counter()
+        module = importlib.import_module(module_name)
+        elapsed = time.perf_counter() - started
+        if elapsed > 0.01:
+            startup_report.record_deferred(f"import:{module_name}", elapsed)
+        return getattr(module, class_name)
+
+    def get(self, role: str, parameters: Optional[Dict[str, Any]] = None) -> "BaseAgent":
+        key = (role, canonical_json(parameters or {}))
+        agent = self.agents.get(key)
+        if agent is not None:
+            self.agents.move_to_end(key)
+            self.hits += 1
+            return agent
+
+        started = time.perf_counter()
+        agent = self._agent_class(role)(parameters=parameters, llm_router=self.llm_router)
+        self.build_seconds += time.perf_counter() - started
+        self.built += 1
+        self.agents[key] = agent
+        if len(self.agents) > self.max_agents:
+            self.agents.popitem(last=False)
+            self.evicted += 1
+        return agent
+
+    async def prewarm(self) -> None:
+        # Imports the agent modules in a thread once the app is serving, so the
+        # first story does not stall the event loop on CrewAI's import
+        started = time.perf_counter()
+        for role in self.classes:
+            await asyncio.to_thread(self._agent_class, role)
+        logger.info(f"Agent modules imported in {(time.perf_counter() - started) * 1000:.0f}ms")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "agents": len(self.agents),
+            "hits": self.hits,
+            "built": self.built,
+            "evicted": self.evicted,
+            "build_ms": round(self.build_seconds * 1000),
+        }
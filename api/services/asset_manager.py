@@ -1,18 +1,70 @@
 import logging
-from typing import Dict, Any, List
+from concurrent.futures import Executor
+from typing import Dict, Any, List, Optional
 from motor.motor_asyncio import AsyncIOMotorClient
 from datetime import datetime
 import os
 import shutil
+from .blob_store import BlobStore
+from .renditions import RenditionStore
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 class AssetManager:
-    def __init__(self, mongo_client: AsyncIOMotorClient):
+    def __init__(
+        self,
+        mongo_client: AsyncIOMotorClient,
+        blob_store: Optional[BlobStore] = None,
+        rendition_executor: Optional[Executor] = None
+    ):
         self.db = mongo_client.african_stories
         self.asset_dir = "assets"
         os.makedirs(self.asset_dir, exist_ok=True)
+        self.blob_store = blob_store or BlobStore(self.db, os.path.join(self.asset_dir, "blobs"))
+        self.renditions = RenditionStore(self.blob_store, rendition_executor)
+
+    async def create_illustration_record(
+        self,
+        story_id: str,
+        illustration_data: bytes,
+        metadata: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        # Store the image by content hash; identical images share one file
+        blob = await self.blob_store.put(illustration_data)
+        self.renditions.prepare(blob["digest"], illustration_data)
+
+        # Metadata record, persisted by the caller
+        return {
+            "story_id": story_id,
+            "blob": blob["digest"],
+            "filename": os.path.basename(blob["path"]),
+            "filepath": blob["path"],
+            "url": f"/api/assets/{blob['digest']}",
+            "metadata": metadata,
+            "created_at": datetime.utcnow()
+        }
+
+    async def adopt_illustration(self, story_id: str, url: str) -> Optional[Dict[str, Any]]:
+        # A record of this story's own for another story's image, holding a
+        # blob reference so deleting the original leaves the file in place
+        prefix = "/api/assets/"
+        if not url.startswith(prefix):
+            return None
+        digest = url[len(prefix):]
+        blob = await self.blob_store.acquire(digest)
+        if blob is None:
+            return None
+        source = await self.db.illustrations.find_one({"blob": digest}, {"metadata": 1})
+        return {
+            "story_id": story_id,
+            "blob": digest,
+            "filename": os.path.basename(blob["path"]),
+            "filepath": blob["path"],
+            "url": url,
+            "metadata": source.get("metadata", {}) if source else {},
+            "created_at": datetime.utcnow()
+        }
 
     async def save_illustration(
         self,
@@ -21,29 +73,12 @@ class AssetManager:
         metadata: Dict[str, Any]
     ) -> str:
         try:
-            # Create story-specific directory
-            story_dir = os.path.join(self.asset_dir, str(story_id))
-            os.makedirs(story_dir, exist_ok=True)
-
-            # Generate unique filename
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            filename = f"illustration_{timestamp}.png"
-            filepath = os.path.join(story_dir, filename)
-
-            # Save file
-            with open(filepath, "wb") as f:
-                f.write(illustration_data)
+            record = await self.create_illustration_record(story_id, illustration_data, metadata)
 
             # Store metadata in database
-            await self.db.illustrations.insert_one({
-                "story_id": story_id,
-                "filename": filename,
-                "filepath": filepath,
-                "metadata": metadata,
-                "created_at": datetime.utcnow()
-            })
+            await self.db.illustrations.insert_one(record)
 
-            return filepath
+            return record["filepath"]
 
         except Exception as e:
             logger.error(f"Error saving illustration: {str(e)}")
@@ -59,7 +94,13 @@ class AssetManager:
 
     async def delete_story_assets(self, story_id: str) -> None:
         try:
-            # Delete files
+            # Drop this story's references; blobs are removed once unreferenced
+            cursor = self.db.illustrations.find({"story_id": story_id}, {"blob": 1})
+            async for record in cursor:
+                if record.get("blob"):
+                    await self.blob_store.release(record["blob"])
+
+            # Files from before content addressing live in a per-story directory
             story_dir = os.path.join(self.asset_dir, str(story_id))
             if os.path.exists(story_dir):
                 shutil.rmtree(story_dir)
@@ -69,25 +110,3 @@ class AssetManager:
         except Exception as e:
             logger.error(f"Error deleting story assets: {str(e)}")
             raise
-
-    async def backup_assets(self, backup_dir: str) -> None:
-        try:
-            # Create backup directory
-            os.makedirs(backup_dir, exist_ok=True)
-            
-            # Copy all assets
-            shutil.copytree(self.asset_dir, backup_dir, dirs_exist_ok=True)
-            
-            # Backup metadata
-            cursor = self.db.illustrations.find({})
-            metadata = await cursor.to_list(length=None)
-            
-            # Store metadata backup
-            await self.db.backups.insert_one({
-                "type": "illustrations",
-                "data": metadata,
-                "created_at": datetime.utcnow()
-            })
-        except Exception as e:
-            logger.error(f"Error backing up assets: {str(e)}")
-            raise
\ No newline at end of file
@@ -0,0 +1,333 @@
+import asyncio
+import gzip
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Iterable, AsyncIterator
+from bson import ObjectId, json_util
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ReplaceOne
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+HASH_CHUNK_SIZE = 1024 * 1024
+TEMP_PREFIX = ".tmp-"
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def copy_atomic(source: str, target: str) -> None:
+    directory = os.path.dirname(target)
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=TEMP_PREFIX)
+    try:
+        with os.fdopen(fd, "wb") as out, open(source, "rb") as src:
+            shutil.copyfileobj(src, out, HASH_CHUNK_SIZE)
+            out.flush()
+            os.fsync(out.fileno())
+        os.replace(temp_path, target)
+    except Exception:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def write_atomic(path: str, data: bytes) -> None:
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=TEMP_PREFIX)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+    except Exception:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+class BackupEngine:
+    # Layout under root:
+    #   manifest.json              size/mtime/sha256 of every file copied so far
+    #   files/<path>               mirror of the asset dir, only changed files are copied
+    #   snapshots/<id>/meta.json   what a snapshot contains
+    #   snapshots/<id>/<name>-NNNNN.ndjson.gz
+    #                              metadata as gzipped Extended JSON lines, at most
+    #                              segment_size documents per segment
+    def __init__(
+        self,
+        db: AsyncIOMotorDatabase,
+        asset_dir: str = "assets",
+        root: str = "backups",
+        segment_size: int = 1000
+    ):
+        self.db = db
+        self.asset_dir = asset_dir
+        self.root = root
+        self.segment_size = segment_size
+        self.files_dir = os.path.join(root, "files")
+        self.snapshots_dir = os.path.join(root, "snapshots")
+        self.manifest_path = os.path.join(root, "manifest.json")
+        # The manifest is shared by every scope, so backups run one at a time
+        self._lock = asyncio.Lock()
+
+    # Files
+
+    def _load_manifest(self) -> Dict[str, Dict[str, Any]]:
+        if not os.path.exists(self.manifest_path):
+            return {}
+        with open(self.manifest_path, "rb") as f:
+            return json.load(f)
+
+    def _save_manifest(self, manifest: Dict[str, Dict[str, Any]]) -> None:
+        write_atomic(self.manifest_path, json.dumps(manifest, sort_keys=True).encode())
+
+    def _relative(self, path: str) -> Optional[str]:
+        relpath = os.path.relpath(path, self.asset_dir)
+        if relpath.startswith(os.pardir):
+            return None
+        return relpath
+
+    def _walk(self, directory: str) -> List[str]:
+        relpaths = []
+        for dirpath, _, filenames in os.walk(directory):
+            for filename in filenames:
+                if not filename.startswith(TEMP_PREFIX):
+                    relpaths.append(self._relative(os.path.join(dirpath, filename)))
+        return sorted(relpaths)
+
+    def _sync_files(self, relpaths: Iterable[str], manifest: Dict[str, Dict[str, Any]]) -> List[Dict[str, Any]]:
+        # Unchanged size and mtime means no read at all; a changed mtime with the
+        # same hash only refreshes the manifest. Everything else is copied.
+        entries = []
+        for relpath in relpaths:
+            source = os.path.join(self.asset_dir, relpath)
+            target = os.path.join(self.files_dir, relpath)
+            try:
+                stat = os.stat(source)
+            except FileNotFoundError:
+                logger.warning(f"Skipping missing asset {relpath}")
+                continue
+            entry = manifest.get(relpath)
+            have_copy = entry is not None and os.path.exists(target)
+            if have_copy and entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns:
+                entries.append({"path": relpath, "copied": False, **entry})
+                continue
+            digest = file_sha256(source)
+            copied = not (have_copy and entry["sha256"] == digest)
+            if copied:
+                copy_atomic(source, target)
+            entry = manifest[relpath] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": digest}
+            entries.append({"path": relpath, "copied": copied, **entry})
+        return entries
+
+    def _restore_files(self, entries: Iterable[Dict[str, Any]]) -> Dict[str, int]:
+        stats = {"restored": 0, "unchanged": 0, "missing": 0}
+        for entry in entries:
+            source = os.path.join(self.files_dir, entry["path"])
+            target = os.path.join(self.asset_dir, entry["path"])
+            if os.path.exists(target) and os.path.getsize(target) == entry["size"]:
+                stats["unchanged"] += 1
+            elif not os.path.exists(source):
+                logger.warning(f"Backup copy of {entry['path']} is missing")
+                stats["missing"] += 1
+            else:
+                copy_atomic(source, target)
+                stats["restored"] += 1
+        return stats
+
+    # Metadata segments
+
+    def _segment_path(self, snapshot_id: str, name: str, index: int) -> str:
+        return os.path.join(self.snapshots_dir, snapshot_id, f"{name}-{index:05d}.ndjson.gz")
+
+    def _write_segment(self, path: str, lines: List[str]) -> None:
+        write_atomic(path, gzip.compress(("\n".join(lines) + "\n").encode(), compresslevel=6))
+
+    def _read_segment(self, path: str) -> List[Dict[str, Any]]:
+        with gzip.open(path, "rt") as f:
+            return [json_util.loads(line) for line in f if line.strip()]
+
+    async def _export(self, snapshot_id: str, name: str, documents: AsyncIterator[Dict[str, Any]]) -> Dict[str, Any]:
+        # Documents are streamed into fixed-size segments, so memory stays bounded
+        # and no single backup document can hit Mongo's 16MB limit
+        segments: List[str] = []
+        lines: List[str] = []
+        count = 0
+
+        async def write() -> None:
+            path = self._segment_path(snapshot_id, name, len(segments))
+            await asyncio.to_thread(self._write_segment, path, lines)
+            segments.append(os.path.basename(path))
+
+        async for document in documents:
+            lines.append(json_util.dumps(document))
+            count += 1
+            if len(lines) >= self.segment_size:
+                await write()
+                lines = []
+        if lines:
+            await write()
+        return {"segments": segments, "count": count}
+
+    async def _iterate(self, items: Iterable[Dict[str, Any]]) -> AsyncIterator[Dict[str, Any]]:
+        for item in items:
+            yield item
+
+    # Backup
+
+    async def backup(self, story_id: Optional[str] = None) -> Dict[str, Any]:
+        # Per-story when story_id is given, otherwise the whole store
+        scope = f"story_{story_id}" if story_id else "full"
+        snapshot_id = f"{scope}-{datetime.utcnow().strftime('%Y%m%dT%H%M%S%f')}"
+
+        if story_id:
+            # The pipeline stores ObjectIds, older records may hold the string form
+            story_key = ObjectId(story_id) if ObjectId.is_valid(story_id) else story_id
+            queries = {
+                "stories": {"_id": story_key},
+                "illustrations": {"story_id": {"$in": [story_key, story_id]}},
+            }
+        else:
+            queries = {"stories": {}, "illustrations": {}, "blobs": {}}
+
+        async with self._lock:
+            if story_id:
+                relpaths = set()
+                digests = set()
+                async for record in self.db.illustrations.find(queries["illustrations"], {"filepath": 1, "blob": 1}):
+                    relpath = self._relative(record.get("filepath", ""))
+                    if relpath:
+                        relpaths.add(relpath)
+                    if record.get("blob"):
+                        digests.add(record["blob"])
+                # Blob refcounts are needed to re-attach the story on restore
+                queries["blobs"] = {"_id": {"$in": sorted(digests)}}
+                legacy_dir = os.path.join(self.asset_dir, str(story_id))
+                relpaths.update(await asyncio.to_thread(self._walk, legacy_dir))
+                relpaths = sorted(relpaths)
+            else:
+                relpaths = await asyncio.to_thread(self._walk, self.asset_dir)
+
+            manifest = await asyncio.to_thread(self._load_manifest)
+            entries = await asyncio.to_thread(self._sync_files, relpaths, manifest)
+            await asyncio.to_thread(self._save_manifest, manifest)
+
+        collections = {}
+        for name, query in queries.items():
+            collections[name] = await self._export(snapshot_id, name, self.db[name].find(query))
+        files = await self._export(
+            snapshot_id,
+            "files",
+            self._iterate({"path": e["path"], "size": e["size"], "sha256": e["sha256"]} for e in entries)
+        )
+
+        meta = {
+            "id": snapshot_id,
+            "scope": scope,
+            "story_id": story_id,
+            "created_at": datetime.utcnow().isoformat(),
+            "files": files,
+            "collections": collections,
+        }
+        path = os.path.join(self.snapshots_dir, snapshot_id, "meta.json")
+        await asyncio.to_thread(write_atomic, path, json.dumps(meta, indent=2).encode())
+
+        summary = {
+            "snapshot_id": snapshot_id,
+            "files": len(entries),
+            "files_copied": sum(1 for e in entries if e["copied"]),
+            "bytes_copied": sum(e["size"] for e in entries if e["copied"]),
+            "documents": {name: info["count"] for name, info in collections.items()},
+        }
+        # Mongo only keeps a small index entry; the data lives in the segments
+        await self.db.backups.insert_one({
+            "_id": snapshot_id,
+            "scope": scope,
+            "story_id": story_id,
+            "path": os.path.join(self.snapshots_dir, snapshot_id),
+            "summary": summary,
+            "created_at": datetime.utcnow()
+        })
+        logger.info(
+            f"Backup {snapshot_id}: copied {summary['files_copied']}/{summary['files']} files "
+            f"({summary['bytes_copied']} bytes)"
+        )
+        return summary
+
+    # Restore
+
+    async def latest_snapshot(self, story_id: Optional[str] = None) -> Optional[str]:
+        scope = f"story_{story_id}" if story_id else "full"
+        cursor = self.db.backups.find({"scope": scope}).sort("created_at", -1).limit(1)
+        latest = await cursor.to_list(length=1)
+        return latest[0]["_id"] if latest else None
+
+    def _load_meta(self, snapshot_id: str) -> Dict[str, Any]:
+        path = os.path.join(self.snapshots_dir, os.path.basename(snapshot_id), "meta.json")
+        with open(path, "rb") as f:
+            return json.load(f)
+
+    async def _segments(self, snapshot_id: str, segments: List[str]) -> AsyncIterator[List[Dict[str, Any]]]:
+        for segment in segments:
+            path = os.path.join(self.snapshots_dir, snapshot_id, segment)
+            yield await asyncio.to_thread(self._read_segment, path)
+
+    async def restore(self, snapshot_id: str) -> Dict[str, Any]:
+        try:
+            meta = await asyncio.to_thread(self._load_meta, snapshot_id)
+        except FileNotFoundError:
+            raise ValueError(f"Unknown backup snapshot: {snapshot_id}")
+        snapshot_id = meta["id"]
+        per_story = meta["story_id"] is not None
+
+        file_stats = {"restored": 0, "unchanged": 0, "missing": 0}
+        async for entries in self._segments(snapshot_id, meta["files"]["segments"]):
+            for key, value in (await asyncio.to_thread(self._restore_files, entries)).items():
+                file_stats[key] += value
+
+        documents: Dict[str, int] = {}
+        new_refs: Dict[str, int] = defaultdict(int)
+        for name, info in meta["collections"].items():
+            documents[name] = 0
+            async for batch in self._segments(snapshot_id, info["segments"]):
+                if name == "blobs" and per_story:
+                    await self._restore_blob_refs(batch, new_refs)
+                else:
+                    result = await self.db[name].bulk_write(
+                        [ReplaceOne({"_id": doc["_id"]}, doc, upsert=True) for doc in batch],
+                        ordered=False
+                    )
+                    if name == "illustrations":
+                        for index in result.upserted_ids:
+                            if batch[index].get("blob"):
+                                new_refs[batch[index]["blob"]] += 1
+                documents[name] += len(batch)
+
+        logger.info(f"Restored backup {snapshot_id}: {file_stats['restored']} files, {documents}")
+        return {"snapshot_id": snapshot_id, "files": file_stats, "documents": documents}
+
+    async def _restore_blob_refs(self, blobs: List[Dict[str, Any]], new_refs: Dict[str, int]) -> None:
+        # A single story only owns some references to each blob, so restored
+        # illustration records add to the live refcount instead of replacing it
+        for blob in blobs:
+            fields = {k: v for k, v in blob.items() if k not in ("_id", "refs")}
+            await self.db.blobs.update_one(
+                {"_id": blob["_id"]},
+                {"$inc": {"refs": new_refs.get(blob["_id"], 0)}, "$setOnInsert": fields},
+                upsert=True
+            )
@@ -0,0 +1,159 @@
+import asyncio
+import hashlib
+import logging
+import os
+import re
+import tempfile
+import time
+import uuid
+from datetime import datetime
+from typing import Dict, Any, Optional
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ReturnDocument
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPES = {
+    "png": "image/png",
+    "webp": "image/webp",
+    "avif": "image/avif",
+    "jpg": "image/jpeg",
+}
+
+DIGEST = re.compile(r"^[0-9a-f]{64}$")
+
+
+class BlobStore:
+    # Content-addressed files under root/ab/cd/<sha256>.<ext>, reference counted
+    # in the `blobs` collection so identical images are stored once. While a
+    # release removes an unreferenced blob's files its document carries a
+    # `removing` tombstone, and a put arriving meanwhile writes its file again
+    # once the removal is done.
+    def __init__(self, db: AsyncIOMotorDatabase, root: str = "assets/blobs", removal_timeout: float = 30.0):
+        self.db = db
+        self.root = root
+        # A tombstone older than this was left by a releaser that died
+        self.removal_timeout = removal_timeout
+        os.makedirs(self.root, exist_ok=True)
+
+    @staticmethod
+    def digest(data: bytes) -> str:
+        return hashlib.sha256(data).hexdigest()
+
+    @staticmethod
+    def is_digest(value: str) -> bool:
+        return bool(DIGEST.match(value))
+
+    def path_for(self, digest: str, ext: str = "png") -> str:
+        return os.path.join(self.root, digest[:2], digest[2:4], f"{digest}.{ext}")
+
+    def _write_atomic(self, path: str, data: bytes) -> None:
+        if os.path.exists(path):
+            return
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        # Readers only ever see complete files: write a temp file, then rename
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, path)
+        except Exception:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+    async def put(self, data: bytes, ext: str = "png") -> Dict[str, Any]:
+        digest = self.digest(data)
+        path = self.path_for(digest, ext)
+        await asyncio.to_thread(self._write_atomic, path, data)
+        blob = await self.db.blobs.find_one_and_update(
+            {"_id": digest},
+            {
+                "$inc": {"refs": 1},
+                "$setOnInsert": {
+                    "path": path,
+                    "ext": ext,
+                    "size": len(data),
+                    "content_type": CONTENT_TYPES.get(ext, "application/octet-stream"),
+                    "created_at": datetime.utcnow(),
+                },
+            },
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        await self._wait_for_removal(blob)
+        # A concurrent release may have removed the file before our reference landed
+        if not os.path.exists(path):
+            await asyncio.to_thread(self._write_atomic, path, data)
+        return {"digest": digest, "path": path, "size": len(data)}
+
+    async def _wait_for_removal(self, blob: Optional[Dict[str, Any]]) -> None:
+        # Our reference keeps the document; the files are only safe to write
+        # again once the release that tombstoned it has finished removing them
+        deadline = time.monotonic() + self.removal_timeout
+        while blob is not None and blob.get("removing"):
+            if time.monotonic() > deadline:
+                await self.db.blobs.update_one(
+                    {"_id": blob["_id"], "removing": blob["removing"]},
+                    {"$unset": {"removing": ""}}
+                )
+                return
+            await asyncio.sleep(0.05)
+            blob = await self.db.blobs.find_one({"_id": blob["_id"]})
+
+    async def acquire(self, digest: str) -> Optional[Dict[str, Any]]:
+        # One more reference to a stored blob, for another story that uses
+        # it; None when the blob is gone or being removed
+        return await self.db.blobs.find_one_and_update(
+            {"_id": digest, "refs": {"$gt": 0}, "removing": None},
+            {"$inc": {"refs": 1}},
+            return_document=ReturnDocument.AFTER
+        )
+
+    async def put_derived(self, digest: str, ext: str, data: bytes) -> str:
+        # Derived files (e.g. renditions) share the blob's lifetime and refcount
+        path = self.path_for(digest, ext)
+        await asyncio.to_thread(self._write_atomic, path, data)
+        return path
+
+    def _remove_files(self, digest: str) -> None:
+        directory = os.path.dirname(self.path_for(digest))
+        if not os.path.isdir(directory):
+            return
+        for filename in os.listdir(directory):
+            if filename.startswith(f"{digest}."):
+                try:
+                    os.remove(os.path.join(directory, filename))
+                except FileNotFoundError:
+                    pass
+
+    async def get(self, digest: str) -> Optional[Dict[str, Any]]:
+        return await self.db.blobs.find_one({"_id": digest})
+
+    async def release(self, digest: str) -> None:
+        blob = await self.db.blobs.find_one_and_update(
+            {"_id": digest},
+            {"$inc": {"refs": -1}},
+            return_document=ReturnDocument.AFTER
+        )
+        if blob is None or blob["refs"] > 0:
+            return
+        # Only remove if nothing re-referenced the blob in the meantime
+        token = uuid.uuid4().hex
+        result = await self.db.blobs.update_one(
+            {"_id": digest, "refs": {"$lte": 0}, "removing": None},
+            {"$set": {"removing": token}}
+        )
+        if not result.modified_count:
+            return
+        try:
+            await asyncio.to_thread(self._remove_files, digest)
+        finally:
+            result = await self.db.blobs.delete_one({"_id": digest, "removing": token, "refs": {"$lte": 0}})
+            if not result.deleted_count:
+                # Re-referenced during the removal; that put writes the file again
+                await self.db.blobs.update_one({"_id": digest, "removing": token}, {"$unset": {"removing": ""}})
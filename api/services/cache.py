@@ -0,0 +1,182 @@
+import hashlib
+import logging
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Tuple
+import msgpack
+import orjson
+import zstandard
+from redis.asyncio import ConnectionPool, Redis
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+RAW_PREFIX = b"r"
+ZSTD_PREFIX = b"z"
+
+
+def canonical_json(payload: Any) -> bytes:
+    # Sorted keys make the encoding independent of dict insertion order
+    return orjson.dumps(payload, option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS, default=str)
+
+
+def cache_key(namespace: str, payload: Any) -> str:
+    # Content-addressed and stable across processes, unlike hash()
+    return f"{namespace}:{hashlib.sha256(canonical_json(payload)).hexdigest()}"
+
+
+class Serializer:
+    def __init__(self, fmt: str = "orjson", compress: bool = False, min_compress_size: int = 1024, level: int = 3):
+        if fmt not in ("orjson", "msgpack"):
+            raise ValueError(f"Unsupported cache serialization format: {fmt}")
+        self.fmt = fmt
+        self.compress = compress
+        self.min_compress_size = min_compress_size
+        self.compressor = zstandard.ZstdCompressor(level=level)
+        self.decompressor = zstandard.ZstdDecompressor()
+
+    def dumps(self, value: Any) -> bytes:
+        if self.fmt == "msgpack":
+            data = msgpack.packb(value, default=str, use_bin_type=True)
+        else:
+            data = orjson.dumps(value, default=str)
+        if self.compress and len(data) >= self.min_compress_size:
+            return ZSTD_PREFIX + self.compressor.compress(data)
+        return RAW_PREFIX + data
+
+    def loads(self, data: bytes) -> Any:
+        prefix, body = data[:1], data[1:]
+        if prefix == ZSTD_PREFIX:
+            body = self.decompressor.decompress(body)
+        elif prefix != RAW_PREFIX:
+            raise ValueError("Unknown cache payload encoding")
+        if self.fmt == "msgpack":
+            return msgpack.unpackb(body, raw=False)
+        return orjson.loads(body)
+
+
+class CacheBackend:
+    async def get(self, key: str) -> Optional[bytes]:
+        raise NotImplementedError
+
+    async def set(self, key: str, value: bytes, expire: int) -> None:
+        raise NotImplementedError
+
+    async def delete(self, key: str) -> None:
+        raise NotImplementedError
+
+    async def close(self) -> None:
+        pass
+
+
+class RedisCacheBackend(CacheBackend):
+    def __init__(self, redis_client: Redis):
+        self.redis_client = redis_client
+
+    @classmethod
+    def from_url(cls, url: str, max_connections: int = 50) -> "RedisCacheBackend":
+        pool = ConnectionPool.from_url(url, max_connections=max_connections)
+        return cls(Redis(connection_pool=pool))
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return await self.redis_client.get(key)
+
+    async def set(self, key: str, value: bytes, expire: int) -> None:
+        await self.redis_client.set(key, value, ex=expire)
+
+    async def delete(self, key: str) -> None:
+        await self.redis_client.delete(key)
+
+    async def close(self) -> None:
+        await self.redis_client.aclose()
+
+
+class MemoryCacheBackend(CacheBackend):
+    def __init__(self):
+        self.store: Dict[str, Tuple[bytes, float]] = {}
+
+    async def get(self, key: str) -> Optional[bytes]:
+        entry = self.store.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at <= time.monotonic():
+            del self.store[key]
+            return None
+        return value
+
+    async def set(self, key: str, value: bytes, expire: int) -> None:
+        self.store[key] = (value, time.monotonic() + expire)
+
+    async def delete(self, key: str) -> None:
+        self.store.pop(key, None)
+
+
+class LRUCache:
+    def __init__(self, max_entries: int = 1024, ttl: float = 300):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries: "OrderedDict[str, Tuple[bytes, float]]" = OrderedDict()
+
+    def get(self, key: str) -> Optional[bytes]:
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at <= time.monotonic():
+            del self.entries[key]
+            return None
+        self.entries.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: bytes, ttl: Optional[float] = None) -> None:
+        self.entries[key] = (value, time.monotonic() + min(ttl or self.ttl, self.ttl))
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def delete(self, key: str) -> None:
+        self.entries.pop(key, None)
+
+
+class ResultCache:
+    def __init__(
+        self,
+        backend: CacheBackend,
+        serializer: Optional[Serializer] = None,
+        local: Optional[LRUCache] = None
+    ):
+        self.backend = backend
+        self.serializer = serializer or Serializer()
+        self.local = local if local is not None else LRUCache()
+
+    async def get(self, key: str) -> Optional[Any]:
+        try:
+            data = self.local.get(key)
+            if data is None:
+                data = await self.backend.get(key)
+                if data is None:
+                    return None
+                self.local.set(key, data)
+            return self.serializer.loads(data)
+        except Exception as e:
+            logger.error(f"Error retrieving cached result: {str(e)}")
+            return None
+
+    async def set(self, key: str, value: Any, expire: int = 3600) -> None:
+        try:
+            data = self.serializer.dumps(value)
+            self.local.set(key, data, expire)
+            await self.backend.set(key, data, expire)
+        except Exception as e:
+            logger.error(f"Error caching result: {str(e)}")
+
+    async def delete(self, key: str) -> None:
+        self.local.delete(key)
+        try:
+            await self.backend.delete(key)
+        except Exception as e:
+            logger.error(f"Error deleting cached result: {str(e)}")
+
+    async def close(self) -> None:
+        await self.backend.close()
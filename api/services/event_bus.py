@@ -0,0 +1,153 @@
+import asyncio
+import logging
+import time
+import uuid
+from typing import Dict, Any, List, AsyncIterator, Callable, Optional
+import orjson
+from redis.asyncio import Redis
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+TERMINAL_EVENTS = ("completed", "failed")
+
+
+class StoryChannel:
+    def __init__(self):
+        self.history: List[Dict[str, Any]] = []
+        self.subscribers: List[asyncio.Queue] = []
+        self.closed_at = None
+        self.updated_at = time.monotonic()
+
+
+class RedisEventRelay:
+    # Carries events between processes over one Redis pub/sub channel, so a
+    # story run by a standalone worker or another API worker streams to
+    # subscribers everywhere. Each process listens on a single connection.
+    def __init__(self, redis_client: Redis, channel: str = "story_events"):
+        self.redis_client = redis_client
+        self.channel = channel
+        # Our own messages come back to us and are skipped
+        self.origin = uuid.uuid4().hex
+
+    async def send(self, story_id: str, message: Dict[str, Any]) -> None:
+        payload = {"origin": self.origin, "story_id": story_id, **message}
+        await self.redis_client.publish(self.channel, orjson.dumps(payload, default=str))
+
+    async def listen(self, deliver: Callable[[str, Dict[str, Any]], None]) -> None:
+        pubsub = self.redis_client.pubsub()
+        await pubsub.subscribe(self.channel)
+        try:
+            async for raw in pubsub.listen():
+                if raw["type"] != "message":
+                    continue
+                message = orjson.loads(raw["data"])
+                if message.pop("origin") != self.origin:
+                    deliver(message.pop("story_id"), message)
+        finally:
+            await pubsub.aclose()
+
+
+class StoryEventBus:
+    def __init__(
+        self,
+        retention: float = 600,
+        idle_timeout: float = 3600,
+        relay: Optional[RedisEventRelay] = None
+    ):
+        # Finished channels are kept briefly so late subscribers still get a replay
+        self.retention = retention
+        # Channels of stories that stopped without a terminal event (e.g. the
+        # process running them died) are dropped once idle this long, and
+        # their subscribers let go
+        self.idle_timeout = idle_timeout
+        self.relay = relay
+        self.channels: Dict[str, StoryChannel] = {}
+        self._listener: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        # Follows events published by other processes
+        if self.relay is not None and self._listener is None:
+            self._listener = asyncio.create_task(self._listen())
+
+    async def stop(self) -> None:
+        if self._listener is not None:
+            self._listener.cancel()
+            await asyncio.gather(self._listener, return_exceptions=True)
+            self._listener = None
+
+    async def _listen(self) -> None:
+        while True:
+            try:
+                await self.relay.listen(self._deliver)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"Story event relay disconnected, reconnecting: {str(e)}")
+                await asyncio.sleep(1.0)
+
+    def _channel(self, story_id: str) -> StoryChannel:
+        self._evict_expired()
+        channel = self.channels.get(story_id)
+        if channel is None:
+            channel = self.channels[story_id] = StoryChannel()
+        return channel
+
+    def _evict_expired(self) -> None:
+        now = time.monotonic()
+        expired = [
+            story_id for story_id, channel in self.channels.items()
+            if (channel.closed_at is not None and now - channel.closed_at > self.retention)
+            or (not channel.subscribers and now - channel.updated_at > self.idle_timeout)
+        ]
+        for story_id in expired:
+            del self.channels[story_id]
+
+    def has_channel(self, story_id: str) -> bool:
+        self._evict_expired()
+        return str(story_id) in self.channels
+
+    async def publish(self, story_id: str, event: str, data: Dict[str, Any]) -> None:
+        message = {"event": event, "data": data}
+        self._deliver(str(story_id), message)
+        if self.relay is not None:
+            try:
+                await self.relay.send(str(story_id), message)
+            except Exception as e:
+                logger.warning(f"Could not relay {event} event for story {story_id}: {str(e)}")
+
+    def _deliver(self, story_id: str, message: Dict[str, Any]) -> None:
+        channel = self._channel(story_id)
+        event = message["event"]
+        if channel.closed_at is not None and event not in TERMINAL_EVENTS:
+            # A new run on a finished channel (a retried story, or the next
+            # flight for the same parameters) starts a fresh history
+            channel.history = []
+            channel.closed_at = None
+        channel.history.append(message)
+        channel.updated_at = time.monotonic()
+        for queue in channel.subscribers:
+            queue.put_nowait(message)
+        if event in TERMINAL_EVENTS:
+            channel.closed_at = time.monotonic()
+
+    async def subscribe(self, story_id: str, replay_finished: bool = True) -> AsyncIterator[Dict[str, Any]]:
+        channel = self._channel(str(story_id))
+        queue: asyncio.Queue = asyncio.Queue()
+        # Replay what already happened, then follow live events. Without
+        # replay_finished, a finished run is skipped and the next one followed.
+        if replay_finished or channel.closed_at is None:
+            for message in channel.history:
+                queue.put_nowait(message)
+        channel.subscribers.append(queue)
+        try:
+            while True:
+                try:
+                    message = await asyncio.wait_for(queue.get(), self.idle_timeout)
+                except asyncio.TimeoutError:
+                    return
+                yield message
+                if message["event"] in TERMINAL_EVENTS:
+                    return
+        finally:
+            channel.subscribers.remove(queue)
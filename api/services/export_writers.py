@@ -0,0 +1,338 @@
+import html
+import io
+import os
+import tempfile
+import zipfile
+import zlib
+from typing import Dict, Any, List, Optional, Tuple, BinaryIO
+from PIL import Image
+
+# A book is {"title", "subtitle", "blocks": [...]}, each block one of
+#   {"type": "heading", "text": ...}
+#   {"type": "paragraph", "text": ...}
+#   {"type": "image", "path": ...}
+# Everything here runs in an export worker process. Both writers emit each
+# block as soon as it is laid out, so memory stays at about one page however
+# long the book, and report progress to a small file the server polls.
+
+PAGE_WIDTH, PAGE_HEIGHT = 595, 842  # A4 in points
+MARGIN = 56
+BODY_SIZE, BODY_LEADING = 12, 17
+HEADING_SIZE, HEADING_LEADING = 18, 24
+TITLE_SIZE = 30
+IMAGE_MAX_HEIGHT = 420
+IMAGE_MAX_PIXELS = 1200
+JPEG_QUALITY = 85
+
+# Helvetica advance widths (1/1000 em) for ASCII 32-126, from the standard AFM
+HELVETICA_WIDTHS = [
+    278, 278, 355, 556, 556, 889, 667, 191, 333, 333, 389, 584, 278, 333, 278, 278,
+    556, 556, 556, 556, 556, 556, 556, 556, 556, 556, 278, 278, 584, 584, 584, 556,
+    1015, 667, 667, 722, 722, 667, 611, 778, 722, 278, 500, 667, 556, 833, 722, 778,
+    667, 778, 722, 667, 611, 722, 667, 944, 667, 667, 611, 278, 278, 278, 469, 556,
+    333, 556, 556, 500, 556, 556, 278, 556, 556, 222, 222, 500, 222, 833, 556, 556,
+    556, 556, 333, 500, 278, 556, 500, 722, 500, 500, 500, 334, 260, 334, 584,
+]
+# Bold glyphs run about 6% wider; close enough for line breaking
+BOLD_FACTOR = 1.06
+
+
+def text_width(text: str, size: float, bold: bool = False) -> float:
+    units = sum(HELVETICA_WIDTHS[ord(c) - 32] if 32 <= ord(c) <= 126 else 556 for c in text)
+    return units * size / 1000 * (BOLD_FACTOR if bold else 1.0)
+
+
+def wrap_text(text: str, size: float, width: float, bold: bool = False) -> List[str]:
+    lines = []
+    for paragraph_line in text.splitlines() or [""]:
+        current = ""
+        for word in paragraph_line.split():
+            candidate = f"{current} {word}" if current else word
+            if current and text_width(candidate, size, bold) > width:
+                lines.append(current)
+                current = word
+            else:
+                current = candidate
+        lines.append(current)
+    return lines
+
+
+def jpeg_image(path: str) -> Tuple[bytes, int, int]:
+    # Illustrations are re-encoded as baseline JPEG, which PDF and EPUB readers
+    # both embed without decoding
+    with Image.open(path) as image:
+        image.thumbnail((IMAGE_MAX_PIXELS, IMAGE_MAX_PIXELS), Image.Resampling.LANCZOS)
+        if image.mode != "RGB":
+            image = image.convert("RGB")
+        buffer = io.BytesIO()
+        image.save(buffer, "JPEG", quality=JPEG_QUALITY)
+        return buffer.getvalue(), image.width, image.height
+
+
+class ProgressFile:
+    # "<done> <total>" rewritten in place; the server only ever reads it
+    def __init__(self, path: Optional[str], total: int):
+        self.path = path
+        self.total = max(1, total)
+        self.done = 0
+
+    def step(self) -> None:
+        self.done += 1
+        if self.path:
+            temp_path = f"{self.path}.tmp"
+            with open(temp_path, "w") as f:
+                f.write(f"{self.done} {self.total}")
+            os.replace(temp_path, self.path)
+
+
+def read_progress(path: str) -> float:
+    try:
+        with open(path) as f:
+            done, total = f.read().split()
+        return int(done) / int(total)
+    except (OSError, ValueError):
+        return 0.0
+
+
+def _pdf_string(text: str) -> bytes:
+    data = text.encode("cp1252", errors="replace")
+    return b"(" + data.replace(b"\\", b"\\\\").replace(b"(", b"\\(").replace(b")", b"\\)") + b")"
+
+
+class PdfWriter:
+    # Minimal PDF 1.4 writer: Helvetica text and JPEG images. Pages and images
+    # are written out as they are finished; only object offsets are kept.
+    CATALOG, PAGES, FONT, BOLD_FONT = 1, 2, 3, 4
+
+    def __init__(self, out: BinaryIO):
+        self.out = out
+        self.offsets: Dict[int, int] = {}
+        self.next_id = 5
+        self.pages: List[int] = []
+        self.ops: List[bytes] = []
+        self.images: List[int] = []
+        self.y = PAGE_HEIGHT - MARGIN
+        self.out.write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+        for font_id, name in ((self.FONT, b"Helvetica"), (self.BOLD_FONT, b"Helvetica-Bold")):
+            self._object(font_id, b"<< /Type /Font /Subtype /Type1 /BaseFont /" + name + b" /Encoding /WinAnsiEncoding >>")
+
+    def _allocate(self) -> int:
+        object_id = self.next_id
+        self.next_id += 1
+        return object_id
+
+    def _object(self, object_id: int, body: bytes, stream: Optional[bytes] = None) -> None:
+        self.offsets[object_id] = self.out.tell()
+        self.out.write(f"{object_id} 0 obj\n".encode() + body)
+        if stream is not None:
+            self.out.write(b"\nstream\n" + stream + b"\nendstream")
+        self.out.write(b"\nendobj\n")
+
+    def _ensure_space(self, height: float) -> None:
+        if self.y - height < MARGIN:
+            self.new_page()
+
+    def new_page(self) -> None:
+        if not self.ops:
+            return
+        content = zlib.compress(b"\n".join(self.ops))
+        content_id, page_id = self._allocate(), self._allocate()
+        self._object(content_id, f"<< /Length {len(content)} /Filter /FlateDecode >>".encode(), content)
+        xobjects = b" ".join(f"/Im{i} {i} 0 R".encode() for i in self.images)
+        self._object(page_id, (
+            f"<< /Type /Page /Parent {self.PAGES} 0 R /MediaBox [0 0 {PAGE_WIDTH} {PAGE_HEIGHT}] "
+            f"/Contents {content_id} 0 R /Resources << /Font << /F1 {self.FONT} 0 R /F2 {self.BOLD_FONT} 0 R >> "
+        ).encode() + b"/XObject << " + xobjects + b" >> >> >>")
+        self.pages.append(page_id)
+        self.ops = []
+        self.images = []
+        self.y = PAGE_HEIGHT - MARGIN
+
+    def text_line(self, text: str, size: float, leading: float, bold: bool = False, center: bool = False) -> None:
+        self._ensure_space(leading)
+        self.y -= leading
+        x = (PAGE_WIDTH - text_width(text, size, bold)) / 2 if center else MARGIN
+        font = b"/F2" if bold else b"/F1"
+        self.ops.append(b"BT " + font + f" {size} Tf {x:.2f} {self.y:.2f} Td ".encode() + _pdf_string(text) + b" Tj ET")
+
+    def title_page(self, title: str, subtitle: str) -> None:
+        self.y = PAGE_HEIGHT * 0.62
+        for line in wrap_text(title, TITLE_SIZE, PAGE_WIDTH - 2 * MARGIN, bold=True):
+            self.text_line(line, TITLE_SIZE, TITLE_SIZE * 1.3, bold=True, center=True)
+        if subtitle:
+            self.y -= BODY_LEADING
+            self.text_line(subtitle, BODY_SIZE + 2, BODY_LEADING, center=True)
+        self.new_page()
+
+    def heading(self, text: str) -> None:
+        # Keep a heading together with at least two lines of what follows
+        self._ensure_space(HEADING_LEADING * 2 + BODY_LEADING * 2)
+        self.y -= HEADING_LEADING / 2
+        for line in wrap_text(text, HEADING_SIZE, PAGE_WIDTH - 2 * MARGIN, bold=True):
+            self.text_line(line, HEADING_SIZE, HEADING_LEADING, bold=True)
+        self.y -= BODY_LEADING / 2
+
+    def paragraph(self, text: str) -> None:
+        for line in wrap_text(text, BODY_SIZE, PAGE_WIDTH - 2 * MARGIN):
+            self.text_line(line, BODY_SIZE, BODY_LEADING)
+        self.y -= BODY_LEADING / 2
+
+    def image(self, path: str) -> None:
+        data, width, height = jpeg_image(path)
+        scale = min((PAGE_WIDTH - 2 * MARGIN) / width, IMAGE_MAX_HEIGHT / height)
+        draw_width, draw_height = width * scale, height * scale
+        self._ensure_space(draw_height + BODY_LEADING)
+        image_id = self._allocate()
+        self._object(image_id, (
+            f"<< /Type /XObject /Subtype /Image /Width {width} /Height {height} "
+            f"/ColorSpace /DeviceRGB /BitsPerComponent 8 /Filter /DCTDecode /Length {len(data)} >>"
+        ).encode(), data)
+        self.images.append(image_id)
+        self.y -= draw_height
+        x = (PAGE_WIDTH - draw_width) / 2
+        self.ops.append(f"q {draw_width:.2f} 0 0 {draw_height:.2f} {x:.2f} {self.y:.2f} cm /Im{image_id} Do Q".encode())
+        self.y -= BODY_LEADING
+
+    def close(self) -> None:
+        self.new_page()
+        kids = " ".join(f"{page_id} 0 R" for page_id in self.pages)
+        self._object(self.PAGES, f"<< /Type /Pages /Kids [{kids}] /Count {len(self.pages)} >>".encode())
+        self._object(self.CATALOG, f"<< /Type /Catalog /Pages {self.PAGES} 0 R >>".encode())
+        xref_offset = self.out.tell()
+        self.out.write(f"xref\n0 {self.next_id}\n0000000000 65535 f \n".encode())
+        for object_id in range(1, self.next_id):
+            self.out.write(f"{self.offsets.get(object_id, 0):010d} 00000 n \n".encode())
+        self.out.write(f"trailer\n<< /Size {self.next_id} /Root {self.CATALOG} 0 R >>\nstartxref\n{xref_offset}\n%%EOF\n".encode())
+
+
+def write_pdf(book: Dict[str, Any], out: BinaryIO, progress: ProgressFile) -> None:
+    writer = PdfWriter(out)
+    writer.title_page(book["title"], book.get("subtitle", ""))
+    progress.step()
+    for block in book["blocks"]:
+        if block["type"] == "heading":
+            writer.heading(block["text"])
+        elif block["type"] == "paragraph":
+            writer.paragraph(block["text"])
+        elif block["type"] == "image":
+            writer.image(block["path"])
+        progress.step()
+    writer.close()
+
+
+EPUB_CONTAINER = """<?xml version="1.0" encoding="UTF-8"?>
+<container version="1.0" xmlns="urn:oasis:names:tc:opendocument:xmlns:container">
+  <rootfiles><rootfile full-path="OEBPS/content.opf" media-type="application/oebps-package+xml"/></rootfiles>
+</container>
+"""
+
+EPUB_CSS = """body { font-family: serif; line-height: 1.5; margin: 0 5%; }
+h1, h2 { font-family: sans-serif; }
+figure { margin: 1em 0; text-align: center; }
+img { max-width: 100%; height: auto; }
+"""
+
+
+def _xhtml(title: str, body: str) -> str:
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>\n<!DOCTYPE html>\n'
+        '<html xmlns="http://www.w3.org/1999/xhtml" xmlns:epub="http://www.idpf.org/2007/ops">\n'
+        f'<head><title>{html.escape(title)}</title><link rel="stylesheet" href="style.css"/></head>\n'
+        f"<body>\n{body}\n</body>\n</html>\n"
+    )
+
+
+def write_epub(book: Dict[str, Any], out: BinaryIO, progress: ProgressFile, identifier: str) -> None:
+    # EPUB 3: one XHTML file per heading, images as separate JPEG entries.
+    # Entries are written to the zip as each chapter completes.
+    title = book["title"]
+    manifest = ['<item id="nav" href="nav.xhtml" media-type="application/xhtml+xml" properties="nav"/>',
+                '<item id="css" href="style.css" media-type="text/css"/>']
+    spine: List[str] = []
+    toc: List[Tuple[str, str]] = []
+
+    with zipfile.ZipFile(out, "w", zipfile.ZIP_DEFLATED) as archive:
+        # The mimetype entry must come first and be stored uncompressed
+        archive.writestr(zipfile.ZipInfo("mimetype"), "application/epub+zip", compress_type=zipfile.ZIP_STORED)
+        archive.writestr("META-INF/container.xml", EPUB_CONTAINER)
+        archive.writestr("OEBPS/style.css", EPUB_CSS)
+
+        chapter: List[str] = [f"<h1>{html.escape(title)}</h1>"]
+        if book.get("subtitle"):
+            chapter.append(f"<p><em>{html.escape(book['subtitle'])}</em></p>")
+        chapter_title = title
+        image_count = 0
+
+        def flush() -> None:
+            if not chapter:
+                return
+            name = f"chapter-{len(spine) + 1:03d}"
+            archive.writestr(f"OEBPS/{name}.xhtml", _xhtml(chapter_title, "\n".join(chapter)))
+            manifest.append(f'<item id="{name}" href="{name}.xhtml" media-type="application/xhtml+xml"/>')
+            spine.append(name)
+            toc.append((f"{name}.xhtml", chapter_title))
+            chapter.clear()
+
+        progress.step()
+        for block in book["blocks"]:
+            if block["type"] == "heading":
+                flush()
+                chapter_title = block["text"]
+                chapter.append(f"<h2>{html.escape(block['text'])}</h2>")
+            elif block["type"] == "paragraph":
+                chapter.extend(f"<p>{html.escape(line)}</p>" for line in block["text"].splitlines() if line.strip())
+            elif block["type"] == "image":
+                image_count += 1
+                name = f"image-{image_count:03d}.jpg"
+                data, _, _ = jpeg_image(block["path"])
+                archive.writestr(f"OEBPS/images/{name}", data, compress_type=zipfile.ZIP_STORED)
+                manifest.append(f'<item id="img{image_count}" href="images/{name}" media-type="image/jpeg"/>')
+                chapter.append(f'<figure><img src="images/{name}" alt="Illustration {image_count}"/></figure>')
+            progress.step()
+        flush()
+
+        nav = "\n".join(f'<li><a href="{href}">{html.escape(label)}</a></li>' for href, label in toc)
+        archive.writestr("OEBPS/nav.xhtml", _xhtml(title, f'<nav epub:type="toc"><h1>Contents</h1><ol>\n{nav}\n</ol></nav>'))
+        itemrefs = "\n    ".join(f'<itemref idref="{name}"/>' for name in spine)
+        archive.writestr("OEBPS/content.opf", f"""<?xml version="1.0" encoding="UTF-8"?>
+<package xmlns="http://www.idpf.org/2007/opf" version="3.0" unique-identifier="book-id">
+  <metadata xmlns:dc="http://purl.org/dc/elements/1.1/">
+    <dc:identifier id="book-id">urn:taleweaver:{html.escape(identifier)}</dc:identifier>
+    <dc:title>{html.escape(title)}</dc:title>
+    <dc:language>{html.escape(book.get("language", "en"))}</dc:language>
+    <meta property="dcterms:modified">{book["modified"]}</meta>
+  </metadata>
+  <manifest>
+    {chr(10).join("    " + item for item in manifest).strip()}
+  </manifest>
+  <spine>
+    {itemrefs}
+  </spine>
+</package>
+""")
+
+
+def render_export(fmt: str, book: Dict[str, Any], path: str, progress_path: Optional[str] = None) -> str:
+    # Module-level so it can run in a ProcessPoolExecutor. Writes to a temp
+    # file and renames, so a file at `path` is always a complete export.
+    total = 1 + len(book["blocks"])
+    progress = ProgressFile(progress_path, total)
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as out:
+            if fmt == "pdf":
+                write_pdf(book, out, progress)
+            elif fmt == "epub":
+                write_epub(book, out, progress, os.path.basename(path).split(".")[0])
+            else:
+                raise ValueError(f"Unsupported export format: {fmt}")
+            out.flush()
+            os.fsync(out.fileno())
+        os.replace(temp_path, path)
+    except Exception:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    return path
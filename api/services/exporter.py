@@ -0,0 +1,215 @@
+import asyncio
+import hashlib
+import logging
+import os
+import re
+import time
+from concurrent.futures import Executor
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from .blob_store import BlobStore
+from .cache import canonical_json
+from .export_writers import render_export, read_progress
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+EXPORT_FORMATS = {"pdf": "application/pdf", "epub": "application/epub+zip"}
+# Bump when the layout changes so cached exports are rebuilt
+EXPORT_LAYOUT_VERSION = 1
+EXPORT_NAME = re.compile(r"^[0-9a-f]{64}\.(pdf|epub)$")
+
+
+def _text(value: Any) -> str:
+    if isinstance(value, str):
+        return value
+    if isinstance(value, dict):
+        return "\n".join(f"{key}: {_text(item)}" for key, item in value.items())
+    if isinstance(value, (list, tuple)):
+        return "\n".join(_text(item) for item in value)
+    return "" if value is None else str(value)
+
+
+def _paragraphs(text: str) -> List[str]:
+    return [block.strip() for block in re.split(r"\n\s*\n", text) if block.strip()]
+
+
+def story_version(story: Dict[str, Any], fmt: str) -> str:
+    # Hash of everything that ends up in the file; an edited or regenerated
+    # story gets a new version and therefore a new export
+    return hashlib.sha256(canonical_json({
+        "layout": EXPORT_LAYOUT_VERSION,
+        "format": fmt,
+        "parameters": story.get("parameters", {}),
+        "content": {field: story.get(field) for field in ("outline", "characters", "plot", "illustrations")},
+    })).hexdigest()
+
+
+class ExportJob:
+    def __init__(self, version: str, fmt: str, progress_path: str):
+        self.version = version
+        self.format = fmt
+        self.progress_path = progress_path
+        self.started_at = time.monotonic()
+        self.task: Optional[asyncio.Task] = None
+
+    @property
+    def progress(self) -> int:
+        # The last few percent are the final flush and rename
+        return min(99, round(read_progress(self.progress_path) * 100))
+
+
+class ExportEngine:
+    # Renders stories to PDF or EPUB in worker processes, writing each page to
+    # disk as it goes. Files are named by story version, so an unchanged story
+    # is exported once and served from disk after that.
+    def __init__(
+        self,
+        db: AsyncIOMotorDatabase,
+        blob_store: BlobStore,
+        executor: Optional[Executor] = None,
+        root: str = "exports",
+        max_bytes: int = 2 * 1024 ** 3
+    ):
+        self.db = db
+        self.blob_store = blob_store
+        self.executor = executor
+        self.root = root
+        self.max_bytes = max_bytes
+        self.jobs: Dict[str, ExportJob] = {}
+        os.makedirs(self.root, exist_ok=True)
+
+    def path_for(self, version: str, fmt: str) -> str:
+        return os.path.join(self.root, f"{version}.{fmt}")
+
+    def download_url(self, version: str, fmt: str) -> str:
+        return f"/api/exports/{version}.{fmt}"
+
+    async def _image_path(self, url: str) -> Optional[str]:
+        if url.startswith("/api/assets/"):
+            blob = await self.blob_store.get(url.rsplit("/", 1)[-1])
+            path = blob["path"] if blob else None
+        else:
+            # Stories from before content addressing stored file paths
+            path = url
+        return path if path and os.path.exists(path) else None
+
+    async def build_book(self, story: Dict[str, Any]) -> Dict[str, Any]:
+        parameters = story.get("parameters", {})
+        subtitle = ", ".join(part for part in (
+            f"A {parameters['tone'].lower()} tale" if parameters.get("tone") else "",
+            f"for ages {parameters['age_group']}" if parameters.get("age_group") else "",
+            parameters.get("region", ""),
+        ) if part)
+
+        images = [path for path in [await self._image_path(url) for url in story.get("illustrations", [])] if path]
+        blocks: List[Dict[str, Any]] = [{"type": "heading", "text": "The Story"}]
+        # Each illustration follows the scene it was drawn for; any left over
+        # (e.g. from a plot without scene markers) close the story
+        remaining = list(images)
+        for paragraph in _paragraphs(_text(story.get("plot"))):
+            blocks.append({"type": "paragraph", "text": paragraph})
+            if "Scene:" in paragraph and remaining:
+                blocks.append({"type": "image", "path": remaining.pop(0)})
+        blocks += [{"type": "image", "path": path} for path in remaining]
+
+        characters = _paragraphs(_text(story.get("characters")))
+        if characters:
+            blocks.append({"type": "heading", "text": "Characters"})
+            blocks += [{"type": "paragraph", "text": paragraph} for paragraph in characters]
+
+        modified = story.get("created_at")
+        if not isinstance(modified, datetime):
+            modified = datetime.utcnow()
+        return {
+            "title": parameters.get("title") or parameters.get("theme") or "A TaleWeaver Story",
+            "subtitle": subtitle,
+            "language": parameters.get("language", "en"),
+            "modified": modified.strftime("%Y-%m-%dT%H:%M:%SZ"),
+            "blocks": blocks,
+        }
+
+    async def export(self, story: Dict[str, Any], fmt: str) -> Dict[str, Any]:
+        # Returns the export's state; call again to follow a running export
+        if fmt not in EXPORT_FORMATS:
+            raise ValueError(f"format must be one of {list(EXPORT_FORMATS)}")
+        version = story_version(story, fmt)
+        path = self.path_for(version, fmt)
+        if os.path.exists(path):
+            # Touched so pruning drops the least recently requested exports
+            os.utime(path)
+            return self._state(version, fmt, "ready", 100)
+
+        job = self.jobs.get(version)
+        if job is None:
+            job = self.jobs[version] = ExportJob(version, fmt, os.path.join(self.root, f".{version}.progress"))
+            job.task = asyncio.create_task(self._run(job, story))
+            # Failures are logged in _run and raised to the next caller, if any
+            job.task.add_done_callback(lambda task: task.cancelled() or task.exception())
+        if job.task.done():
+            self.jobs.pop(version, None)
+            error = job.task.exception()
+            if error is not None:
+                raise error
+            return self._state(version, fmt, "ready", 100)
+        return self._state(version, fmt, "running", job.progress)
+
+    def _state(self, version: str, fmt: str, status: str, progress: int) -> Dict[str, Any]:
+        state = {"status": status, "export_id": version, "format": fmt, "progress": progress}
+        if status == "ready":
+            state["download_url"] = self.download_url(version, fmt)
+        return state
+
+    async def _run(self, job: ExportJob, story: Dict[str, Any]) -> str:
+        try:
+            book = await self.build_book(story)
+            loop = asyncio.get_running_loop()
+            path = await loop.run_in_executor(
+                self.executor,
+                render_export,
+                job.format,
+                book,
+                self.path_for(job.version, job.format),
+                job.progress_path
+            )
+            logger.info(f"Exported {os.path.basename(path)} in {(time.monotonic() - job.started_at) * 1000:.0f}ms")
+            await asyncio.to_thread(self.prune)
+            # Finished jobs are only needed until the file is visible
+            self.jobs.pop(job.version, None)
+            return path
+        except Exception as e:
+            logger.error(f"Error exporting story: {str(e)}")
+            raise
+        finally:
+            try:
+                os.remove(job.progress_path)
+            except FileNotFoundError:
+                pass
+
+    async def wait(self, story: Dict[str, Any], fmt: str, interval: float = 0.25) -> Dict[str, Any]:
+        state = await self.export(story, fmt)
+        while state["status"] != "ready":
+            await asyncio.sleep(interval)
+            state = await self.export(story, fmt)
+        return state
+
+    def prune(self) -> int:
+        # Least recently requested exports go first once over the size budget
+        entries = []
+        for name in os.listdir(self.root):
+            if EXPORT_NAME.match(name):
+                stat = os.stat(os.path.join(self.root, name))
+                entries.append((stat.st_mtime, stat.st_size, name))
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for _, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.root, name))
+            except FileNotFoundError:
+                pass
+            total -= size
+            removed += 1
+        return removed
@@ -0,0 +1,78 @@
+import os
+import re
+from typing import Optional, Tuple, AsyncIterator
+import anyio
+from fastapi import Request
+from fastapi.responses import FileResponse, Response, StreamingResponse
+
+CHUNK_SIZE = 64 * 1024
+RANGE_PATTERN = re.compile(r"^bytes=(\d*)-(\d*)$")
+IMMUTABLE_CACHE = "public, max-age=31536000, immutable"
+
+
+def parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    # Single byte ranges only; multipart ranges are not worth it for images
+    match = RANGE_PATTERN.match(header.strip())
+    if not match or not (match.group(1) or match.group(2)):
+        return None
+    start, end = match.groups()
+    if not start:
+        length = int(end)
+        if length == 0:
+            return None
+        return max(0, size - length), size - 1
+    start = int(start)
+    end = min(int(end), size - 1) if end else size - 1
+    if start > end or start >= size:
+        return None
+    return start, end
+
+
+async def iter_file_range(path: str, start: int, end: int) -> AsyncIterator[bytes]:
+    async with await anyio.open_file(path, "rb") as f:
+        await f.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = await f.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def immutable_file_response(
+    request: Request,
+    path: str,
+    etag: str,
+    media_type: str,
+    download_name: Optional[str] = None
+) -> Response:
+    # Content-addressed files never change, so the digest is a strong ETag
+    quoted_etag = f'"{etag}"'
+    headers = {"ETag": quoted_etag, "Cache-Control": IMMUTABLE_CACHE, "Accept-Ranges": "bytes"}
+    if download_name:
+        headers["Content-Disposition"] = f'attachment; filename="{download_name}"'
+    if quoted_etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+
+    size = os.path.getsize(path)
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if not range_header or (if_range and if_range != quoted_etag):
+        # Streams the file in chunks rather than loading it into memory
+        return FileResponse(path, media_type=media_type, headers=headers)
+
+    byte_range = parse_range(range_header, size)
+    if byte_range is None:
+        return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+    start, end = byte_range
+    headers.update({
+        "Content-Range": f"bytes {start}-{end}/{size}",
+        "Content-Length": str(end - start + 1),
+    })
+    return StreamingResponse(
+        iter_file_range(path, start, end),
+        status_code=206,
+        media_type=media_type,
+        headers=headers
+    )
@@ -0,0 +1,84 @@
+import asyncio
+import base64
+import io
+import logging
+from concurrent.futures import Executor
+from typing import Optional, TYPE_CHECKING
+from PIL import Image
+
+if TYPE_CHECKING:
+    import openai
+    from stability_sdk import client
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+MAX_IMAGE_SIZE = 1024
+# The SDXL 1024 engine only renders a fixed set of dimensions
+STABILITY_SIZE = 1024
+
+
+def optimize_image(image: Image.Image, max_size: int = MAX_IMAGE_SIZE) -> Image.Image:
+    # Resize if too large
+    if max(image.size) > max_size:
+        ratio = max_size / max(image.size)
+        new_size = tuple(int(dim * ratio) for dim in image.size)
+        image = image.resize(new_size, Image.Resampling.LANCZOS)
+    return image
+
+
+def process_image_bytes(image_data: bytes, max_size: int = MAX_IMAGE_SIZE) -> bytes:
+    # Module-level so it can also run in a ProcessPoolExecutor
+    image = Image.open(io.BytesIO(image_data))
+    image = optimize_image(image, max_size)
+    buffer = io.BytesIO()
+    image.save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+class DalleBackend:
+    def __init__(self, openai_client: "openai.AsyncOpenAI"):
+        self.openai_client = openai_client
+
+    async def generate(self, prompt: str, size: int = MAX_IMAGE_SIZE) -> bytes:
+        if size < MAX_IMAGE_SIZE:
+            # DALL-E 3 only renders 1024px and up; smaller images come from the
+            # cheaper DALL-E 2, which takes prompts of up to 1000 characters
+            request = {"model": "dall-e-2", "prompt": prompt[:1000], "size": "512x512"}
+        else:
+            request = {"model": "dall-e-3", "prompt": prompt, "size": "1024x1024", "quality": "standard"}
+        # Ask for the image inline rather than a URL that expires
+        response = await self.openai_client.images.generate(**request, response_format="b64_json", n=1)
+        return base64.b64decode(response.data[0].b64_json)
+
+
+class StabilityBackend:
+    def __init__(self, stability_client: "client.StabilityInference", executor: Optional[Executor] = None):
+        self.stability_client = stability_client
+        self.executor = executor
+
+    def _generate_sync(self, prompt: str, size: int = MAX_IMAGE_SIZE) -> bytes:
+        # Deferred with the client itself; the gRPC stubs are slow to import
+        import stability_sdk.interfaces.gooseai.generation.generation_pb2 as generation
+
+        # The SDK streams answers over a blocking gRPC call
+        answers = self.stability_client.generate(
+            prompt=prompt,
+            # Always rendered at a size the engine accepts; smaller images take
+            # fewer steps and are scaled down afterwards
+            steps=50 if size >= MAX_IMAGE_SIZE else 30,
+            cfg_scale=8.0,
+            width=STABILITY_SIZE,
+            height=STABILITY_SIZE,
+            samples=1,
+            sampler=generation.SAMPLER_K_DPMPP_2M
+        )
+        for answer in answers:
+            for artifact in answer.artifacts:
+                if artifact.type == generation.ARTIFACT_IMAGE:
+                    return artifact.binary
+        raise ValueError("Stability response contained no image artifact")
+
+    async def generate(self, prompt: str, size: int = MAX_IMAGE_SIZE) -> bytes:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, self._generate_sync, prompt, size)
@@ -1,59 +1,62 @@
+import asyncio
 import logging
-from typing import Dict, Any, List
-import openai
-from stability_sdk import client
-import stability_sdk.interfaces.gooseai.generation.generation_pb2 as generation
+from concurrent.futures import Executor
+from typing import Dict, Any, List, Optional, TYPE_CHECKING
 from PIL import Image
-import io
-import os
 from tenacity import retry, stop_after_attempt, wait_exponential
+from .metrics import record_retry, track_image
+from .image_backends import DalleBackend, StabilityBackend, MAX_IMAGE_SIZE, optimize_image, process_image_bytes
+
+if TYPE_CHECKING:
+    import openai
+    from stability_sdk import client
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 class ImageGenerator:
-    def __init__(self, openai_client: openai.OpenAI, stability_client: client.StabilityInference):
+    def __init__(
+        self,
+        openai_client: "openai.AsyncOpenAI",
+        stability_client: "client.StabilityInference",
+        io_executor: Optional[Executor] = None,
+        image_executor: Optional[Executor] = None
+    ):
         self.openai_client = openai_client
         self.stability_client = stability_client
+        # Blocking gRPC calls and PIL work never run on the event loop
+        self.image_executor = image_executor
+        self.dalle_backend = DalleBackend(openai_client)
+        self.stability_backend = StabilityBackend(stability_client, io_executor)
 
     @retry(
         stop=stop_after_attempt(3),
-        wait=wait_exponential(multiplier=1, min=4, max=10)
+        wait=wait_exponential(multiplier=1, min=4, max=10),
+        before_sleep=record_retry
     )
-    async def generate_dalle(self, prompt: str, style: Dict[str, Any]) -> str:
+    async def generate_dalle(self, prompt: str, style: Dict[str, Any]) -> bytes:
         try:
-            response = await self.openai_client.images.generate(
-                model="dall-e-3",
-                prompt=self._enhance_prompt(prompt, style),
-                size="1024x1024",
-                quality="standard",
-                n=1
-            )
-            return response.data[0].url
+            return await self.dalle_backend.generate(self._enhance_prompt(prompt, style), self._size(style))
         except Exception as e:
             logger.error(f"DALL-E generation error: {str(e)}")
             raise
 
     @retry(
         stop=stop_after_attempt(3),
-        wait=wait_exponential(multiplier=1, min=4, max=10)
+        wait=wait_exponential(multiplier=1, min=4, max=10),
+        before_sleep=record_retry
     )
     async def generate_stable_diffusion(self, prompt: str, style: Dict[str, Any]) -> bytes:
         try:
-            response = self.stability_client.generate(
-                prompt=self._enhance_prompt(prompt, style),
-                steps=50,
-                cfg_scale=8.0,
-                width=1024,
-                height=1024,
-                samples=1,
-                sampler=generation.SAMPLER_K_DPMPP_2M
-            )
-            return response[0].artifacts[0].binary
+            return await self.stability_backend.generate(self._enhance_prompt(prompt, style), self._size(style))
         except Exception as e:
             logger.error(f"Stable Diffusion generation error: {str(e)}")
             raise
 
+    def _size(self, style: Dict[str, Any]) -> int:
+        # Stories admitted under load ask for smaller images
+        return min(int(style.get("size", MAX_IMAGE_SIZE)), MAX_IMAGE_SIZE)
+
     def _enhance_prompt(self, prompt: str, style: Dict[str, Any]) -> str:
         style_desc = f"""
         Style: {style.get('style', 'Traditional African Art')},
@@ -67,30 +70,30 @@ class ImageGenerator:
         self,
         prompt: str,
         style: Dict[str, Any],
-        engine: str = "dalle"
-    ) -> str:
+        engine: str = "dalle",
+        with_retries: bool = True
+    ) -> bytes:
+        # with_retries=False makes a single attempt; the image scheduler retries
+        # on the other engine within the story deadline instead of backing off
         try:
             if engine == "dalle":
-                return await self.generate_dalle(prompt, style)
+                async with track_image("dalle"):
+                    if with_retries:
+                        image_data = await self.generate_dalle(prompt, style)
+                    else:
+                        image_data = await self.dalle_backend.generate(self._enhance_prompt(prompt, style), self._size(style))
             else:
-                image_data = await self.generate_stable_diffusion(prompt, style)
-                # Convert binary data to image and optimize
-                image = Image.open(io.BytesIO(image_data))
-                image = self._optimize_image(image)
-                # Save to temporary file and return path
-                temp_path = f"temp/illustration_{hash(prompt)}.png"
-                os.makedirs(os.path.dirname(temp_path), exist_ok=True)
-                image.save(temp_path, "PNG", optimize=True)
-                return temp_path
+                async with track_image("stability"):
+                    if with_retries:
+                        image_data = await self.generate_stable_diffusion(prompt, style)
+                    else:
+                        image_data = await self.stability_backend.generate(self._enhance_prompt(prompt, style), self._size(style))
+            # Decode, scale to the requested size and re-encode off the event loop
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.image_executor, process_image_bytes, image_data, self._size(style))
         except Exception as e:
             logger.error(f"Illustration generation error: {str(e)}")
             raise
 
     def _optimize_image(self, image: Image.Image) -> Image.Image:
-        # Resize if too large
-        max_size = 1024
-        if max(image.size) > max_size:
-            ratio = max_size / max(image.size)
-            new_size = tuple(int(dim * ratio) for dim in image.size)
-            image = image.resize(new_size, Image.Resampling.LANCZOS)
-        return image
\ No newline at end of file
+        return optimize_image(image)
@@ -0,0 +1,209 @@
+import asyncio
+import logging
+import os
+import time
+from typing import Dict, Any, List, Optional, Tuple, TYPE_CHECKING
+from prometheus_client import Counter, Gauge
+from .llm_router import ProviderStats
+from .rate_limiter import EngineLimits
+
+if TYPE_CHECKING:
+    from .image_generator import ImageGenerator
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+IMAGE_QUEUE_DEPTH = Gauge("image_engine_queue_depth", "Image calls waiting for or holding an engine slot", ["engine"])
+IMAGE_HEDGES = Counter("image_hedged_requests_total", "Scenes duplicated to the other image engine", ["engine", "outcome"])
+IMAGE_FAILOVERS = Counter("image_failovers_total", "Scenes moved to another engine after an error", ["engine"])
+
+
+class ImageScheduler:
+    # Places each scene on the engine expected to finish it first, from its
+    # recent latency, error rate and current queue depth. A scene still running
+    # after that engine's p90 is hedged to the other engine, errors move on to
+    # the next engine straight away, and nothing runs past the story deadline.
+    ENGINES = ("dalle", "stability")
+
+    def __init__(
+        self,
+        image_generator: "ImageGenerator",
+        engine_limits: Optional[EngineLimits] = None,
+        hedge: bool = True,
+        hedge_percentile: float = 0.9,
+        hedge_delay: float = 60.0,
+        min_hedge_delay: float = 2.0,
+        min_samples: int = 5,
+        story_deadline: float = 600.0,
+        max_attempts: int = 3,
+        error_penalty: float = 4.0,
+        cooldown: float = 60.0,
+        cooldown_threshold: int = 3
+    ):
+        self.image_generator = image_generator
+        self.engine_limits = engine_limits or EngineLimits()
+        self.hedge = hedge
+        self.hedge_percentile = hedge_percentile
+        # Used until an engine has min_samples latencies of its own
+        self.hedge_delay = hedge_delay
+        self.min_hedge_delay = min_hedge_delay
+        self.min_samples = min_samples
+        self.story_deadline = story_deadline
+        self.max_attempts = max_attempts
+        self.error_penalty = error_penalty
+        self.cooldown = cooldown
+        self.cooldown_threshold = cooldown_threshold
+        self.stats: Dict[str, ProviderStats] = {engine: ProviderStats() for engine in self.ENGINES}
+        self.queued: Dict[str, int] = {engine: 0 for engine in self.ENGINES}
+        self.active: Dict[str, int] = {engine: 0 for engine in self.ENGINES}
+
+    @classmethod
+    def from_env(cls, image_generator: "ImageGenerator", engine_limits: EngineLimits) -> "ImageScheduler":
+        return cls(
+            image_generator,
+            engine_limits,
+            hedge=os.getenv("IMAGE_HEDGE", "1") == "1",
+            hedge_percentile=float(os.getenv("IMAGE_HEDGE_PERCENTILE", "0.9")),
+            hedge_delay=float(os.getenv("IMAGE_HEDGE_DELAY", "60.0")),
+            story_deadline=float(os.getenv("IMAGE_STORY_DEADLINE", "600.0")),
+            max_attempts=int(os.getenv("IMAGE_MAX_ATTEMPTS", "3"))
+        )
+
+    def depth(self, engine: str) -> int:
+        return self.queued[engine] + self.active[engine]
+
+    def estimate(self, engine: str) -> float:
+        # Expected seconds to finish one more scene: service time, inflated by
+        # the error rate and by the queue ahead of it per concurrency slot
+        stats = self.stats[engine]
+        known = [s.latency for s in self.stats.values() if s.latency is not None]
+        if stats.latency is not None:
+            latency = stats.latency
+        else:
+            # An unmeasured engine is assumed average so it gets tried
+            latency = sum(known) / len(known) if known else 1.0
+        slots = self.engine_limits.limiters[engine].max_concurrency
+        return latency * (1 + self.error_penalty * stats.error_rate) * (1 + self.depth(engine) / slots)
+
+    def ranked(self, preferred: str) -> List[str]:
+        now = time.monotonic()
+        # Ties go to the engine the story asked for; cooling-down engines go last
+        return sorted(self.ENGINES, key=lambda engine: (
+            self.stats[engine].cooldown_until > now,
+            self.estimate(engine),
+            engine != preferred
+        ))
+
+    def _hedge_after(self, engine: str) -> float:
+        stats = self.stats[engine]
+        if len(stats.samples) < self.min_samples:
+            return self.hedge_delay
+        return max(self.min_hedge_delay, stats.percentile(self.hedge_percentile))
+
+    def _set_depth(self, engine: str, queued: int = 0, active: int = 0) -> None:
+        self.queued[engine] += queued
+        self.active[engine] += active
+        IMAGE_QUEUE_DEPTH.labels(engine=engine).set(self.depth(engine))
+
+    async def _attempt(self, engine: str, prompt: str, style: Dict[str, Any], slot: Dict[str, bool]) -> bytes:
+        async with self.engine_limits.for_engine(engine).slot():
+            self._set_depth(engine, queued=-1, active=1)
+            slot["active"] = True
+            started = time.monotonic()
+            try:
+                # A single attempt: retries are this scheduler's job
+                data = await self.image_generator.generate_illustration(
+                    prompt,
+                    style,
+                    engine=engine,
+                    with_retries=False
+                )
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                self.stats[engine].record_error(self.cooldown, self.cooldown_threshold)
+                raise
+            self.stats[engine].record_success(time.monotonic() - started)
+            return data
+
+    def _release(self, engine: str, slot: Dict[str, bool]) -> None:
+        if slot["active"]:
+            self._set_depth(engine, active=-1)
+        else:
+            self._set_depth(engine, queued=-1)
+
+    async def generate(
+        self,
+        prompt: str,
+        style: Dict[str, Any],
+        deadline: Optional[float] = None
+    ) -> Tuple[bytes, str]:
+        # Returns the image and the engine that produced it. Raises
+        # asyncio.TimeoutError once the deadline (time.monotonic()) has passed.
+        deadline = deadline or time.monotonic() + self.story_deadline
+        ranked = self.ranked(EngineLimits.engine_name(style.get("engine", "dalle")))
+        queue = [ranked[i % len(ranked)] for i in range(self.max_attempts)]
+        running: Dict[asyncio.Task, str] = {}
+        started: Dict[asyncio.Task, float] = {}
+        hedged = set()
+        last_error: Optional[BaseException] = None
+
+        def launch(is_hedge: bool = False) -> None:
+            engine = queue.pop(0)
+            # Counted as queued right away, so scenes scheduled in the same
+            # tick already see each other in the queue depth
+            self._set_depth(engine, queued=1)
+            slot = {"active": False}
+            task = asyncio.create_task(self._attempt(engine, prompt, style, slot))
+            task.add_done_callback(lambda _: self._release(engine, slot))
+            running[task] = engine
+            started[task] = time.monotonic()
+            if is_hedge:
+                hedged.add(task)
+
+        launch()
+        try:
+            while running:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    raise asyncio.TimeoutError(f"Image deadline passed after {self.max_attempts - len(queue)} attempts")
+                # Hedge only onto an engine that is not already working on it
+                can_hedge = self.hedge and queue and len(running) == 1 and queue[0] not in running.values()
+                if can_hedge:
+                    (task, engine), = running.items()
+                    timeout = min(timeout, max(0.0, started[task] + self._hedge_after(engine) - time.monotonic()))
+                done, _ = await asyncio.wait(running, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    if can_hedge and time.monotonic() < deadline:
+                        IMAGE_HEDGES.labels(engine=queue[0], outcome="sent").inc()
+                        launch(is_hedge=True)
+                    continue
+                for task in done:
+                    engine = running.pop(task)
+                    error = task.exception()
+                    if error is None:
+                        if task in hedged:
+                            IMAGE_HEDGES.labels(engine=engine, outcome="won").inc()
+                        return task.result(), engine
+                    last_error = error
+                    logger.warning(f"Image engine {engine} failed: {str(error)}")
+                    if queue and not running:
+                        IMAGE_FAILOVERS.labels(engine=engine).inc()
+                        launch()
+            raise last_error
+        finally:
+            # The losing request is cancelled rather than left holding a slot
+            for task in running:
+                task.cancel()
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            engine: {
+                **self.stats[engine].summary(),
+                "queued": self.queued[engine],
+                "active": self.active[engine],
+                "estimate_ms": round(self.estimate(engine) * 1000),
+                "hedge_after_ms": round(self._hedge_after(engine) * 1000),
+            }
+            for engine in self.ENGINES
+        }
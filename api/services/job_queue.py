@@ -0,0 +1,235 @@
+import heapq
+import itertools
+import logging
+import time
+from typing import Dict, Any, Optional, List, Tuple
+import orjson
+from redis.asyncio import Redis
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class Job:
+    def __init__(self, job_id: str, payload: Dict[str, Any], priority: int = 0, attempts: int = 0):
+        self.job_id = job_id
+        self.payload = payload
+        self.priority = priority
+        self.attempts = attempts
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.job_id,
+            "payload": self.payload,
+            "priority": self.priority,
+            "attempts": self.attempts,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Job":
+        return cls(data["job_id"], data["payload"], data["priority"], data["attempts"])
+
+
+class JobQueue:
+    # Higher priority first, FIFO within a priority. A dequeued job stays
+    # invisible for the visibility timeout and is redelivered unless acked.
+    # A nacked job can be held back for a delay before it is redelivered.
+    def __init__(self, visibility_timeout: float = 300):
+        self.visibility_timeout = visibility_timeout
+
+    async def enqueue(self, job_id: str, payload: Dict[str, Any], priority: int = 0) -> Job:
+        raise NotImplementedError
+
+    async def dequeue(self) -> Optional[Job]:
+        raise NotImplementedError
+
+    async def ack(self, job: Job) -> None:
+        raise NotImplementedError
+
+    async def nack(self, job: Job, delay: float = 0) -> None:
+        raise NotImplementedError
+
+    async def extend(self, job: Job) -> bool:
+        # False once the job is no longer this consumer's to run
+        raise NotImplementedError
+
+    async def requeue_expired(self) -> int:
+        raise NotImplementedError
+
+    async def depth(self) -> Dict[str, int]:
+        raise NotImplementedError
+
+
+class InMemoryJobQueue(JobQueue):
+    def __init__(self, visibility_timeout: float = 300):
+        super().__init__(visibility_timeout)
+        self.pending: List[Tuple[int, int, str]] = []
+        self.jobs: Dict[str, Job] = {}
+        self.inflight: Dict[str, float] = {}
+        self._counter = itertools.count()
+
+    def _push(self, job: Job) -> None:
+        heapq.heappush(self.pending, (-job.priority, next(self._counter), job.job_id))
+
+    async def enqueue(self, job_id: str, payload: Dict[str, Any], priority: int = 0) -> Job:
+        job = Job(job_id, payload, priority)
+        self.jobs[job_id] = job
+        self._push(job)
+        return job
+
+    async def dequeue(self) -> Optional[Job]:
+        while self.pending:
+            _, _, job_id = heapq.heappop(self.pending)
+            job = self.jobs.get(job_id)
+            if job is None or job_id in self.inflight:
+                continue
+            job.attempts += 1
+            self.inflight[job_id] = time.monotonic() + self.visibility_timeout
+            # A copy per delivery, so a redelivery is told apart by its attempt
+            return Job(job.job_id, job.payload, job.priority, job.attempts)
+        return None
+
+    async def ack(self, job: Job) -> None:
+        self.inflight.pop(job.job_id, None)
+        self.jobs.pop(job.job_id, None)
+
+    async def nack(self, job: Job, delay: float = 0) -> None:
+        if job.job_id not in self.inflight:
+            return
+        if delay > 0:
+            # Stays invisible until the delay has passed, then requeue_expired
+            # hands it out again
+            self.inflight[job.job_id] = time.monotonic() + delay
+        else:
+            del self.inflight[job.job_id]
+            self._push(job)
+
+    async def extend(self, job: Job) -> bool:
+        current = self.jobs.get(job.job_id)
+        if job.job_id not in self.inflight or current is None or current.attempts != job.attempts:
+            return False
+        self.inflight[job.job_id] = time.monotonic() + self.visibility_timeout
+        return True
+
+    async def requeue_expired(self) -> int:
+        now = time.monotonic()
+        expired = [job_id for job_id, deadline in self.inflight.items() if deadline <= now]
+        for job_id in expired:
+            del self.inflight[job_id]
+            self._push(self.jobs[job_id])
+        return len(expired)
+
+    async def depth(self) -> Dict[str, int]:
+        return {"pending": len(self.pending), "inflight": len(self.inflight)}
+
+
+# Scores order by priority first and enqueue time second
+PRIORITY_SCALE = 10 ** 13
+
+DEQUEUE_SCRIPT = """
+local popped = redis.call('ZPOPMIN', KEYS[1])
+if #popped == 0 then return nil end
+local job_id = popped[1]
+local data = redis.call('HGET', KEYS[3], job_id)
+if not data then return nil end
+local attempts = redis.call('HINCRBY', KEYS[4], job_id, 1)
+redis.call('ZADD', KEYS[2], ARGV[1], job_id)
+return {data, attempts}
+"""
+
+REQUEUE_SCRIPT = """
+local expired = redis.call('ZRANGEBYSCORE', KEYS[2], '-inf', ARGV[1])
+for _, job_id in ipairs(expired) do
+    redis.call('ZREM', KEYS[2], job_id)
+    local data = redis.call('HGET', KEYS[3], job_id)
+    if data then
+        local job = cjson.decode(data)
+        redis.call('ZADD', KEYS[1], -job['priority'] * tonumber(ARGV[2]) + tonumber(ARGV[3]), job_id)
+    end
+end
+return #expired
+"""
+
+
+# Extends the lease only for the delivery that holds it: a redelivered job
+# has a higher attempt count
+EXTEND_SCRIPT = """
+if redis.call('HGET', KEYS[4], ARGV[1]) ~= ARGV[2] then return 0 end
+return redis.call('ZADD', KEYS[2], 'XX', 'CH', ARGV[3], ARGV[1])
+"""
+
+
+class RedisJobQueue(JobQueue):
+    def __init__(self, redis_client: Redis, name: str = "story_jobs", visibility_timeout: float = 300):
+        super().__init__(visibility_timeout)
+        self.redis_client = redis_client
+        self.pending_key = f"{name}:pending"
+        self.inflight_key = f"{name}:inflight"
+        self.data_key = f"{name}:data"
+        # Attempts live apart from the payload so Lua never re-encodes it
+        self.attempts_key = f"{name}:attempts"
+        self._dequeue = redis_client.register_script(DEQUEUE_SCRIPT)
+        self._requeue = redis_client.register_script(REQUEUE_SCRIPT)
+        self._extend = redis_client.register_script(EXTEND_SCRIPT)
+
+    @property
+    def keys(self) -> List[str]:
+        return [self.pending_key, self.inflight_key, self.data_key, self.attempts_key]
+
+    def _score(self, priority: int) -> int:
+        return -priority * PRIORITY_SCALE + int(time.time() * 1000)
+
+    async def enqueue(self, job_id: str, payload: Dict[str, Any], priority: int = 0) -> Job:
+        job = Job(job_id, payload, priority)
+        async with self.redis_client.pipeline(transaction=True) as pipe:
+            pipe.hset(self.data_key, job_id, orjson.dumps(job.to_dict(), default=str))
+            pipe.zadd(self.pending_key, {job_id: self._score(priority)})
+            await pipe.execute()
+        return job
+
+    async def dequeue(self) -> Optional[Job]:
+        deadline = time.time() + self.visibility_timeout
+        result = await self._dequeue(keys=self.keys, args=[deadline])
+        if not result:
+            return None
+        data, attempts = result
+        job = Job.from_dict(orjson.loads(data))
+        job.attempts = int(attempts)
+        return job
+
+    async def ack(self, job: Job) -> None:
+        async with self.redis_client.pipeline(transaction=True) as pipe:
+            pipe.zrem(self.inflight_key, job.job_id)
+            pipe.hdel(self.data_key, job.job_id)
+            pipe.hdel(self.attempts_key, job.job_id)
+            await pipe.execute()
+
+    async def nack(self, job: Job, delay: float = 0) -> None:
+        if delay > 0:
+            # Stays invisible until the delay has passed, then requeue_expired
+            # hands it out again
+            await self.redis_client.zadd(self.inflight_key, {job.job_id: time.time() + delay}, xx=True)
+            return
+        async with self.redis_client.pipeline(transaction=True) as pipe:
+            pipe.zrem(self.inflight_key, job.job_id)
+            pipe.zadd(self.pending_key, {job.job_id: self._score(job.priority)})
+            await pipe.execute()
+
+    async def extend(self, job: Job) -> bool:
+        extended = await self._extend(
+            keys=self.keys,
+            args=[job.job_id, job.attempts, time.time() + self.visibility_timeout]
+        )
+        return bool(extended)
+
+    async def requeue_expired(self) -> int:
+        return await self._requeue(
+            keys=self.keys,
+            args=[time.time(), PRIORITY_SCALE, int(time.time() * 1000)]
+        )
+
+    async def depth(self) -> Dict[str, int]:
+        return {
+            "pending": await self.redis_client.zcard(self.pending_key),
+            "inflight": await self.redis_client.zcard(self.inflight_key),
+        }
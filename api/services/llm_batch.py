@@ -0,0 +1,262 @@
+import asyncio
+import hashlib
+import logging
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Iterator, Tuple
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from prometheus_client import Counter
+from pymongo import ReplaceOne, UpdateOne
+from .cache import canonical_json
+from .llm_router import LLMRouter, LLMProvider, LLMResponse, LLMUsage, current_llm_batch
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+LLM_BATCH_REQUESTS = Counter(
+    "llm_batch_requests_total",
+    "Agent calls made during batch runs, by how they were served",
+    ["outcome"]
+)
+LLM_BATCHES = Counter("llm_batches_total", "Provider batches submitted", ["provider"])
+
+Request = Tuple[str, str, Dict[str, Any]]
+
+
+class LLMBatcher:
+    # While active, agent calls are collected for `window` seconds and sent to
+    # the router's batch-capable provider as one batch. Identical calls share
+    # one request. Every request is checkpointed in Mongo, with its result once
+    # known, so a restarted run picks up submitted batches and finished results
+    # instead of paying for them again. Requests a batch fails on, and all of
+    # them when no provider supports batches or the submission fails, are sent
+    # to the router directly.
+    def __init__(
+        self,
+        router: LLMRouter,
+        db: AsyncIOMotorDatabase,
+        window: float = 1.0,
+        max_requests: int = 10000,
+        poll_interval: float = 30.0,
+        max_wait: float = 24 * 3600.0
+    ):
+        self.router = router
+        self.db = db
+        self.window = window
+        self.max_requests = max_requests
+        self.poll_interval = poll_interval
+        # Anthropic expires unfinished batches after 24 hours
+        self.max_wait = max_wait
+        self.pending: Dict[str, Tuple[Request, asyncio.Future]] = {}
+        self.inflight: Dict[str, asyncio.Future] = {}
+        self.last_submit = 0.0
+        self._timer: Optional[asyncio.Task] = None
+        self._runs: set = set()
+        self.counts = {"requests": 0, "deduplicated": 0, "batched": 0, "resumed": 0, "direct": 0, "batches": 0}
+
+    @staticmethod
+    def request_id(system: str, prompt: str, options: Dict[str, Any]) -> str:
+        # Also the provider's custom id, which allows at most 64 characters
+        return hashlib.sha256(canonical_json([system, prompt, options])).hexdigest()
+
+    @contextmanager
+    def activate(self) -> Iterator["LLMBatcher"]:
+        # Tasks created inside inherit the batch
+        token = current_llm_batch.set(self)
+        try:
+            yield self
+        finally:
+            current_llm_batch.reset(token)
+
+    def _count(self, outcome: str, amount: int = 1) -> None:
+        self.counts[outcome] += amount
+        LLM_BATCH_REQUESTS.labels(outcome=outcome).inc(amount)
+
+    async def submit(self, system: str, prompt: str, options: Dict[str, Any]) -> LLMResponse:
+        self.counts["requests"] += 1
+        request_id = self.request_id(system, prompt, options)
+        future = self.inflight.get(request_id)
+        if future is None and request_id in self.pending:
+            future = self.pending[request_id][1]
+        if future is not None:
+            self._count("deduplicated")
+            return await asyncio.shield(future)
+
+        future = asyncio.get_running_loop().create_future()
+        self.pending[request_id] = ((system, prompt, options), future)
+        self.last_submit = time.monotonic()
+        if len(self.pending) >= self.max_requests:
+            self._flush()
+        elif self._timer is None:
+            self._timer = asyncio.create_task(self._flush_when_idle())
+        # Shielded so one caller giving up does not fail the others
+        return await asyncio.shield(future)
+
+    async def _flush_when_idle(self) -> None:
+        # Calls keep arriving while the stories of a wave catch up; the batch
+        # goes out once none has arrived for a whole window
+        try:
+            while time.monotonic() - self.last_submit < self.window:
+                await asyncio.sleep(self.window - (time.monotonic() - self.last_submit))
+        finally:
+            self._timer = None
+        self._flush()
+
+    def _flush(self) -> None:
+        if not self.pending:
+            return
+        requests = self.pending
+        self.pending = {}
+        for request_id, (_, future) in requests.items():
+            self.inflight[request_id] = future
+        run = asyncio.create_task(self._run(requests))
+        self._runs.add(run)
+        run.add_done_callback(self._runs.discard)
+
+    async def _run(self, requests: Dict[str, Tuple[Request, asyncio.Future]]) -> None:
+        # This task's own calls go straight to the router
+        current_llm_batch.set(None)
+        try:
+            cursor = self.db.llm_batch_requests.find({"_id": {"$in": list(requests)}})
+            checkpoints = {doc["_id"]: doc async for doc in cursor}
+            providers = {provider.name: provider for provider in self.router.providers}
+            groups: Dict[Tuple[str, str], List[str]] = {}
+            fresh = []
+            for request_id in requests:
+                doc = checkpoints.get(request_id)
+                if doc and doc["status"] == "done":
+                    self._count("resumed")
+                    self._resolve(requests, request_id, LLMResponse(
+                        doc["text"],
+                        LLMUsage(**doc["usage"]) if doc.get("usage") else None,
+                        doc["provider"]
+                    ))
+                elif doc and doc["status"] == "submitted" and doc["provider"] in providers:
+                    # Submitted before a restart; wait for that batch instead
+                    self._count("resumed")
+                    groups.setdefault((doc["provider"], doc["batch_id"]), []).append(request_id)
+                else:
+                    fresh.append(request_id)
+
+            work = []
+            provider = self.router.batch_provider()
+            batch_id = await self._submit(provider, fresh, requests) if fresh and provider is not None else None
+            if batch_id is not None:
+                groups[(provider.name, batch_id)] = fresh
+            else:
+                work += [self._direct(requests, request_id) for request_id in fresh]
+            work += [
+                self._collect(providers[name], batch_id, request_ids, requests)
+                for (name, batch_id), request_ids in groups.items()
+            ]
+            await asyncio.gather(*work)
+        except Exception as e:
+            logger.error(f"Error running LLM batch: {str(e)}")
+            for request_id, (_, future) in requests.items():
+                if not future.done():
+                    future.set_exception(e)
+        finally:
+            for request_id in requests:
+                self.inflight.pop(request_id, None)
+
+    async def _submit(
+        self,
+        provider: LLMProvider,
+        request_ids: List[str],
+        requests: Dict[str, Tuple[Request, asyncio.Future]]
+    ) -> Optional[str]:
+        # None when the provider refused the batch; the caller then sends the
+        # requests directly
+        try:
+            batch_id = await provider.submit_batch({request_id: requests[request_id][0] for request_id in request_ids})
+        except Exception as e:
+            logger.error(f"Error submitting batch to {provider.name}, sending {len(request_ids)} requests directly: {str(e)}")
+            return None
+        self.counts["batches"] += 1
+        LLM_BATCHES.labels(provider=provider.name).inc()
+        self._count("batched", len(request_ids))
+        logger.info(f"Submitted {len(request_ids)} requests to {provider.name} as batch {batch_id}")
+        try:
+            await self.db.llm_batch_requests.bulk_write([
+                ReplaceOne({"_id": request_id}, {
+                    "_id": request_id,
+                    "provider": provider.name,
+                    "batch_id": batch_id,
+                    "status": "submitted",
+                    "created_at": datetime.utcnow(),
+                }, upsert=True)
+                for request_id in request_ids
+            ], ordered=False)
+        except Exception as e:
+            # The batch still runs; a restart just cannot pick it up
+            logger.error(f"Error checkpointing batch {batch_id}: {str(e)}")
+        return batch_id
+
+    async def _collect(
+        self,
+        provider: LLMProvider,
+        batch_id: str,
+        request_ids: List[str],
+        requests: Dict[str, Tuple[Request, asyncio.Future]]
+    ) -> None:
+        deadline = time.monotonic() + self.max_wait
+        results = await provider.batch_results(batch_id)
+        while results is None:
+            if time.monotonic() > deadline:
+                raise asyncio.TimeoutError(f"Batch {batch_id} did not finish within {self.max_wait}s")
+            await asyncio.sleep(self.poll_interval)
+            results = await provider.batch_results(batch_id)
+
+        retries = []
+        finished = []
+        for request_id in request_ids:
+            result = results.get(request_id)
+            if isinstance(result, LLMResponse):
+                finished.append((request_id, result))
+                self._resolve(requests, request_id, result)
+            else:
+                logger.warning(f"Batch {batch_id} request {request_id[:12]} failed: {result}; sending it directly")
+                retries.append(request_id)
+        await self._checkpoint(finished)
+        await asyncio.gather(*(self._direct(requests, request_id) for request_id in retries))
+
+    async def _direct(self, requests: Dict[str, Tuple[Request, asyncio.Future]], request_id: str) -> None:
+        self._count("direct")
+        try:
+            response = await self.router.complete(*requests[request_id][0])
+        except Exception as e:
+            future = requests[request_id][1]
+            if not future.done():
+                future.set_exception(e)
+            return
+        self._resolve(requests, request_id, response)
+        await self._checkpoint([(request_id, response)])
+
+    def _resolve(self, requests: Dict[str, Tuple[Request, asyncio.Future]], request_id: str, response: LLMResponse) -> None:
+        future = requests[request_id][1]
+        if not future.done():
+            future.set_result(response)
+
+    async def _checkpoint(self, finished: List[Tuple[str, LLMResponse]]) -> None:
+        if not finished:
+            return
+        await self.db.llm_batch_requests.bulk_write([
+            UpdateOne({"_id": request_id}, {"$set": {
+                "status": "done",
+                "provider": response.provider,
+                "text": response.text,
+                "usage": vars(response.usage) if response.usage is not None else None,
+                "finished_at": datetime.utcnow(),
+            }}, upsert=True)
+            for request_id, response in finished
+        ], ordered=False)
+
+    def stats(self) -> Dict[str, Any]:
+        requests = self.counts["requests"]
+        return {
+            **self.counts,
+            "pending": len(self.pending),
+            "in_flight": len(self.inflight),
+            "dedupe_rate": round(self.counts["deduplicated"] / requests, 4) if requests else 0.0,
+        }
@@ -0,0 +1,472 @@
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+from contextvars import ContextVar
+from typing import Dict, Any, List, Optional, AsyncIterator, Deque, Set, Tuple
+from prometheus_client import Counter, Histogram
+from .metrics import LATENCY_BUCKETS
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+PROVIDER_LATENCY = Histogram(
+    "llm_provider_seconds", "Wall time of LLM provider calls", ["provider", "outcome"], buckets=LATENCY_BUCKETS
+)
+LLM_HEDGES = Counter("llm_hedged_requests_total", "Hedged duplicate LLM requests", ["provider", "outcome"])
+LLM_FAILOVERS = Counter("llm_failovers_total", "LLM calls moved to another provider after an error", ["provider"])
+
+# Set while a batch run is in progress; agent calls then join the provider
+# batch instead of being sent one by one (see services/llm_batch.py)
+current_llm_batch: ContextVar[Optional[Any]] = ContextVar("current_llm_batch", default=None)
+
+
+class LLMUsage:
+    # Provider-neutral usage, shaped like Anthropic's so record_llm_usage reads both
+    def __init__(
+        self,
+        input_tokens: int = 0,
+        output_tokens: int = 0,
+        cache_read_input_tokens: int = 0,
+        cache_creation_input_tokens: int = 0,
+        batch: bool = False
+    ):
+        self.input_tokens = input_tokens
+        self.output_tokens = output_tokens
+        self.cache_read_input_tokens = cache_read_input_tokens
+        self.cache_creation_input_tokens = cache_creation_input_tokens
+        # Served by a provider batch, which is billed at a discount
+        self.batch = batch
+
+
+class LLMResponse:
+    def __init__(self, text: str, usage: Optional[LLMUsage] = None, provider: str = ""):
+        self.text = text
+        self.usage = usage
+        self.provider = provider
+
+
+class LLMProvider:
+    name = "provider"
+    # Providers with a batch endpoint take many requests at once, at a lower
+    # price, and return the results some time later
+    supports_batch = False
+
+    economy_model: Optional[str] = None
+
+    async def complete(self, system: str, prompt: str, options: Dict[str, Any]) -> LLMResponse:
+        raise NotImplementedError
+
+    def model_for(self, options: Dict[str, Any]) -> str:
+        # Agents degraded under load ask for the economy tier
+        if options.get("tier") == "economy" and self.economy_model:
+            return self.economy_model
+        return self.model
+
+    async def stream(self, system: str, prompt: str, options: Dict[str, Any]) -> AsyncIterator[Any]:
+        # Yields text chunks, optionally followed by one LLMUsage. Providers
+        # without native streaming yield the whole completion.
+        response = await self.complete(system, prompt, options)
+        yield response.text
+        if response.usage is not None:
+            yield response.usage
+
+    async def submit_batch(self, requests: Dict[str, Tuple[str, str, Dict[str, Any]]]) -> str:
+        # requests maps custom ids to (system, prompt, options); returns the batch id
+        raise NotImplementedError
+
+    async def batch_results(self, batch_id: str) -> Optional[Dict[str, Any]]:
+        # None while the batch is processing, then custom id -> LLMResponse or
+        # the exception for that request
+        raise NotImplementedError
+
+
+class AnthropicProvider(LLMProvider):
+    supports_batch = True
+
+    def __init__(self, client: Any, model: str, name: Optional[str] = None, economy_model: Optional[str] = None):
+        self.client = client
+        self.model = model
+        self.name = name or f"anthropic:{model}"
+        self.economy_model = economy_model
+
+    def _request(self, system: str, prompt: str, options: Dict[str, Any]) -> Dict[str, Any]:
+        request = {
+            "model": self.model_for(options),
+            "max_tokens": options["max_tokens"],
+            "temperature": options["temperature"],
+            # The system prefix is stable per agent, so it is marked cacheable
+            "system": [{"type": "text", "text": system, "cache_control": {"type": "ephemeral"}}],
+            "messages": [{"role": "user", "content": prompt}],
+        }
+        if options.get("top_p", 1.0) != 1.0:
+            request["top_p"] = options["top_p"]
+        return request
+
+    @staticmethod
+    def _usage(usage: Any) -> LLMUsage:
+        return LLMUsage(
+            usage.input_tokens,
+            usage.output_tokens,
+            getattr(usage, "cache_read_input_tokens", None) or 0,
+            getattr(usage, "cache_creation_input_tokens", None) or 0
+        )
+
+    async def complete(self, system: str, prompt: str, options: Dict[str, Any]) -> LLMResponse:
+        message = await self.client.messages.create(**self._request(system, prompt, options))
+        text = "".join(block.text for block in message.content if block.type == "text")
+        return LLMResponse(text, self._usage(message.usage), self.name)
+
+    async def stream(self, system: str, prompt: str, options: Dict[str, Any]) -> AsyncIterator[Any]:
+        async with self.client.messages.stream(**self._request(system, prompt, options)) as stream:
+            async for text in stream.text_stream:
+                yield text
+            message = await stream.get_final_message()
+        yield self._usage(message.usage)
+
+    async def submit_batch(self, requests: Dict[str, Tuple[str, str, Dict[str, Any]]]) -> str:
+        # Message Batches: up to 100,000 requests, billed at half price
+        batch = await self.client.messages.batches.create(requests=[
+            {"custom_id": custom_id, "params": self._request(*request)}
+            for custom_id, request in requests.items()
+        ])
+        return batch.id
+
+    async def batch_results(self, batch_id: str) -> Optional[Dict[str, Any]]:
+        batch = await self.client.messages.batches.retrieve(batch_id)
+        if batch.processing_status != "ended":
+            return None
+        results: Dict[str, Any] = {}
+        async for entry in await self.client.messages.batches.results(batch_id):
+            if entry.result.type == "succeeded":
+                message = entry.result.message
+                text = "".join(block.text for block in message.content if block.type == "text")
+                usage = self._usage(message.usage)
+                usage.batch = True
+                results[entry.custom_id] = LLMResponse(text, usage, self.name)
+            else:
+                # errored, canceled or expired
+                results[entry.custom_id] = RuntimeError(f"Batch request {entry.result.type}")
+        return results
+
+
+class OpenAIProvider(LLMProvider):
+    def __init__(self, client: Any, model: str, name: Optional[str] = None, economy_model: Optional[str] = None):
+        self.client = client
+        self.model = model
+        self.name = name or f"openai:{model}"
+        self.economy_model = economy_model
+
+    def _request(self, system: str, prompt: str, options: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "model": self.model_for(options),
+            "max_tokens": options["max_tokens"],
+            "temperature": options["temperature"],
+            "top_p": options.get("top_p", 1.0),
+            "frequency_penalty": options.get("frequency_penalty", 0.0),
+            "presence_penalty": options.get("presence_penalty", 0.0),
+            # OpenAI caches long identical prefixes automatically
+            "messages": [{"role": "system", "content": system}, {"role": "user", "content": prompt}],
+        }
+
+    @staticmethod
+    def _usage(usage: Any) -> LLMUsage:
+        details = getattr(usage, "prompt_tokens_details", None)
+        cached = (getattr(details, "cached_tokens", None) or 0) if details else 0
+        return LLMUsage(usage.prompt_tokens - cached, usage.completion_tokens, cached)
+
+    async def complete(self, system: str, prompt: str, options: Dict[str, Any]) -> LLMResponse:
+        response = await self.client.chat.completions.create(**self._request(system, prompt, options))
+        return LLMResponse(response.choices[0].message.content or "", self._usage(response.usage), self.name)
+
+    async def stream(self, system: str, prompt: str, options: Dict[str, Any]) -> AsyncIterator[Any]:
+        # The final chunk then carries the usage, with no choices
+        chunks = await self.client.chat.completions.create(
+            **self._request(system, prompt, options),
+            stream=True,
+            stream_options={"include_usage": True}
+        )
+        async for chunk in chunks:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+            if getattr(chunk, "usage", None) is not None:
+                yield self._usage(chunk.usage)
+
+
+class ProviderStats:
+    # Exponentially weighted latency and error rate, plus a window of recent
+    # latencies for the hedging percentile
+    def __init__(self, alpha: float = 0.2, window: int = 200):
+        self.alpha = alpha
+        self.latency: Optional[float] = None
+        self.error_rate = 0.0
+        self.samples: Deque[float] = deque(maxlen=window)
+        self.consecutive_errors = 0
+        self.cooldown_until = 0.0
+        self.calls = 0
+        self.errors = 0
+
+    def record_success(self, seconds: float) -> None:
+        self.calls += 1
+        self.samples.append(seconds)
+        self.latency = seconds if self.latency is None else self.alpha * seconds + (1 - self.alpha) * self.latency
+        self.error_rate *= 1 - self.alpha
+        self.consecutive_errors = 0
+
+    def record_error(self, cooldown: float, threshold: int) -> None:
+        self.calls += 1
+        self.errors += 1
+        self.error_rate = self.alpha + (1 - self.alpha) * self.error_rate
+        self.consecutive_errors += 1
+        if self.consecutive_errors >= threshold:
+            self.cooldown_until = time.monotonic() + cooldown
+
+    def percentile(self, pct: float) -> Optional[float]:
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(pct * len(ordered)))]
+
+    def summary(self) -> Dict[str, Any]:
+        p95 = self.percentile(0.95)
+        return {
+            "ewma_latency_ms": round(self.latency * 1000) if self.latency is not None else None,
+            "p95_ms": round(p95 * 1000) if p95 is not None else None,
+            "error_rate": round(self.error_rate, 4),
+            "calls": self.calls,
+            "errors": self.errors,
+            "cooling_down": self.cooldown_until > time.monotonic(),
+        }
+
+
+PROVIDER_KINDS = {"anthropic": AnthropicProvider, "openai": OpenAIProvider}
+
+
+class LLMRouter:
+    # Routes each call to the provider with the best recent latency/error score.
+    # If it has not answered by that provider's p95 latency, a duplicate goes to
+    # the next provider and whichever finishes first wins; the other is
+    # cancelled. Errors move straight on to the next provider, no backoff sleep.
+    def __init__(
+        self,
+        providers: List[LLMProvider],
+        hedge: bool = True,
+        hedge_percentile: float = 0.95,
+        hedge_delay: float = 10.0,
+        min_hedge_delay: float = 0.5,
+        min_samples: int = 10,
+        error_penalty: float = 4.0,
+        cooldown: float = 30.0,
+        cooldown_threshold: int = 3
+    ):
+        if not providers:
+            raise ValueError("LLMRouter needs at least one provider")
+        self.providers = providers
+        self.hedge = hedge
+        self.hedge_percentile = hedge_percentile
+        # Used until a provider has min_samples latencies of its own
+        self.hedge_delay = hedge_delay
+        self.min_hedge_delay = min_hedge_delay
+        self.min_samples = min_samples
+        self.error_penalty = error_penalty
+        self.cooldown = cooldown
+        self.cooldown_threshold = cooldown_threshold
+        self.stats: Dict[str, ProviderStats] = {provider.name: ProviderStats() for provider in providers}
+
+    @classmethod
+    def from_env(cls, clients: Dict[str, Any]) -> "LLMRouter":
+        # LLM_PROVIDERS lists "kind:model" entries, e.g.
+        # "anthropic:claude-3-5-sonnet-latest,openai:gpt-4o-mini"
+        spec = os.getenv("LLM_PROVIDERS", f"anthropic:{os.getenv('ANTHROPIC_MODEL', 'claude-3-5-sonnet-latest')}")
+        # LLM_ECONOMY_MODELS names each kind's cheaper model the same way
+        economy = dict(
+            entry.strip().split(":", 1)
+            for entry in os.getenv("LLM_ECONOMY_MODELS", "").split(",")
+            if ":" in entry
+        )
+        providers = []
+        for entry in filter(None, (item.strip() for item in spec.split(","))):
+            kind, _, model = entry.partition(":")
+            if kind not in PROVIDER_KINDS or not model:
+                raise ValueError(f"Invalid LLM provider: {entry}")
+            providers.append(PROVIDER_KINDS[kind](clients[kind], model, economy_model=economy.get(kind)))
+        return cls(
+            providers,
+            hedge=os.getenv("LLM_HEDGE", "1") == "1",
+            hedge_percentile=float(os.getenv("LLM_HEDGE_PERCENTILE", "0.95")),
+            hedge_delay=float(os.getenv("LLM_HEDGE_DELAY", "10.0")),
+            cooldown=float(os.getenv("LLM_PROVIDER_COOLDOWN", "30.0"))
+        )
+
+    def _score(self, provider: LLMProvider) -> float:
+        stats = self.stats[provider.name]
+        # Unmeasured providers score 0 so each gets tried early
+        latency = stats.latency if stats.latency is not None else 0.0
+        return latency * (1 + self.error_penalty * stats.error_rate)
+
+    def ranked(self) -> List[LLMProvider]:
+        now = time.monotonic()
+        available = [p for p in self.providers if self.stats[p.name].cooldown_until <= now]
+        cooling = [p for p in self.providers if self.stats[p.name].cooldown_until > now]
+        # Cooling-down providers stay at the back as a last resort
+        return sorted(available, key=self._score) + sorted(cooling, key=self._score)
+
+    def _hedge_after(self, provider: LLMProvider) -> float:
+        stats = self.stats[provider.name]
+        if len(stats.samples) < self.min_samples:
+            return self.hedge_delay
+        return max(self.min_hedge_delay, stats.percentile(self.hedge_percentile))
+
+    def _record_error(self, provider: LLMProvider, elapsed: float, error: BaseException) -> None:
+        self.stats[provider.name].record_error(self.cooldown, self.cooldown_threshold)
+        PROVIDER_LATENCY.labels(provider=provider.name, outcome="error").observe(elapsed)
+        logger.warning(f"LLM provider {provider.name} failed: {str(error)}")
+
+    def _record_success(self, provider: LLMProvider, elapsed: float) -> None:
+        self.stats[provider.name].record_success(elapsed)
+        PROVIDER_LATENCY.labels(provider=provider.name, outcome="success").observe(elapsed)
+
+    def batch_provider(self) -> Optional[LLMProvider]:
+        return next((provider for provider in self.ranked() if provider.supports_batch), None)
+
+    async def complete(self, system: str, prompt: str, options: Dict[str, Any]) -> LLMResponse:
+        batch = current_llm_batch.get()
+        if batch is not None:
+            return await batch.submit(system, prompt, options)
+        queue = self.ranked()
+        running: Dict[asyncio.Task, LLMProvider] = {}
+        started: Dict[asyncio.Task, float] = {}
+        hedged: Set[asyncio.Task] = set()
+        last_error: Optional[BaseException] = None
+
+        def launch(is_hedge: bool = False) -> None:
+            provider = queue.pop(0)
+            task = asyncio.create_task(provider.complete(system, prompt, options))
+            running[task] = provider
+            started[task] = time.monotonic()
+            if is_hedge:
+                hedged.add(task)
+
+        launch()
+        try:
+            while running:
+                # Hedge only while the first attempt is the one we are waiting on
+                timeout = None
+                if self.hedge and queue and len(running) == 1:
+                    (task, provider), = running.items()
+                    timeout = max(0.0, started[task] + self._hedge_after(provider) - time.monotonic())
+                done, _ = await asyncio.wait(running, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    LLM_HEDGES.labels(provider=queue[0].name, outcome="sent").inc()
+                    launch(is_hedge=True)
+                    continue
+                for task in done:
+                    provider = running.pop(task)
+                    elapsed = time.monotonic() - started[task]
+                    error = task.exception()
+                    if error is None:
+                        self._record_success(provider, elapsed)
+                        if task in hedged:
+                            LLM_HEDGES.labels(provider=provider.name, outcome="won").inc()
+                        return task.result()
+                    last_error = error
+                    self._record_error(provider, elapsed, error)
+                    if queue and not running:
+                        LLM_FAILOVERS.labels(provider=provider.name).inc()
+                        launch()
+            raise last_error
+        finally:
+            # The losing request is cancelled rather than left to finish
+            for task in running:
+                task.cancel()
+
+    async def stream(self, system: str, prompt: str, options: Dict[str, Any]) -> AsyncIterator[Any]:
+        # Hedging and failover apply until the first chunk arrives; after that
+        # the text is already with the caller, so a mid-stream error is raised
+        batch = current_llm_batch.get()
+        if batch is not None:
+            # Batched calls arrive whole
+            response = await batch.submit(system, prompt, options)
+            yield response.text
+            if response.usage is not None:
+                yield response.usage
+            return
+        queue = self.ranked()
+        last_error: Optional[BaseException] = None
+        while queue:
+            contenders: Dict[asyncio.Future, Any] = {}
+            winner = None
+
+            def launch(is_hedge: bool = False) -> None:
+                provider = queue.pop(0)
+                iterator = provider.stream(system, prompt, options).__aiter__()
+                future = asyncio.ensure_future(_next_chunk(iterator))
+                contenders[future] = (provider, iterator, time.monotonic(), is_hedge)
+
+            launch()
+            try:
+                while contenders and winner is None:
+                    timeout = None
+                    if self.hedge and queue and len(contenders) == 1:
+                        (provider, _, started, _), = contenders.values()
+                        timeout = max(0.0, started + self._hedge_after(provider) - time.monotonic())
+                    done, _ = await asyncio.wait(contenders, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                    if not done:
+                        LLM_HEDGES.labels(provider=queue[0].name, outcome="sent").inc()
+                        launch(is_hedge=True)
+                        continue
+                    for future in done:
+                        provider, iterator, started, is_hedge = contenders.pop(future)
+                        error = future.exception()
+                        if error is None:
+                            winner = (provider, iterator, started, is_hedge, future.result())
+                            break
+                        last_error = error
+                        self._record_error(provider, time.monotonic() - started, error)
+            finally:
+                for future, (_, iterator, _, _) in contenders.items():
+                    await _cancel_stream(future, iterator)
+
+            if winner is None:
+                if queue:
+                    LLM_FAILOVERS.labels(provider=provider.name).inc()
+                continue
+            provider, iterator, started, is_hedge, first = winner
+            if is_hedge:
+                LLM_HEDGES.labels(provider=provider.name, outcome="won").inc()
+            if first is not _END:
+                yield first
+                async for chunk in iterator:
+                    yield chunk
+            self._record_success(provider, time.monotonic() - started)
+            return
+        raise last_error or RuntimeError("No LLM provider available")
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            provider.name: {**self.stats[provider.name].summary(), "hedge_after_ms": round(self._hedge_after(provider) * 1000)}
+            for provider in self.providers
+        }
+
+
+_END = object()
+
+
+async def _next_chunk(iterator: AsyncIterator[Any]) -> Any:
+    try:
+        return await iterator.__anext__()
+    except StopAsyncIteration:
+        return _END
+
+
+async def _cancel_stream(future: asyncio.Future, iterator: AsyncIterator[Any]) -> None:
+    # Let the cancellation land before closing, or the generator is still running
+    future.cancel()
+    await asyncio.gather(future, return_exceptions=True)
+    aclose = getattr(iterator, "aclose", None)
+    if aclose is not None:
+        try:
+            await aclose()
+        except Exception:
+            pass
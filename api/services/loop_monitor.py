@@ -0,0 +1,59 @@
+import asyncio
+import logging
+import time
+from typing import Dict, Any, Optional
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class LoopLagMonitor:
+    def __init__(self, interval: float = 0.1, warn_threshold: float = 0.25):
+        self.interval = interval
+        self.warn_threshold = warn_threshold
+        self.samples = 0
+        self.total_lag = 0.0
+        self.max_lag = 0.0
+        self.last_lag = 0.0
+        self.blocked_time = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        # Any delay past the requested sleep is time the loop spent running
+        # something else without yielding
+        while True:
+            started = time.monotonic()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, time.monotonic() - started - self.interval)
+            self.record(lag)
+
+    def record(self, lag: float) -> None:
+        self.samples += 1
+        self.total_lag += lag
+        self.last_lag = lag
+        self.max_lag = max(self.max_lag, lag)
+        if lag >= self.warn_threshold:
+            self.blocked_time += lag
+            logger.warning(f"Event loop blocked for {lag * 1000:.0f}ms")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "samples": self.samples,
+            "last_lag_ms": round(self.last_lag * 1000, 2),
+            "max_lag_ms": round(self.max_lag * 1000, 2),
+            "mean_lag_ms": round(self.total_lag / self.samples * 1000, 2) if self.samples else 0.0,
+            "blocked_ms": round(self.blocked_time * 1000, 2),
+        }
@@ -0,0 +1,174 @@
+import logging
+import os
+import time
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import Dict, Any, List, Optional, AsyncIterator
+from prometheus_client import Counter, Histogram
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300)
+
+STAGE_LATENCY = Histogram(
+    "story_stage_seconds", "Wall time of each pipeline stage", ["stage"], buckets=LATENCY_BUCKETS
+)
+STORY_LATENCY = Histogram(
+    "story_generation_seconds", "Wall time of a full story generation", ["outcome"], buckets=LATENCY_BUCKETS
+)
+AGENT_RETRIES = Counter("agent_retries_total", "Retried agent or image calls", ["component"])
+LLM_TOKENS = Counter("llm_tokens_total", "LLM tokens used by each agent", ["agent", "kind"])
+LLM_COST = Counter("llm_cost_usd_total", "Estimated LLM spend by each agent", ["agent"])
+PROMPT_TOKENS_SAVED = Counter(
+    "prompt_tokens_saved_total", "Prompt tokens not sent or not billed in full", ["agent", "source"]
+)
+IMAGE_LATENCY = Histogram(
+    "image_generation_seconds", "Wall time of image engine calls", ["engine", "outcome"], buckets=LATENCY_BUCKETS
+)
+IMAGE_COST = Counter("image_cost_usd_total", "Estimated image generation spend", ["engine"])
+MONGO_WRITE_LATENCY = Histogram(
+    "mongo_write_seconds", "Wall time of pipeline persistence writes", ["operation"], buckets=LATENCY_BUCKETS
+)
+
+LLM_PROMPT_COST_PER_1K = float(os.getenv("LLM_PROMPT_COST_PER_1K", "0.003"))
+LLM_COMPLETION_COST_PER_1K = float(os.getenv("LLM_COMPLETION_COST_PER_1K", "0.015"))
+# Anthropic bills cache reads at 10% and cache writes at 125% of the input rate
+LLM_CACHE_READ_FACTOR = 0.1
+LLM_CACHE_WRITE_FACTOR = 1.25
+# Batch requests are billed at half the interactive price
+LLM_BATCH_COST_FACTOR = float(os.getenv("LLM_BATCH_COST_FACTOR", "0.5"))
+IMAGE_COST_PER_CALL = {
+    "dalle": float(os.getenv("DALLE_COST_PER_IMAGE", "0.04")),
+    "stability": float(os.getenv("STABILITY_COST_PER_IMAGE", "0.02")),
+}
+
+
+class StoryTimer:
+    # Per-story breakdown, attached to the story document when it completes
+    def __init__(self):
+        self.started_at = time.monotonic()
+        self.stages: Dict[str, float] = {}
+        self.llm: Dict[str, Dict[str, Any]] = {}
+        self.images: List[Dict[str, Any]] = []
+        self.retries: Dict[str, int] = {}
+        self.prompt_savings: Dict[str, Dict[str, int]] = {}
+        self.persistence_seconds = 0.0
+
+    def record_llm(self, agent: str, prompt_tokens: int, completion_tokens: int, cost: float) -> None:
+        usage = self.llm.setdefault(agent, {"prompt_tokens": 0, "completion_tokens": 0, "cost_usd": 0.0})
+        usage["prompt_tokens"] += prompt_tokens
+        usage["completion_tokens"] += completion_tokens
+        usage["cost_usd"] = round(usage["cost_usd"] + cost, 6)
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "total_ms": round((time.monotonic() - self.started_at) * 1000),
+            "stages_ms": {stage: round(seconds * 1000) for stage, seconds in self.stages.items()},
+            "llm": self.llm,
+            "images": self.images,
+            "retries": self.retries,
+            "prompt_tokens_saved": self.prompt_savings,
+            "persistence_ms": round(self.persistence_seconds * 1000),
+        }
+
+
+current_story_timer: ContextVar[Optional[StoryTimer]] = ContextVar("current_story_timer", default=None)
+
+
+def estimate_tokens(text: Any) -> int:
+    # Providers are not reached directly through CrewAI, so usage is approximated
+    # with the usual ~4 characters per token
+    return max(1, len(str(text)) // 4)
+
+
+@asynccontextmanager
+async def track_stage(stage: str) -> AsyncIterator[None]:
+    started = time.monotonic()
+    try:
+        yield
+    finally:
+        elapsed = time.monotonic() - started
+        STAGE_LATENCY.labels(stage=stage).observe(elapsed)
+        timer = current_story_timer.get()
+        if timer is not None:
+            timer.stages[stage] = elapsed
+
+
+@asynccontextmanager
+async def track_image(engine: str) -> AsyncIterator[None]:
+    started = time.monotonic()
+    outcome = "error"
+    try:
+        yield
+        outcome = "success"
+    finally:
+        elapsed = time.monotonic() - started
+        IMAGE_LATENCY.labels(engine=engine, outcome=outcome).observe(elapsed)
+        cost = IMAGE_COST_PER_CALL.get(engine, 0.0) if outcome == "success" else 0.0
+        IMAGE_COST.labels(engine=engine).inc(cost)
+        timer = current_story_timer.get()
+        if timer is not None:
+            timer.images.append({"engine": engine, "outcome": outcome, "ms": round(elapsed * 1000)})
+
+
+@asynccontextmanager
+async def track_mongo_write(operation: str) -> AsyncIterator[None]:
+    started = time.monotonic()
+    try:
+        yield
+    finally:
+        elapsed = time.monotonic() - started
+        MONGO_WRITE_LATENCY.labels(operation=operation).observe(elapsed)
+        timer = current_story_timer.get()
+        if timer is not None:
+            timer.persistence_seconds += elapsed
+
+
+def record_llm_usage(agent: str, prompt: Any, completion: Any, usage: Any = None) -> None:
+    # `usage` is the provider's exact count when the call went to it directly
+    cache_read = cache_write = 0
+    if usage is not None:
+        prompt_tokens = usage.input_tokens
+        completion_tokens = usage.output_tokens
+        cache_read = getattr(usage, "cache_read_input_tokens", None) or 0
+        cache_write = getattr(usage, "cache_creation_input_tokens", None) or 0
+    else:
+        prompt_tokens = estimate_tokens(prompt)
+        completion_tokens = estimate_tokens(completion)
+    cost = (
+        (prompt_tokens + cache_read * LLM_CACHE_READ_FACTOR + cache_write * LLM_CACHE_WRITE_FACTOR)
+        / 1000 * LLM_PROMPT_COST_PER_1K
+        + completion_tokens / 1000 * LLM_COMPLETION_COST_PER_1K
+    )
+    if getattr(usage, "batch", False):
+        cost *= LLM_BATCH_COST_FACTOR
+    LLM_TOKENS.labels(agent=agent, kind="prompt").inc(prompt_tokens + cache_read + cache_write)
+    LLM_TOKENS.labels(agent=agent, kind="completion").inc(completion_tokens)
+    LLM_COST.labels(agent=agent).inc(cost)
+    if cache_read:
+        record_prompt_savings(agent, "prefix_cache", cache_read)
+    timer = current_story_timer.get()
+    if timer is not None:
+        timer.record_llm(agent, prompt_tokens + cache_read + cache_write, completion_tokens, cost)
+
+
+def record_prompt_savings(agent: str, source: str, tokens: int) -> None:
+    if tokens <= 0:
+        return
+    PROMPT_TOKENS_SAVED.labels(agent=agent, source=source).inc(tokens)
+    timer = current_story_timer.get()
+    if timer is not None:
+        savings = timer.prompt_savings.setdefault(agent, {})
+        savings[source] = savings.get(source, 0) + tokens
+
+
+def record_retry(retry_state: Any) -> None:
+    # tenacity before_sleep hook; the first argument of the retried method is self
+    instance = retry_state.args[0] if retry_state.args else None
+    component = getattr(instance, "name", None) or retry_state.fn.__name__
+    AGENT_RETRIES.labels(component=component).inc()
+    timer = current_story_timer.get()
+    if timer is not None:
+        timer.retries[component] = timer.retries.get(component, 0) + 1
+    logger.warning(f"Retrying {component} after attempt {retry_state.attempt_number}")
@@ -0,0 +1,99 @@
+import base64
+from datetime import datetime
+from typing import Dict, Any, Optional, Tuple, AsyncIterator, Callable, Union
+import orjson
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorCollection
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+# Projections for each view; None returns the whole document
+STORY_VIEWS: Dict[str, Optional[Dict[str, int]]] = {
+    "summary": {"parameters": 1, "status": 1, "progress": 1, "error": 1, "created_at": 1},
+    "full": None,
+}
+ILLUSTRATION_VIEWS: Dict[str, Optional[Dict[str, int]]] = {
+    "summary": {"story_id": 1, "blob": 1, "url": 1, "created_at": 1},
+    "full": None,
+}
+VERSION_VIEWS: Dict[str, Optional[Dict[str, int]]] = {
+    "summary": {"story_id": 1, "key": 1, "stage": 1, "inputs": 1, "created_at": 1},
+    "full": None,
+}
+
+
+def encode_cursor(document: Dict[str, Any]) -> str:
+    created_at = document.get("created_at")
+    payload = orjson.dumps([created_at.isoformat() if created_at else None, str(document["_id"])])
+    return base64.urlsafe_b64encode(payload).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[Optional[datetime], Union[ObjectId, str]]:
+    # Content-addressed ids (e.g. story output versions) stay strings
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, object_id = orjson.loads(base64.urlsafe_b64decode(padded))
+        if not isinstance(object_id, str):
+            raise ValueError("Invalid cursor")
+        object_id = ObjectId(object_id) if ObjectId.is_valid(object_id) else object_id
+        return (datetime.fromisoformat(created_at) if created_at else None), object_id
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+
+def keyset_query(query: Dict[str, Any], cursor: Optional[str]) -> Dict[str, Any]:
+    # Newest first; (created_at, _id) is unique, so pages never skip or repeat
+    # documents even when timestamps collide. Documents written before
+    # created_at existed sort last and are paged by _id alone.
+    if not cursor:
+        return query
+    created_at, object_id = decode_cursor(cursor)
+    if created_at is None:
+        after = {"created_at": None, "_id": {"$lt": object_id}}
+    else:
+        after = {"$or": [
+            {"created_at": {"$lt": created_at}},
+            {"created_at": None},
+            {"created_at": created_at, "_id": {"$lt": object_id}},
+        ]}
+    return {"$and": [query, after]} if query else after
+
+
+def page_size(limit: Optional[int]) -> int:
+    return max(1, min(limit or DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE))
+
+
+async def stream_page(
+    collection: AsyncIOMotorCollection,
+    query: Dict[str, Any],
+    projection: Optional[Dict[str, int]] = None,
+    cursor: Optional[str] = None,
+    limit: Optional[int] = None,
+    transform: Optional[Callable[[Dict[str, Any]], Dict[str, Any]]] = None
+) -> AsyncIterator[bytes]:
+    # Streams {"items": [...], "next_cursor": ...} one document at a time, so a
+    # page is never materialised in memory. The extra document fetched past
+    # the limit only tells us whether there is a next page.
+    limit = page_size(limit)
+    if projection is not None:
+        projection = {**projection, "created_at": 1}
+    documents = collection.find(keyset_query(query, cursor), projection).sort(
+        [("created_at", -1), ("_id", -1)]
+    ).limit(limit + 1)
+
+    yield b'{"items":['
+    count = 0
+    last = None
+    has_more = False
+    async for document in documents:
+        if count == limit:
+            has_more = True
+            break
+        last = {"_id": document["_id"], "created_at": document.get("created_at")}
+        if transform is not None:
+            document = transform(document)
+        yield (b"," if count else b"") + orjson.dumps(document, default=str)
+        count += 1
+    next_cursor = encode_cursor(last) if has_more else None
+    yield b'],"next_cursor":' + orjson.dumps(next_cursor) + b"}"
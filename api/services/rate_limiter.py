@@ -0,0 +1,79 @@
+import asyncio
+import logging
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import Dict, Optional, AsyncIterator
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    def __init__(self, rate_per_second: float, capacity: float):
+        if rate_per_second <= 0 or capacity <= 0:
+            raise ValueError("Token bucket rate and capacity must be positive")
+        self.rate = rate_per_second
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    async def acquire(self, tokens: float = 1) -> None:
+        # Waiters queue on the lock, so tokens are handed out in FIFO order
+        async with self._lock:
+            self._refill()
+            while self.tokens < tokens:
+                await asyncio.sleep((tokens - self.tokens) / self.rate)
+                self._refill()
+            self.tokens -= tokens
+
+
+class EngineLimiter:
+    def __init__(self, max_concurrency: int, requests_per_minute: float, burst: Optional[int] = None):
+        self.max_concurrency = max_concurrency
+        self.requests_per_minute = requests_per_minute
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.bucket = TokenBucket(requests_per_minute / 60.0, burst or max_concurrency)
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        async with self.semaphore:
+            await self.bucket.acquire()
+            yield
+
+
+class EngineLimits:
+    DEFAULTS = {
+        "dalle": {"max_concurrency": 4, "requests_per_minute": 15},
+        "stability": {"max_concurrency": 4, "requests_per_minute": 150},
+    }
+
+    def __init__(self, limiters: Optional[Dict[str, EngineLimiter]] = None):
+        self.limiters = limiters or {
+            engine: EngineLimiter(**config) for engine, config in self.DEFAULTS.items()
+        }
+
+    @classmethod
+    def from_env(cls) -> "EngineLimits":
+        limiters = {}
+        for engine, config in cls.DEFAULTS.items():
+            prefix = engine.upper()
+            limiters[engine] = EngineLimiter(
+                max_concurrency=int(os.getenv(f"{prefix}_MAX_CONCURRENCY", config["max_concurrency"])),
+                requests_per_minute=float(os.getenv(f"{prefix}_REQUESTS_PER_MINUTE", config["requests_per_minute"])),
+            )
+        return cls(limiters)
+
+    @staticmethod
+    def engine_name(engine: str) -> str:
+        # ImageGenerator treats every non-DALL-E engine as Stable Diffusion
+        return "dalle" if engine == "dalle" else "stability"
+
+    def for_engine(self, engine: str) -> EngineLimiter:
+        return self.limiters[self.engine_name(engine)]
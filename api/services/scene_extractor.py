@@ -0,0 +1,26 @@
+from typing import List
+
+
+class SceneExtractor:
+    # Incremental form of StoryPipeline._extract_illustration_prompts: emits each
+    # "Scene:" block as soon as the blank line that ends it has streamed in
+    def __init__(self, separator: str = "\n\n", marker: str = "Scene:"):
+        self.separator = separator
+        self.marker = marker
+        self.buffer = ""
+
+    def feed(self, chunk: str) -> List[str]:
+        self.buffer += chunk
+        scenes = []
+        while True:
+            index = self.buffer.find(self.separator)
+            if index < 0:
+                return scenes
+            block = self.buffer[:index]
+            self.buffer = self.buffer[index + len(self.separator):]
+            if self.marker in block:
+                scenes.append(block)
+
+    def flush(self) -> List[str]:
+        block, self.buffer = self.buffer, ""
+        return [block] if self.marker in block else []
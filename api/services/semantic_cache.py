@@ -0,0 +1,392 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import re
+import time
+import zlib
+from typing import Dict, Any, List, Optional, Tuple
+import numpy as np
+from prometheus_client import Counter, Histogram
+
+try:
+    import fcntl
+except ImportError:
+    # No advisory locks on Windows; a single process is assumed there
+    fcntl = None
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+SEMANTIC_LOOKUPS = Counter("semantic_cache_lookups_total", "Semantic cache lookups", ["stage", "outcome"])
+SEMANTIC_SIMILARITY = Histogram(
+    "semantic_cache_best_similarity",
+    "Similarity of the nearest cached entry at lookup",
+    ["stage"],
+    buckets=(0.5, 0.6, 0.7, 0.8, 0.85, 0.9, 0.95, 0.98, 1.0)
+)
+
+# Words that carry no meaning for a theme; dropped before hashing
+STOPWORDS = frozenset(
+    "a an the and or of to in on at with for from by about into its it is are was be "
+    "who that this his her their".split()
+)
+# Words that flip the meaning of the next few words ("not afraid of the dark")
+NEGATIONS = frozenset("not no never without nor".split())
+SUFFIXES = ("ing", "ed", "es", "s")
+PUNCTUATION = ".,;:!?"
+
+
+def stem(word: str) -> str:
+    # Crude suffix stripping, so "befriends" and "befriending" share features
+    for suffix in SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3 and not word.endswith("ss"):
+            return word[:-len(suffix)]
+    return word
+
+
+# Default thresholds, calibrated on labelled theme pairs: for the hashed
+# embedder, rewordings scored 0.70 or more and swapped roles, negations and
+# other subjects 0.38 or less
+HASHED_THRESHOLD = 0.6
+MODEL_THRESHOLD = 0.85
+
+
+class HashedNgramEmbedder:
+    # Words, ordered word pairs and character n-grams hashed into a fixed
+    # number of signed dimensions (the hashing trick), L2-normalized. Nothing
+    # to load or download. Rewordings that keep the words in order (articles,
+    # punctuation, inflections) match; swapped roles ("girl befriends lion" /
+    # "lion befriends girl") differ in their ordered pairs, and negated words
+    # get features of their own. Synonyms ("brave" / "courageous") never
+    # match: that takes a SentenceEmbedder.
+    offload = False
+
+    def __init__(
+        self,
+        dim: int = 512,
+        ngram_range: Tuple[int, int] = (3, 5),
+        word_weight: float = 1.0,
+        order_weight: float = 3.0,
+        char_weight: float = 0.2,
+        window: int = 2,
+        negation_scope: int = 3
+    ):
+        self.dim = dim
+        self.ngram_range = ngram_range
+        self.word_weight = word_weight
+        self.order_weight = order_weight
+        self.char_weight = char_weight
+        # Pairs are taken between each word and the next `window` words
+        self.window = window
+        # Content words after a negation, up to punctuation, that it applies to
+        self.negation_scope = negation_scope
+
+    def _words(self, text: str) -> List[str]:
+        words = []
+        negated = 0
+        for token in re.findall(r"[a-z0-9']+|[.,;:!?]", text.lower()):
+            if token in PUNCTUATION:
+                negated = 0
+            elif token in NEGATIONS or token.endswith("n't"):
+                negated = self.negation_scope
+            elif token not in STOPWORDS:
+                words.append(f"not_{stem(token)}" if negated else stem(token))
+                negated = max(0, negated - 1)
+        return words
+
+    def _features(self, text: str) -> List[Tuple[str, float]]:
+        words = self._words(text)
+        features = [(f"w:{word}", self.word_weight) for word in words]
+        for i, first in enumerate(words):
+            features += [(f"o:{first}>{then}", self.order_weight) for then in words[i + 1:i + 1 + self.window]]
+        low, high = self.ngram_range
+        for word in words:
+            # Negated words must not share spelling features with plain ones
+            space = "n" if word.startswith("not_") else "c"
+            padded = f" {word[4:] if space == 'n' else word} "
+            for n in range(low, high + 1):
+                features += [(f"{space}:{padded[i:i + n]}", self.char_weight) for i in range(len(padded) - n + 1)]
+        return features
+
+    def embed(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        features = self._features(text)
+        if not features:
+            return vector
+        # crc32 rather than hash(): stable across processes, so a persisted
+        # index stays valid after a restart
+        hashes = np.array([zlib.crc32(feature.encode()) for feature, _ in features], dtype=np.uint64)
+        weights = np.array([weight for _, weight in features], dtype=np.float32)
+        signs = np.where(hashes >> np.uint64(31) & np.uint64(1), -1.0, 1.0).astype(np.float32)
+        np.add.at(vector, (hashes % np.uint64(self.dim)).astype(np.int64), signs * weights)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+
+class SentenceEmbedder:
+    # A small sentence-transformers model on the CPU, when installed. It also
+    # matches synonyms ("brave" / "courageous"), which hashed n-grams cannot.
+    offload = True
+
+    def __init__(self, model_name: str = "all-MiniLM-L6-v2"):
+        # Deferred: the import pulls in torch
+        from sentence_transformers import SentenceTransformer
+        self.model = SentenceTransformer(model_name, device="cpu")
+        self.dim = self.model.get_sentence_embedding_dimension()
+
+    def embed(self, text: str) -> np.ndarray:
+        return self.model.encode(text, normalize_embeddings=True).astype(np.float32)
+
+
+class VectorIndex:
+    # Exact nearest-neighbour search over a preallocated matrix of unit
+    # vectors: one matrix-vector product, a few milliseconds at 10,000
+    # entries. Entries only match within their scope (the inputs that must be
+    # identical), and the least recently used entry makes room when full.
+    # Each entry also has a key (its scope and exact text), so indexes saved
+    # by several workers can be merged without duplicates.
+    def __init__(self, dim: int, max_entries: int = 10000):
+        self.dim = dim
+        self.max_entries = max_entries
+        self.vectors = np.zeros((max_entries, dim), dtype=np.float32)
+        self.scopes = np.full(max_entries, "", dtype="<U64")
+        self.keys = np.full(max_entries, "", dtype="<U64")
+        self.last_used = np.zeros(max_entries, dtype=np.float64)
+        self.payloads: List[Optional[str]] = [None] * max_entries
+        self.slots: Dict[str, int] = {}
+        self.size = 0
+        self.evicted = 0
+
+    @staticmethod
+    def _scope_id(scope: str) -> str:
+        # Fixed width, to fit the scopes array whatever the caller's key
+        return hashlib.sha256(scope.encode()).hexdigest()
+
+    @staticmethod
+    def key_for(scope: str, text: str) -> str:
+        return hashlib.sha256(f"{scope}\n{text}".encode()).hexdigest()
+
+    def search(self, scope: str, vector: np.ndarray) -> Tuple[Optional[int], float]:
+        if not self.size:
+            return None, 0.0
+        similarities = self.vectors[:self.size] @ vector
+        similarities[self.scopes[:self.size] != self._scope_id(scope)] = -1.0
+        best = int(np.argmax(similarities))
+        return (best, float(similarities[best])) if similarities[best] > -1.0 else (None, 0.0)
+
+    def add(self, scope: str, key: str, vector: np.ndarray, payload: str) -> int:
+        if self.size < self.max_entries:
+            slot = self.size
+            self.size += 1
+        else:
+            slot = int(np.argmin(self.last_used))
+            self.slots.pop(str(self.keys[slot]), None)
+            self.evicted += 1
+        self.vectors[slot] = vector
+        self.scopes[slot] = self._scope_id(scope)
+        self.keys[slot] = key
+        self.payloads[slot] = payload
+        self.last_used[slot] = time.time()
+        self.slots[key] = slot
+        return slot
+
+    def touch(self, slot: int) -> None:
+        self.last_used[slot] = time.time()
+
+    def copy(self) -> "VectorIndex":
+        clone = VectorIndex(self.dim, self.max_entries)
+        clone._fill(self, range(self.size))
+        return clone
+
+    def _fill(self, source: "VectorIndex", slots: Any) -> None:
+        slots = np.asarray(list(slots), dtype=np.int64)
+        self.size = len(slots)
+        self.vectors[:self.size] = source.vectors[slots]
+        self.scopes[:self.size] = source.scopes[slots]
+        self.keys[:self.size] = source.keys[slots]
+        self.last_used[:self.size] = source.last_used[slots]
+        self.payloads[:self.size] = [source.payloads[slot] for slot in slots]
+        self.payloads[self.size:] = [None] * (self.max_entries - self.size)
+        self.slots = {str(key): slot for slot, key in enumerate(self.keys[:self.size])}
+
+    def merge(self, other: "VectorIndex") -> None:
+        # Union of both indexes by key, keeping each key's most recent use.
+        # The most recently used entries survive when there are too many.
+        latest: Dict[str, Tuple[float, int, int]] = {}
+        for source, index in enumerate((self, other)):
+            for slot in range(index.size):
+                key = str(index.keys[slot])
+                used = float(index.last_used[slot])
+                if key not in latest or used > latest[key][0]:
+                    latest[key] = (used, source, slot)
+        kept = sorted(latest.values(), reverse=True)[:self.max_entries]
+        self.evicted += len(latest) - len(kept)
+        combined = VectorIndex(self.dim, len(kept))
+        for target, (_, source, slot) in enumerate(kept):
+            index = (self, other)[source]
+            combined.vectors[target] = index.vectors[slot]
+            combined.scopes[target] = index.scopes[slot]
+            combined.keys[target] = index.keys[slot]
+            combined.last_used[target] = index.last_used[slot]
+            combined.payloads[target] = index.payloads[slot]
+        combined.size = len(kept)
+        self._fill(combined, range(combined.size))
+
+    def save(self, path: str) -> None:
+        # Written aside and renamed, so a crash mid-save keeps the old index
+        tmp = f"{path}.tmp.npz"
+        np.savez_compressed(
+            tmp,
+            vectors=self.vectors[:self.size],
+            scopes=self.scopes[:self.size],
+            keys=self.keys[:self.size],
+            last_used=self.last_used[:self.size],
+            payloads=np.array(self.payloads[:self.size], dtype=str)
+        )
+        os.replace(tmp, path)
+
+    def load(self, path: str) -> None:
+        with np.load(path, allow_pickle=False) as data:
+            if data["vectors"].shape[1:] != (self.dim,) or "keys" not in data:
+                logger.warning(f"Ignoring semantic index {path}: built for another embedder or version")
+                return
+            saved = VectorIndex(self.dim, len(data["vectors"]))
+            saved.size = len(data["vectors"])
+            saved.vectors[:] = data["vectors"]
+            saved.scopes[:] = data["scopes"]
+            saved.keys[:] = data["keys"]
+            saved.last_used[:] = data["last_used"]
+            saved.payloads = [str(payload) for payload in data["payloads"]]
+        # The most recently used entries survive a smaller max_entries
+        self._fill(saved, np.argsort(saved.last_used)[::-1][:self.max_entries])
+
+
+class SemanticCache:
+    # Near-duplicate tier behind the exact stage memo: a request whose text
+    # input (e.g. an outline's theme) is within `threshold` cosine similarity
+    # of an earlier one, with every other input identical, reuses its result.
+    # Workers sharing `path` each save under an exclusive lock by merging
+    # their entries into the file and taking in the others', so every worker
+    # sees the rest's entries as of its last save.
+    def __init__(
+        self,
+        embedder: Optional[Any] = None,
+        threshold: float = 0.85,
+        max_entries: int = 10000,
+        path: Optional[str] = None,
+        save_every: int = 50
+    ):
+        self.embedder = embedder or HashedNgramEmbedder()
+        self.threshold = threshold
+        self.index = VectorIndex(self.embedder.dim, max_entries)
+        self.path = path
+        self.save_every = save_every
+        self.unsaved = 0
+        self.hits = 0
+        self.misses = 0
+        self._saving: Optional[asyncio.Lock] = None
+        if path and os.path.exists(path):
+            try:
+                self.index.load(path)
+                logger.info(f"Loaded {self.index.size} semantic cache entries from {path}")
+            except Exception as e:
+                logger.warning(f"Could not load semantic cache {path}: {str(e)}")
+
+    @classmethod
+    def from_env(cls) -> Optional["SemanticCache"]:
+        # Off without a sentence-transformers model: hashed n-grams do not
+        # match synonyms, so they are only used when asked for by name
+        # (SEMANTIC_CACHE_MODEL=hashed), with a threshold calibrated for them
+        model = os.getenv("SEMANTIC_CACHE_MODEL") or "all-MiniLM-L6-v2"
+        if model == "hashed":
+            embedder, threshold = HashedNgramEmbedder(), HASHED_THRESHOLD
+        else:
+            try:
+                embedder, threshold = SentenceEmbedder(model), MODEL_THRESHOLD
+            except ImportError:
+                logger.warning("sentence-transformers is not installed; the semantic cache is off")
+                return None
+        return cls(
+            embedder,
+            threshold=float(os.getenv("SEMANTIC_CACHE_THRESHOLD") or threshold),
+            max_entries=int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "10000")),
+            path=os.getenv("SEMANTIC_CACHE_PATH", "semantic_cache.npz")
+        )
+
+    async def _embed(self, text: str) -> np.ndarray:
+        if self.embedder.offload:
+            return await asyncio.to_thread(self.embedder.embed, text)
+        return self.embedder.embed(text)
+
+    async def lookup(self, stage: str, scope: str, text: str) -> Optional[Dict[str, Any]]:
+        vector = await self._embed(text)
+        slot, similarity = self.index.search(scope, vector)
+        SEMANTIC_SIMILARITY.labels(stage=stage).observe(max(similarity, 0.0))
+        if slot is None or similarity < self.threshold:
+            self.misses += 1
+            SEMANTIC_LOOKUPS.labels(stage=stage, outcome="miss").inc()
+            return None
+        self.hits += 1
+        SEMANTIC_LOOKUPS.labels(stage=stage, outcome="hit").inc()
+        self.index.touch(slot)
+        logger.info(f"Semantic cache hit for {stage} at similarity {similarity:.3f}")
+        return json.loads(self.index.payloads[slot])
+
+    async def store(self, scope: str, text: str, result: Dict[str, Any]) -> None:
+        key = VectorIndex.key_for(scope, text)
+        slot = self.index.slots.get(key)
+        if slot is not None:
+            # Already indexed; keep the first result for this text
+            self.index.touch(slot)
+            return
+        self.index.add(scope, key, await self._embed(text), json.dumps(result, default=str))
+        self.unsaved += 1
+        if self.path and self.unsaved >= self.save_every:
+            await self.save()
+
+    def _merge_into_file(self, snapshot: VectorIndex) -> VectorIndex:
+        # Read, merge and write under one exclusive lock, so concurrent saves
+        # from other workers are never overwritten
+        lock_file = open(f"{self.path}.lock", "w")
+        try:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            if os.path.exists(self.path):
+                shared = VectorIndex(snapshot.dim, snapshot.max_entries)
+                shared.load(self.path)
+                snapshot.merge(shared)
+            snapshot.save(self.path)
+            return snapshot
+        finally:
+            lock_file.close()
+
+    async def save(self) -> None:
+        if not self.path or not self.unsaved:
+            return
+        if self._saving is None:
+            self._saving = asyncio.Lock()
+        async with self._saving:
+            pending = self.unsaved
+            if not pending:
+                return
+            try:
+                saved = await asyncio.to_thread(self._merge_into_file, self.index.copy())
+            except Exception as e:
+                logger.warning(f"Could not save semantic cache {self.path}: {str(e)}")
+                return
+            # Entries stored while the file was written stay unsaved
+            self.unsaved -= pending
+            self.index.merge(saved)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": self.index.size,
+            "evicted": self.index.evicted,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "threshold": self.threshold,
+        }
@@ -0,0 +1,238 @@
+import asyncio
+import logging
+import time
+import uuid
+from typing import Dict, Any, Optional, Callable, Awaitable, Tuple
+from prometheus_client import Counter
+from redis.asyncio import Redis
+from .llm_router import current_llm_batch
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+SINGLE_FLIGHT_CALLS = Counter("single_flight_calls_total", "Calls through a single-flight group", ["scope"])
+SINGLE_FLIGHT_COALESCED = Counter(
+    "single_flight_coalesced_total",
+    "Calls served by another caller's in-flight computation",
+    ["scope", "where"]
+)
+
+
+def flight_key(key: str) -> str:
+    # Batched calls can wait hours on the provider, so interactive callers
+    # never join a flight led by a batch run, nor the other way round
+    return f"batch:{key}" if current_llm_batch.get() is not None else key
+
+
+class LeaseStore:
+    # Time-limited ownership of a key across processes. Only the holder of the
+    # token may renew or release a lease.
+    async def acquire(self, key: str, token: str, ttl: float) -> bool:
+        raise NotImplementedError
+
+    async def renew(self, key: str, token: str, ttl: float) -> bool:
+        raise NotImplementedError
+
+    async def release(self, key: str, token: str) -> None:
+        raise NotImplementedError
+
+    async def held(self, key: str) -> bool:
+        raise NotImplementedError
+
+
+class InMemoryLeaseStore(LeaseStore):
+    def __init__(self):
+        self.leases: Dict[str, Tuple[str, float]] = {}
+
+    def _owner(self, key: str) -> Optional[str]:
+        lease = self.leases.get(key)
+        if lease is None or lease[1] <= time.monotonic():
+            self.leases.pop(key, None)
+            return None
+        return lease[0]
+
+    async def acquire(self, key: str, token: str, ttl: float) -> bool:
+        if self._owner(key) is not None:
+            return False
+        self.leases[key] = (token, time.monotonic() + ttl)
+        return True
+
+    async def renew(self, key: str, token: str, ttl: float) -> bool:
+        if self._owner(key) != token:
+            return False
+        self.leases[key] = (token, time.monotonic() + ttl)
+        return True
+
+    async def release(self, key: str, token: str) -> None:
+        if self._owner(key) == token:
+            del self.leases[key]
+
+    async def held(self, key: str) -> bool:
+        return self._owner(key) is not None
+
+
+RENEW_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('PEXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+RELEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+class RedisLeaseStore(LeaseStore):
+    def __init__(self, redis_client: Redis, prefix: str = "lease"):
+        self.redis_client = redis_client
+        self.prefix = prefix
+        self._renew = redis_client.register_script(RENEW_SCRIPT)
+        self._release = redis_client.register_script(RELEASE_SCRIPT)
+
+    def _key(self, key: str) -> str:
+        return f"{self.prefix}:{key}"
+
+    async def acquire(self, key: str, token: str, ttl: float) -> bool:
+        return bool(await self.redis_client.set(self._key(key), token, nx=True, px=int(ttl * 1000)))
+
+    async def renew(self, key: str, token: str, ttl: float) -> bool:
+        return bool(await self._renew(keys=[self._key(key)], args=[token, int(ttl * 1000)]))
+
+    async def release(self, key: str, token: str) -> None:
+        await self._release(keys=[self._key(key)], args=[token])
+
+    async def held(self, key: str) -> bool:
+        return bool(await self.redis_client.exists(self._key(key)))
+
+
+class SingleFlight:
+    # Identical concurrent calls share one computation. Within a process the
+    # callers await the leader's task. Across processes the leader holds a
+    # lease while it computes, and callers elsewhere poll `lookup` (normally
+    # the cache the leader writes to) until the result appears or the lease
+    # goes away, in which case one of them takes over.
+    def __init__(
+        self,
+        scope: str,
+        leases: Optional[LeaseStore] = None,
+        lease_ttl: float = 30.0,
+        poll_interval: float = 0.25,
+        max_wait: float = 600.0
+    ):
+        self.scope = scope
+        self.leases = leases
+        self.lease_ttl = lease_ttl
+        self.poll_interval = poll_interval
+        # A remote leader taking longer than this is not waited on any further
+        self.max_wait = max_wait
+        self.inflight: Dict[str, asyncio.Task] = {}
+        self.waiters: Dict[str, int] = {}
+        self.calls = 0
+        self.coalesced = {"local": 0, "remote": 0}
+
+    def _coalesce(self, where: str) -> None:
+        self.coalesced[where] += 1
+        SINGLE_FLIGHT_COALESCED.labels(scope=self.scope, where=where).inc()
+
+    async def do(
+        self,
+        key: str,
+        func: Callable[[], Awaitable[Any]],
+        lookup: Optional[Callable[[], Awaitable[Any]]] = None
+    ) -> Any:
+        self.calls += 1
+        SINGLE_FLIGHT_CALLS.labels(scope=self.scope).inc()
+        task = self.inflight.get(key)
+        if task is not None:
+            self._coalesce("local")
+        else:
+            task = self.inflight[key] = asyncio.create_task(self._lead(key, func, lookup))
+            task.add_done_callback(lambda _: self.inflight.pop(key, None))
+        self.waiters[key] = self.waiters.get(key, 0) + 1
+        try:
+            # Shielded so one caller giving up does not fail the others
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if self.waiters.get(key) == 1:
+                task.cancel()
+            raise
+        finally:
+            self.waiters[key] -= 1
+            if not self.waiters[key]:
+                del self.waiters[key]
+
+    async def _lead(
+        self,
+        key: str,
+        func: Callable[[], Awaitable[Any]],
+        lookup: Optional[Callable[[], Awaitable[Any]]]
+    ) -> Any:
+        if self.leases is None or lookup is None:
+            return await func()
+
+        lease_key = f"{self.scope}:{key}"
+        token = uuid.uuid4().hex
+        deadline = time.monotonic() + self.max_wait
+        waited = False
+        while True:
+            try:
+                acquired = await self.leases.acquire(lease_key, token, self.lease_ttl)
+            except Exception as e:
+                logger.warning(f"Single-flight lease unavailable, computing locally: {str(e)}")
+                return await func()
+            if acquired:
+                # The previous holder may have finished between our polls
+                if waited:
+                    result = await lookup()
+                    if result is not None:
+                        await self.leases.release(lease_key, token)
+                        return result
+                return await self._run_leased(lease_key, token, func)
+
+            if not waited:
+                waited = True
+                self._coalesce("remote")
+            while await self.leases.held(lease_key):
+                result = await lookup()
+                if result is not None:
+                    return result
+                if time.monotonic() > deadline:
+                    logger.warning(f"Gave up waiting on {lease_key}; computing locally")
+                    return await func()
+                await asyncio.sleep(self.poll_interval)
+            result = await lookup()
+            if result is not None:
+                return result
+
+    async def _run_leased(self, lease_key: str, token: str, func: Callable[[], Awaitable[Any]]) -> Any:
+        async def keep_alive() -> None:
+            while True:
+                await asyncio.sleep(self.lease_ttl / 3)
+                try:
+                    await self.leases.renew(lease_key, token, self.lease_ttl)
+                except Exception as e:
+                    logger.warning(f"Could not renew {lease_key}: {str(e)}")
+
+        renewer = asyncio.create_task(keep_alive())
+        try:
+            return await func()
+        finally:
+            renewer.cancel()
+            try:
+                await self.leases.release(lease_key, token)
+            except Exception as e:
+                logger.warning(f"Could not release {lease_key}: {str(e)}")
+
+    def stats(self) -> Dict[str, Any]:
+        coalesced = self.coalesced["local"] + self.coalesced["remote"]
+        return {
+            "calls": self.calls,
+            "coalesced_local": self.coalesced["local"],
+            "coalesced_remote": self.coalesced["remote"],
+            "in_flight": len(self.inflight),
+            "coalescing_rate": round(coalesced / self.calls, 4) if self.calls else 0.0,
+        }
@@ -0,0 +1,130 @@
+import logging
+import re
+from collections import defaultdict
+from typing import Dict, Any, Optional, Tuple, Callable, Awaitable, TYPE_CHECKING
+from .cache import ResultCache, cache_key
+from .single_flight import SingleFlight, flight_key
+
+if TYPE_CHECKING:
+    from agents.base import BaseAgent
+    from .semantic_cache import SemanticCache
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def normalize_inputs(value: Any) -> Any:
+    # Whitespace differences must not produce distinct keys
+    if isinstance(value, str):
+        return re.sub(r"\s+", " ", value).strip()
+    if isinstance(value, dict):
+        return {str(k): normalize_inputs(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [normalize_inputs(v) for v in value]
+    return value
+
+
+# The free-text input of each stage the semantic tier may answer; all other
+# inputs must match exactly. Only outlines: a validation is of its exact
+# content, and the sentence that differs may be the one needing review.
+SEMANTIC_STAGES = {"outline": "theme"}
+
+
+class StageMemo:
+    def __init__(
+        self,
+        cache: ResultCache,
+        expire: int = 24 * 3600,
+        flights: Optional[SingleFlight] = None,
+        semantic: Optional["SemanticCache"] = None
+    ):
+        self.cache = cache
+        self.expire = expire
+        # Stories that reach a stage with identical inputs at the same time
+        # share one agent call
+        self.flights = flights or SingleFlight("stage")
+        # Optional near-duplicate tier, consulted after an exact miss
+        self.semantic = semantic
+        self.hits: Dict[str, int] = defaultdict(int)
+        self.misses: Dict[str, int] = defaultdict(int)
+        self.semantic_hits: Dict[str, int] = defaultdict(int)
+
+    def key_for(self, stage: str, agent: "BaseAgent", inputs: Dict[str, Any]) -> str:
+        return cache_key(f"stage:{stage}", {
+            "agent": agent.name,
+            # A changed system prompt must not reuse outputs produced under the old one
+            "prefix": getattr(agent, "system_prefix", None),
+            "parameters": agent.parameters.model_dump(),
+            "inputs": normalize_inputs(inputs),
+        })
+
+    def _semantic_input(self, stage: str, agent: "BaseAgent", inputs: Dict[str, Any]) -> Optional[Tuple[str, str]]:
+        # (scope, text) for the semantic tier: the scope is the exact key of
+        # every input but the free text
+        field = SEMANTIC_STAGES.get(stage)
+        if self.semantic is None or field is None or not isinstance(inputs.get(field), str):
+            return None
+        rest = {name: value for name, value in inputs.items() if name != field}
+        return self.key_for(stage, agent, rest), normalize_inputs(inputs[field])
+
+    async def lookup(self, stage: str, agent: "BaseAgent", inputs: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        key = self.key_for(stage, agent, inputs)
+        cached = await self.cache.get(key)
+        if cached is not None:
+            self.hits[stage] += 1
+            logger.info(f"Stage cache hit for {stage}")
+            return cached
+        semantic_input = self._semantic_input(stage, agent, inputs)
+        if semantic_input is not None:
+            cached = await self.semantic.lookup(stage, *semantic_input)
+            if cached is not None:
+                self.hits[stage] += 1
+                self.semantic_hits[stage] += 1
+                # Exact repeats of this request now hit the first tier
+                await self.cache.set(key, cached, self.expire)
+                return cached
+        self.misses[stage] += 1
+        return None
+
+    async def store(self, stage: str, agent: "BaseAgent", inputs: Dict[str, Any], result: Dict[str, Any]) -> None:
+        if result.get("status") == "success":
+            await self.cache.set(self.key_for(stage, agent, inputs), result, self.expire)
+            semantic_input = self._semantic_input(stage, agent, inputs)
+            if semantic_input is not None:
+                await self.semantic.store(*semantic_input, result)
+
+    async def compute(
+        self,
+        stage: str,
+        agent: "BaseAgent",
+        inputs: Dict[str, Any],
+        produce: Callable[[], Awaitable[Dict[str, Any]]]
+    ) -> Dict[str, Any]:
+        # For a miss: runs produce() and stores its result, unless the same
+        # stage and inputs are already being computed here or elsewhere
+        key = self.key_for(stage, agent, inputs)
+
+        async def produce_and_store() -> Dict[str, Any]:
+            result = await produce()
+            await self.store(stage, agent, inputs, result)
+            return result
+
+        return await self.flights.do(flight_key(key), produce_and_store, lookup=lambda: self.cache.get(key))
+
+    async def call(self, stage: str, agent: "BaseAgent", method: str, **inputs: Any) -> Dict[str, Any]:
+        cached = await self.lookup(stage, agent, inputs)
+        if cached is not None:
+            return cached
+        return await self.compute(stage, agent, inputs, lambda: getattr(agent, method)(**inputs))
+
+    def stats(self) -> Dict[str, Any]:
+        stages = set(self.hits) | set(self.misses)
+        return {
+            stage: {
+                "hits": self.hits[stage],
+                "misses": self.misses[stage],
+                "hit_rate": round(self.hits[stage] / (self.hits[stage] + self.misses[stage]), 4),
+                **({"semantic_hits": self.semantic_hits[stage]} if stage in SEMANTIC_STAGES and self.semantic else {}),
+            }
+            for stage in sorted(stages)
+        }
@@ -0,0 +1,66 @@
+import logging
+import resource
+import threading
+import time
+from typing import Dict, Any, Callable, Optional
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class StartupReport:
+    # Wall time of each startup phase, plus whatever was built lazily later
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self.last_mark = self.started_at
+        self.phases: Dict[str, float] = {}
+        self.deferred: Dict[str, float] = {}
+        self.ready_at: Optional[float] = None
+
+    def mark(self, phase: str) -> None:
+        now = time.perf_counter()
+        self.phases[phase] = now - self.last_mark
+        self.last_mark = now
+
+    def ready(self) -> None:
+        self.mark("startup_event")
+        self.ready_at = time.perf_counter()
+        summary = ", ".join(f"{phase} {seconds * 1000:.0f}ms" for phase, seconds in self.phases.items())
+        logger.info(f"Ready in {(self.ready_at - self.started_at) * 1000:.0f}ms ({summary})")
+
+    def record_deferred(self, name: str, seconds: float) -> None:
+        self.deferred[name] = self.deferred.get(name, 0.0) + seconds
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "ready_ms": round((self.ready_at - self.started_at) * 1000) if self.ready_at else None,
+            "phases_ms": {phase: round(seconds * 1000) for phase, seconds in self.phases.items()},
+            "deferred_ms": {name: round(seconds * 1000) for name, seconds in self.deferred.items()},
+            # ru_maxrss is reported in kilobytes on Linux
+            "max_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        }
+
+
+startup_report = StartupReport()
+
+
+class LazyClient:
+    # Stands in for an SDK client whose import and construction are deferred
+    # until first use; attribute access builds it once and forwards
+    def __init__(self, name: str, factory: Callable[[], Any]):
+        self._name = name
+        self._factory = factory
+        self._client = None
+        self._lock = threading.Lock()
+
+    def _resolve(self) -> Any:
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    started = time.perf_counter()
+                    self._client = self._factory()
+                    startup_report.record_deferred(self._name, time.perf_counter() - started)
+        return self._client
+
+    def __getattr__(self, attribute: str) -> Any:
+        return getattr(self._resolve(), attribute)
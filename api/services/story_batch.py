@@ -0,0 +1,151 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Optional
+from bson import ObjectId
+from .llm_batch import LLMBatcher
+from .admission import AdmissionController
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class StoryBatchRunner:
+    # Generates a catalog of stories as one run rather than N interactive
+    # requests. All stories advance together, so each wave of agent calls
+    # (outlines, then validation and characters, then plots) reaches the
+    # batcher at once and goes to the provider as one batch. Stages shared by
+    # several stories, such as identical theme/age_group/tone outlines, are
+    # made once by the stage memo. Each story's progress is on its own
+    # document, so resuming a batch only runs what is unfinished. A run
+    # claims its batch on the document, so only one worker runs it at a time.
+    def __init__(
+        self,
+        pipeline: Any,
+        batcher: Optional[LLMBatcher] = None,
+        max_concurrency: int = 500,
+        max_stories: int = 1000,
+        lease_timeout: float = 300.0,
+        admission: Optional[AdmissionController] = None
+    ):
+        self.pipeline = pipeline
+        self.db = pipeline.db
+        self.batcher = batcher
+        # With an admission controller, each story also takes one of its
+        # background slots, shared with the other batches and queued jobs but
+        # not with interactive requests
+        self.admission = admission
+        self.max_concurrency = max_concurrency
+        self.max_stories = max_stories
+        # A running batch whose heartbeat is older than this was left by a
+        # worker that died, and may be claimed again
+        self.lease_timeout = lease_timeout
+
+    async def claim(self, batch_id: ObjectId) -> bool:
+        now = datetime.utcnow()
+        result = await self.db.story_batches.update_one(
+            {"_id": batch_id, "$or": [
+                {"status": {"$ne": "running"}},
+                {"heartbeat_at": {"$lt": now - timedelta(seconds=self.lease_timeout)}},
+            ]},
+            {"$set": {"status": "running", "started_at": now, "heartbeat_at": now}}
+        )
+        return bool(result.modified_count)
+
+    async def _heartbeat(self, batch_id: ObjectId) -> None:
+        while True:
+            await asyncio.sleep(self.lease_timeout / 3)
+            try:
+                await self.db.story_batches.update_one(
+                    {"_id": batch_id, "status": "running"},
+                    {"$set": {"heartbeat_at": datetime.utcnow()}}
+                )
+            except Exception as e:
+                logger.warning(f"Could not renew batch {batch_id}: {str(e)}")
+
+    async def create(self, parameter_sets: List[Dict[str, Any]]) -> ObjectId:
+        if not parameter_sets:
+            raise ValueError("A batch needs at least one story")
+        if len(parameter_sets) > self.max_stories:
+            raise ValueError(f"A batch takes at most {self.max_stories} stories")
+        story_ids = await self.pipeline.create_stories(parameter_sets)
+        result = await self.db.story_batches.insert_one({
+            "story_ids": story_ids,
+            "total": len(story_ids),
+            "status": "queued",
+            "created_at": datetime.utcnow()
+        })
+        return result.inserted_id
+
+    async def run(self, batch_id: ObjectId, resume: bool = False, claimed: bool = False) -> Dict[str, Any]:
+        # claimed: the caller already holds the batch through claim()
+        if not claimed and not await self.claim(batch_id):
+            raise RuntimeError("Batch is already running")
+        heartbeat = asyncio.create_task(self._heartbeat(batch_id))
+        try:
+            return await self._run(batch_id, resume)
+        finally:
+            heartbeat.cancel()
+
+    async def _run(self, batch_id: ObjectId, resume: bool) -> Dict[str, Any]:
+        batch = await self.db.story_batches.find_one({"_id": batch_id})
+        if not batch:
+            raise ValueError("Batch not found")
+        cursor = self.db.stories.find(
+            {"_id": {"$in": batch["story_ids"]}, "status": {"$ne": "completed"}},
+            {"parameters": 1}
+        )
+        stories = await cursor.to_list(length=None)
+        logger.info(f"Running batch {batch_id}: {len(stories)} of {batch['total']} stories to generate")
+
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def run_one(story: Dict[str, Any]) -> None:
+            async with semaphore:
+                try:
+                    if self.admission is None:
+                        # Resumed stories skip the stages they already recorded
+                        await self.pipeline.run_story(story["_id"], story["parameters"], resume=resume)
+                    else:
+                        async with self.admission.admit(f"batch:{batch_id}", background=True):
+                            await self.pipeline.run_story(story["_id"], story["parameters"], resume=resume)
+                except Exception as e:
+                    # Recorded on the story by the pipeline; the batch goes on
+                    logger.warning(f"Story {story['_id']} in batch {batch_id} failed: {str(e)}")
+
+        try:
+            if self.batcher is not None:
+                with self.batcher.activate():
+                    await asyncio.gather(*(run_one(story) for story in stories))
+            else:
+                await asyncio.gather(*(run_one(story) for story in stories))
+        except BaseException:
+            await self.db.story_batches.update_one({"_id": batch_id}, {"$set": {"status": "interrupted"}})
+            raise
+
+        state = await self.status(batch_id)
+        await self.db.story_batches.update_one({"_id": batch_id}, {"$set": {
+            "status": "completed" if state["failed"] == 0 else "completed_with_errors",
+            "finished_at": datetime.utcnow()
+        }})
+        return await self.status(batch_id)
+
+    async def status(self, batch_id: ObjectId) -> Optional[Dict[str, Any]]:
+        batch = await self.db.story_batches.find_one({"_id": batch_id})
+        if not batch:
+            return None
+        ids = batch["story_ids"]
+        completed = await self.db.stories.count_documents({"_id": {"$in": ids}, "status": "completed"})
+        failed = await self.db.stories.count_documents({"_id": {"$in": ids}, "status": "failed"})
+        state = {
+            "batch_id": str(batch["_id"]),
+            "status": batch["status"],
+            "total": batch["total"],
+            "completed": completed,
+            "failed": failed,
+            "progress": round(completed / batch["total"] * 100) if batch["total"] else 100,
+            "story_ids": [str(story_id) for story_id in ids],
+        }
+        if self.batcher is not None:
+            state["llm"] = self.batcher.stats()
+        return state
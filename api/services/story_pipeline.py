@@ -1,154 +1,388 @@
 import asyncio
-from typing import Dict, Any, List
+import time
+import weakref
+from contextvars import ContextVar
+from typing import Dict, Any, List, Optional, Callable, Awaitable, Tuple
 import logging
+from datetime import datetime
+from bson import ObjectId
 from motor.motor_asyncio import AsyncIOMotorClient
-from redis import Redis
-from agents.narrative_architect import NarrativeArchitect
-from agents.cultural_validator import CulturalValidator
-from agents.character_designer import CharacterDesigner
-from agents.plot_strategist import PlotStrategist
 from .image_generator import ImageGenerator
 from .asset_manager import AssetManager
+from .event_bus import StoryEventBus, TERMINAL_EVENTS
+from .cache import ResultCache, cache_key as make_cache_key
+from .rate_limiter import EngineLimits
+from .image_scheduler import ImageScheduler
+from .stage_memo import StageMemo
+from .scene_extractor import SceneExtractor
+from .story_writer import StoryWriter
+from .metrics import StoryTimer, STORY_LATENCY, current_story_timer, track_stage
+from .stage_graph import Stage, StageGraph
+from .agent_pool import AgentPool
+from .single_flight import SingleFlight, flight_key
+from .story_versions import StoryVersions, StoryNotReady, StoryEditConflict, STAGE_DEPENDENCIES, downstream, scene_key, stage_of
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# The event channel a story leading a flight mirrors its progress to, so
+# stories coalesced onto it stream the same stages and illustrations
+current_flight_channel: ContextVar[Optional[str]] = ContextVar("current_flight_channel", default=None)
+
 class StoryPipeline:
+    # Stage name -> (progress percentage, step recorded on the story document)
+    STAGE_PROGRESS = {
+        "outline": (20, "outline_generated"),
+        "validation": (40, "cultural_validated"),
+        "characters": (60, "characters_designed"),
+        "plot": (80, "plot_developed"),
+    }
+
     def __init__(
         self,
         mongo_client: AsyncIOMotorClient,
-        redis_client: Redis,
+        cache: ResultCache,
         image_generator: ImageGenerator,
-        asset_manager: AssetManager
+        asset_manager: AssetManager,
+        engine_limits: Optional[EngineLimits] = None,
+        image_scheduler: Optional[ImageScheduler] = None,
+        stage_memo: Optional[StageMemo] = None,
+        events: Optional[StoryEventBus] = None,
+        stream_plot: bool = True,
+        writer: Optional[StoryWriter] = None,
+        llm_router: Optional[Any] = None,
+        agent_pool: Optional[AgentPool] = None,
+        story_flights: Optional[SingleFlight] = None
     ):
         self.mongo_client = mongo_client
-        self.redis_client = redis_client
+        self.cache = cache
         self.db = mongo_client.african_stories
         self.image_generator = image_generator
         self.asset_manager = asset_manager
-        self.agents = self._initialize_agents()
-        
-    def _initialize_agents(self) -> Dict[str, Any]:
-        return {
-            "narrative_architect": NarrativeArchitect(),
-            "cultural_validator": CulturalValidator(),
-            "character_designer": CharacterDesigner(),
-            "plot_strategist": PlotStrategist(),
-        }
+        self.engine_limits = engine_limits or EngineLimits()
+        # Scenes go to whichever image engine should finish first, hedged and
+        # failed over between engines within a per-story deadline
+        self.image_scheduler = image_scheduler or ImageScheduler(image_generator, self.engine_limits)
+        # Agent outputs are memoized per stage on exactly the inputs each consumes
+        self.stage_memo = stage_memo or StageMemo(cache)
+        self.events = events or StoryEventBus()
+        self.stream_plot = stream_plot
+        self.writer = writer or StoryWriter(self.db)
+        # Agents are built lazily, one per role and parameter set, and shared;
+        # they call the LLM router (with prompt caching) when given one
+        self.agent_pool = agent_pool or AgentPool(llm_router)
+        # Concurrent stories with identical parameters share one run
+        self.story_flights = story_flights or SingleFlight("story")
+        # Edited stories keep every version of each stage output
+        self.versions = StoryVersions(self.db)
+        # Edits queue up within a process; across processes the revision
+        # check in _commit_edit turns a lost race into a conflict
+        self._edit_locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
+
+    def _agent(self, role: str, parameters: Dict[str, Any]) -> Any:
+        # Requests may tune each agent, e.g. {"agent_parameters": {"plot_strategist": {"temperature": 0.9}}}
+        return self.agent_pool.get(role, (parameters.get("agent_parameters") or {}).get(role))
 
     async def _cache_result(self, key: str, data: Dict[str, Any], expire: int = 3600) -> None:
-        try:
-            self.redis_client.setex(key, expire, str(data))
-        except Exception as e:
-            logger.error(f"Error caching result: {str(e)}")
+        await self.cache.set(key, data, expire)
 
-    async def _get_cached_result(self, key: str) -> Dict[str, Any]:
-        try:
-            cached = self.redis_client.get(key)
-            return eval(cached) if cached else None
-        except Exception as e:
-            logger.error(f"Error retrieving cached result: {str(e)}")
-            return None
+    async def _get_cached_result(self, key: str) -> Optional[Dict[str, Any]]:
+        return await self.cache.get(key)
+
+    def _build_stage_graph(
+        self,
+        parameters: Dict[str, Any],
+        on_scene: Optional[Callable[[str], None]] = None
+    ) -> StageGraph:
+        async def outline_stage(inputs: Dict[str, Any]) -> Dict[str, Any]:
+            return await self.stage_memo.call(
+                "outline",
+                self._agent("narrative_architect", parameters),
+                "generate_outline",
+                theme=parameters["theme"],
+                age_group=parameters["age_group"],
+                tone=parameters["tone"]
+            )
+
+        async def validation_stage(inputs: Dict[str, Any]) -> Dict[str, Any]:
+            return await self.stage_memo.call(
+                "validation",
+                self._agent("cultural_validator", parameters),
+                "validate_content",
+                content=inputs["outline"]["result"],
+                region=parameters["region"],
+                accuracy_level=parameters["accuracy"]
+            )
+
+        async def characters_stage(inputs: Dict[str, Any]) -> Dict[str, Any]:
+            return await self.stage_memo.call(
+                "characters",
+                self._agent("character_designer", parameters),
+                "design_characters",
+                character_type=parameters["character_type"],
+                diversity_options=parameters["diversity_options"],
+                story_context=inputs["outline"]["result"]
+            )
+
+        async def plot_stage(inputs: Dict[str, Any]) -> Dict[str, Any]:
+            agent = self._agent("plot_strategist", parameters)
+            plot_inputs = {
+                "complexity": parameters["complexity"],
+                "arc_type": parameters["arc_type"],
+                "outline": inputs["outline"]["result"],
+                "characters": inputs["characters"]["result"],
+            }
+            if not self.stream_plot or on_scene is None:
+                return await self.stage_memo.call("plot", agent, "develop_plot", **plot_inputs)
+
+            cached = await self.stage_memo.lookup("plot", agent, plot_inputs)
+            if cached is not None:
+                return cached
+
+            async def stream_plot() -> Dict[str, Any]:
+                # Hand each scene to the illustrators as soon as it has streamed
+                # in, so image generation overlaps with the rest of the plot.
+                # A story coalesced onto another's plot gets no scenes here and
+                # illustrates from the finished plot instead.
+                extractor = SceneExtractor()
+                chunks = []
+                async for chunk in agent.stream_plot(**plot_inputs):
+                    chunks.append(chunk)
+                    for scene in extractor.feed(chunk):
+                        on_scene(scene)
+                for scene in extractor.flush():
+                    on_scene(scene)
+                return {"status": "success", "result": "".join(chunks)}
+
+            return await self.stage_memo.compute("plot", agent, plot_inputs, stream_plot)
+
+        return (
+            StageGraph()
+            .add_stage("outline", self._timed("outline", outline_stage))
+            .add_stage("validation", self._timed("validation", validation_stage), depends_on=list(STAGE_DEPENDENCIES["validation"]))
+            .add_stage("characters", self._timed("characters", characters_stage), depends_on=list(STAGE_DEPENDENCIES["characters"]))
+            .add_stage("plot", self._timed("plot", plot_stage), depends_on=list(STAGE_DEPENDENCIES["plot"]))
+        )
+
+    def _timed(self, name: str, func: Callable[[Dict[str, Any]], Awaitable[Any]]) -> Callable[[Dict[str, Any]], Awaitable[Any]]:
+        async def timed_stage(inputs: Dict[str, Any]) -> Any:
+            async with track_stage(name):
+                return await func(inputs)
+        return timed_stage
 
     async def generate_story(self, parameters: Dict[str, Any]) -> Dict[str, Any]:
+        story_id = await self.create_story(parameters)
+        return await self.run_story(story_id, parameters)
+
+    def _story_document(self, parameters: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "parameters": parameters,
+            "status": "in_progress",
+            "progress": 0,
+            "steps": [],
+            "created_at": datetime.utcnow()
+        }
+
+    async def create_story(self, parameters: Dict[str, Any]) -> ObjectId:
+        # Insert initial document
+        result = await self.db.stories.insert_one(self._story_document(parameters))
+        return result.inserted_id
+
+    async def create_stories(self, parameter_sets: List[Dict[str, Any]]) -> List[ObjectId]:
+        # Catalog batches insert all their stories in one round trip
+        result = await self.db.stories.insert_many(
+            [self._story_document(parameters) for parameters in parameter_sets]
+        )
+        return result.inserted_ids
+
+    async def _load_progress(self, story_id: ObjectId) -> Dict[str, Any]:
+        # Rebuild stage results from the steps already recorded on the story
+        story = await self.db.stories.find_one({"_id": story_id})
+        if not story:
+            raise ValueError("Story not found")
+        completed = {}
+        for stage, (_, step) in self.STAGE_PROGRESS.items():
+            if step in story.get("steps", []) and step in story:
+                completed[stage] = {"status": "success", "result": story[step]}
+        return completed
+
+    async def run_story(
+        self,
+        story_id: ObjectId,
+        parameters: Dict[str, Any],
+        resume: bool = False
+    ) -> Dict[str, Any]:
+        # Stages, agents, image calls and writes report into this story's timer
+        timer = StoryTimer()
+        timer_token = current_story_timer.set(timer)
+        outcome = "failed"
         try:
+            completed = await self._load_progress(story_id) if resume else {}
+
             # Check cache
-            cache_key = f"story:{hash(str(parameters))}"
+            cache_key = make_cache_key("story", parameters)
             cached_result = await self._get_cached_result(cache_key)
             if cached_result:
+                await self._adopt_illustrations(story_id, cached_result)
+                await self.writer.complete(story_id, {**cached_result, "timings": timer.summary()})
+                await self.events.publish(story_id, "completed", {"story": cached_result})
+                outcome = "cached"
                 return cached_result
 
-            # Initialize story document
-            story_doc = {
-                "parameters": parameters,
-                "status": "in_progress",
-                "progress": 0,
-                "steps": []
-            }
-            
-            # Insert initial document
-            result = await self.db.stories.insert_one(story_doc)
-            story_id = result.inserted_id
-
-            # Generate outline
-            outline = await self.agents["narrative_architect"].generate_outline(
-                parameters["theme"],
-                parameters["age_group"],
-                parameters["tone"]
-            )
-            
-            await self._update_progress(story_id, 20, "outline_generated", outline)
+            # Identical stories already running here or on another worker are
+            # joined; the followers then complete like a cache hit
+            led = False
+            story_flight = flight_key(cache_key)
+            flight_channel = f"flight:{story_flight}"
 
-            # Validate cultural elements
-            validation = await self.agents["cultural_validator"].validate_content(
-                outline["result"],
-                parameters["region"],
-                parameters["accuracy"]
-            )
+            async def produce() -> Dict[str, Any]:
+                nonlocal led
+                led = True
+                current_flight_channel.set(flight_channel)
+                try:
+                    return await self._produce_story(story_id, parameters, cache_key, completed, resume, timer)
+                except Exception as e:
+                    await self.events.publish(flight_channel, "failed", {"error": str(e)})
+                    raise
 
-            await self._update_progress(story_id, 40, "cultural_validated", validation)
+            follower = asyncio.create_task(self._follow_flight(flight_channel, story_id, lambda: led))
+            try:
+                final_story = await self.story_flights.do(
+                    story_flight,
+                    produce,
+                    lookup=lambda: self._get_cached_result(cache_key)
+                )
+            finally:
+                follower.cancel()
+            if not led:
+                await self._adopt_illustrations(story_id, final_story)
+                await self.writer.complete(story_id, {**final_story, "timings": timer.summary()})
+                await self.events.publish(story_id, "completed", {"story": final_story})
+                outcome = "coalesced"
+                return final_story
 
-            # Design characters
-            characters = await self.agents["character_designer"].design_characters(
-                parameters["character_type"],
-                parameters["diversity_options"],
-                outline["result"]
-            )
+            outcome = "completed"
+            return final_story
 
-            await self._update_progress(story_id, 60, "characters_designed", characters)
+        except Exception as e:
+            logger.error(f"Error in story generation pipeline: {str(e)}")
+            await self.writer.fail(story_id, str(e))
+            await self.events.publish(story_id, "failed", {"error": str(e)})
+            raise
+        finally:
+            STORY_LATENCY.labels(outcome=outcome).observe(time.monotonic() - timer.started_at)
+            current_story_timer.reset(timer_token)
 
-            # Develop plot
-            plot = await self.agents["plot_strategist"].develop_plot(
-                parameters["complexity"],
-                parameters["arc_type"],
-                outline["result"],
-                characters["result"]
-            )
+    async def _follow_flight(self, flight_channel: str, story_id: ObjectId, leading: Callable[[], bool]) -> None:
+        # Relays the leader's progress to a coalesced story; its terminal
+        # event is published by run_story once the flight returns
+        try:
+            async for message in self.events.subscribe(flight_channel, replay_finished=False):
+                if leading() or message["event"] in TERMINAL_EVENTS:
+                    return
+                await self.events.publish(story_id, message["event"], message["data"])
+        except Exception as e:
+            logger.warning(f"Stopped relaying progress to story {story_id}: {str(e)}")
 
-            await self._update_progress(story_id, 80, "plot_developed", plot)
+    async def _publish(self, story_id: ObjectId, event: str, data: Dict[str, Any]) -> None:
+        await self.events.publish(story_id, event, data)
+        flight_channel = current_flight_channel.get()
+        if flight_channel is not None:
+            await self.events.publish(flight_channel, event, data)
 
-            # Generate illustrations
-            illustrations = await self._generate_illustrations(
-                story_id,
-                plot["result"],
-                parameters["illustration_style"]
-            )
+    async def _adopt_illustrations(self, story_id: ObjectId, story: Dict[str, Any]) -> None:
+        # A story served from the cache or another story's run shows that
+        # story's images, so it takes its own references to them
+        for url in story.get("illustrations", []):
+            record = await self.asset_manager.adopt_illustration(story_id, url)
+            if record is not None:
+                await self.writer.add_illustration(story_id, record)
 
-            # Final story compilation
-            final_story = {
-                "outline": outline["result"],
-                "validation": validation["result"],
-                "characters": characters["result"],
-                "plot": plot["result"],
-                "illustrations": illustrations,
-                "status": "completed",
-                "progress": 100
-            }
+    async def _produce_story(
+        self,
+        story_id: ObjectId,
+        parameters: Dict[str, Any],
+        cache_key: str,
+        completed: Dict[str, Dict[str, Any]],
+        resume: bool,
+        timer: StoryTimer
+    ) -> Dict[str, Any]:
+        style = parameters["illustration_style"]
+        existing = await self._saved_illustrations(story_id) if resume else None
+        scene_tasks: List[asyncio.Task] = []
+        # Illustrations still unfinished this long after the story started
+        # are dropped, which bounds the story's completion time
+        deadline = timer.started_at + self.image_scheduler.story_deadline
+        # Stories admitted under load illustrate fewer scenes
+        max_scenes = parameters.get("max_scenes")
 
-            # Update final document
-            await self.db.stories.update_one(
-                {"_id": story_id},
-                {"$set": final_story}
-            )
+        def on_scene(prompt: str) -> None:
+            if max_scenes is not None and len(scene_tasks) >= max_scenes:
+                return
+            scene_tasks.append(asyncio.create_task(
+                self._illustrate_scene(story_id, len(scene_tasks), prompt, style, existing, deadline)
+            ))
 
-            # Cache result
-            await self._cache_result(cache_key, final_story)
+        # Outline first; cultural validation and character design both only
+        # need the outline, so they run concurrently before the plot
+        graph = self._build_stage_graph(parameters, on_scene=on_scene)
 
-            return final_story
+        async def on_stage_complete(stage: Stage, data: Dict[str, Any]) -> None:
+            progress, step = self.STAGE_PROGRESS[stage.name]
+            await self._update_progress(story_id, progress, step, data)
 
-        except Exception as e:
-            logger.error(f"Error in story generation pipeline: {str(e)}")
-            if story_id:
-                await self.db.stories.update_one(
-                    {"_id": story_id},
-                    {
-                        "$set": {
-                            "status": "failed",
-                            "error": str(e)
-                        }
-                    }
-                )
+        try:
+            results = await graph.run(on_complete=on_stage_complete, completed=completed)
+        except Exception:
+            for task in scene_tasks:
+                task.cancel()
             raise
+        outline = results["outline"]
+        validation = results["validation"]
+        characters = results["characters"]
+        plot = results["plot"]
+
+        # Generate illustrations, unless the streamed plot already started them
+        async with track_stage("illustrations"):
+            if scene_tasks:
+                scene_results = await asyncio.gather(*scene_tasks)
+                illustrations = [url for url in scene_results if url is not None]
+            else:
+                illustrations = await self._generate_illustrations(
+                    story_id,
+                    plot["result"],
+                    style,
+                    existing=existing,
+                    deadline=deadline,
+                    max_scenes=max_scenes
+                )
+
+        # Final story compilation
+        final_story = {
+            "outline": outline["result"],
+            "validation": validation["result"],
+            "characters": characters["result"],
+            "plot": plot["result"],
+            "illustrations": illustrations,
+            "status": "completed",
+            "progress": 100
+        }
+
+        # Update final document; stage outputs already persisted by progress
+        # updates are copied server-side rather than sent again
+        # The timing breakdown is stored on the story but not cached with it
+        await self.writer.complete(story_id, {**final_story, "timings": timer.summary()}, aliases={
+            "outline": "outline_generated",
+            "validation": "cultural_validated",
+            "characters": "characters_designed",
+            "plot": "plot_developed",
+        })
+
+        # Cache result
+        await self._cache_result(cache_key, final_story)
+
+        await self._publish(story_id, "completed", {"story": final_story})
+        return final_story
 
     async def _update_progress(
         self,
@@ -157,47 +391,85 @@ class StoryPipeline:
         step: str,
         data: Dict[str, Any]
     ) -> None:
-        await self.db.stories.update_one(
-            {"_id": story_id},
-            {
-                "$set": {
-                    step: data["result"],
-                    "progress": progress,
-                },
-                "$push": {"steps": step}
-            }
+        # Concurrent stages can finish out of order; the writer never moves
+        # progress back and coalesces updates according to its durability
+        await self.writer.update_progress(story_id, step, data["result"], progress)
+        await self._publish(story_id, "stage", {
+            "step": step,
+            "progress": progress,
+            "result": data["result"]
+        })
+
+    async def _illustrate_scene(
+        self,
+        story_id: str,
+        index: int,
+        prompt: str,
+        style: Dict[str, Any],
+        existing: Optional[Dict[str, str]] = None,
+        deadline: Optional[float] = None
+    ) -> Optional[str]:
+        if existing and prompt in existing:
+            return existing[prompt]
+        try:
+            record = await self._render_scene(story_id, prompt, style, deadline)
+            # Its metadata record is batched by the writer
+            await self.writer.add_illustration(story_id, record)
+            await self._publish(story_id, "illustration", {
+                "scene": index,
+                "filepath": record["filepath"],
+                "url": record["url"]
+            })
+            # Stories reference illustrations by URL so clients can request renditions
+            return record["url"]
+        except asyncio.TimeoutError:
+            logger.warning(f"Dropped scene {index} of story {story_id}: image deadline passed")
+            return None
+        except Exception as e:
+            logger.error(f"Error generating illustration: {str(e)}")
+            return None
+
+    async def _render_scene(
+        self,
+        story_id: str,
+        prompt: str,
+        style: Dict[str, Any],
+        deadline: Optional[float] = None
+    ) -> Dict[str, Any]:
+        illustration, engine = await self.image_scheduler.generate(prompt, style, deadline)
+        return await self.asset_manager.create_illustration_record(
+            story_id,
+            illustration,
+            {"prompt": prompt, "style": style, "engine": engine}
         )
 
     async def _generate_illustrations(
         self,
         story_id: str,
         plot: str,
-        style: Dict[str, Any]
+        style: Dict[str, Any],
+        existing: Optional[Dict[str, str]] = None,
+        deadline: Optional[float] = None,
+        max_scenes: Optional[int] = None
     ) -> List[str]:
-        illustration_prompts = self._extract_illustration_prompts(plot)
-        illustrations = []
+        illustration_prompts = self._extract_illustration_prompts(plot)[:max_scenes]
 
-        for prompt in illustration_prompts:
-            try:
-                illustration = await self.image_generator.generate_illustration(
-                    prompt,
-                    style,
-                    engine=style.get("engine", "dalle")
-                )
-                
-                # Save illustration and get filepath
-                filepath = await self.asset_manager.save_illustration(
-                    story_id,
-                    illustration,
-                    {"prompt": prompt, "style": style}
-                )
-                
-                illustrations.append(filepath)
-            except Exception as e:
-                logger.error(f"Error generating illustration: {str(e)}")
-                continue
+        # Scenes run concurrently within the engines' limits; gather keeps
+        # scene order and failed scenes are dropped individually
+        results = await asyncio.gather(*(
+            self._illustrate_scene(story_id, index, prompt, style, existing, deadline)
+            for index, prompt in enumerate(illustration_prompts)
+        ))
+        return [url for url in results if url is not None]
 
-        return illustrations
+    async def _saved_illustrations(self, story_id: ObjectId) -> Dict[str, str]:
+        # Scenes illustrated before an interrupted run, keyed by prompt
+        illustrations = await self.asset_manager.get_story_illustrations(story_id)
+        return {
+            record["metadata"]["prompt"]: record.get("url", record["filepath"])
+            for record in illustrations
+            if "prompt" in record.get("metadata", {})
+        }
 
     def _extract_illustration_prompts(self, plot: str) -> List[str]:
         # Extract key scenes from plot for illustration
@@ -205,6 +477,237 @@ class StoryPipeline:
         scenes = plot.split("\n\n")
         return [scene for scene in scenes if "Scene:" in scene]
 
+    def _edit_lock(self, story_id: ObjectId) -> asyncio.Lock:
+        lock = self._edit_locks.get(str(story_id))
+        if lock is None:
+            lock = self._edit_locks[str(story_id)] = asyncio.Lock()
+        return lock
+
+    async def _load_for_edit(self, story_id: ObjectId) -> Tuple[Dict[str, Any], Dict[str, str]]:
+        story = await self.db.stories.find_one({"_id": story_id})
+        if not story:
+            raise ValueError("Story not found")
+        if story.get("status") != "completed":
+            raise StoryNotReady("Only completed stories can be regenerated")
+        outputs = story.get("outputs")
+        if outputs is None:
+            outputs = await self._bootstrap_outputs(story)
+        return story, dict(outputs)
+
+    async def _bootstrap_outputs(self, story: Dict[str, Any]) -> Dict[str, str]:
+        # A story's first edit records the versions its generation produced
+        story_id = story["_id"]
+        outputs: Dict[str, str] = {}
+        for stage in self.STAGE_PROGRESS:
+            inputs = {dep: outputs[dep] for dep in STAGE_DEPENDENCIES[stage]}
+            outputs[stage] = await self.versions.record(story_id, stage, story.get(stage), inputs)
+
+        prompts = self._extract_illustration_prompts(story.get("plot") or "")
+        saved = await self._saved_illustrations(story_id)
+        urls = story.get("illustrations", [])
+        for index, prompt in enumerate(prompts):
+            if prompt in saved:
+                url = saved[prompt]
+            elif len(urls) == len(prompts):
+                # Stories served from the cache reference the original's images
+                url = urls[index]
+            else:
+                continue
+            outputs[scene_key(index)] = await self.versions.record(
+                story_id,
+                scene_key(index),
+                {"prompt": prompt, "url": url},
+                {"plot": outputs["plot"]}
+            )
+        return outputs
+
+    async def _commit_edit(
+        self,
+        story: Dict[str, Any],
+        outputs: Dict[str, str],
+        fields: Dict[str, Any],
+        recomputed: List[str],
+        reused: List[str]
+    ) -> Dict[str, Any]:
+        # Outputs downstream of a recomputed one are stale until they are
+        # regenerated themselves
+        fresh = set(recomputed) | set(reused)
+        stale = (set(story.get("stale", [])) | downstream(outputs, recomputed)) - fresh
+        stale = sorted(key for key in stale if key in outputs)
+
+        scenes = sorted(
+            (int(key.split(":", 1)[1]), version)
+            for key, version in outputs.items()
+            if stage_of(key) == "illustration"
+        )
+        versions = await self.versions.get_many(version for _, version in scenes)
+        illustrations = [versions[version]["result"]["url"] for _, version in scenes]
+
+        revision = story.get("revision", 0) + 1
+        # The top-level fields keep following the current versions, so
+        # readers of the story document do not need to know about them
+        committed = await self.writer.commit_revision(story["_id"], story.get("revision"), {
+            **fields,
+            "illustrations": illustrations,
+            "outputs": outputs,
+            "stale": stale,
+            "revision": revision,
+            "updated_at": datetime.utcnow(),
+        })
+        if not committed:
+            raise StoryEditConflict(f"Story {story['_id']} was edited concurrently; reload and retry")
+        logger.info(f"Story {story['_id']} revision {revision}: recomputed {recomputed}, reused {len(reused)}")
+        return {
+            "status": "success",
+            "revision": revision,
+            "recomputed": recomputed,
+            "reused": reused,
+            "stale": stale,
+            **fields,
+            "illustrations": illustrations,
+        }
+
+    async def _reillustrate(
+        self,
+        story: Dict[str, Any],
+        outputs: Dict[str, str],
+        plot: str
+    ) -> Tuple[List[str], List[str]]:
+        # Scenes whose prompt survived the new plot keep their image; only new
+        # or changed scenes are drawn
+        story_id = story["_id"]
+        old_keys = [key for key in outputs if stage_of(key) == "illustration"]
+        old = await self.versions.get_many(outputs.pop(key) for key in old_keys)
+        by_prompt = {doc["result"]["prompt"]: doc["result"] for doc in old.values()}
+
+        prompts = self._extract_illustration_prompts(plot)[:story["parameters"].get("max_scenes")]
+        fresh = [index for index, prompt in enumerate(prompts) if prompt not in by_prompt]
+        style = story["parameters"]["illustration_style"]
+        records = await asyncio.gather(
+            *(self._render_scene(story_id, prompts[index], style) for index in fresh),
+            return_exceptions=True
+        )
+        rendered = {}
+        for index, record in zip(fresh, records):
+            if isinstance(record, Exception):
+                logger.error(f"Error regenerating scene {index} of story {story_id}: {str(record)}")
+            else:
+                rendered[index] = record
+        await self.writer.save_illustrations(list(rendered.values()))
+
+        recomputed, reused = [], []
+        for index, prompt in enumerate(prompts):
+            key = scene_key(index)
+            if index in rendered:
+                result = {"prompt": prompt, "url": rendered[index]["url"]}
+                recomputed.append(key)
+            elif prompt in by_prompt:
+                result = by_prompt[prompt]
+                reused.append(key)
+            else:
+                continue
+            outputs[key] = await self.versions.record(story_id, key, result, {"plot": outputs["plot"]})
+        return recomputed, reused
+
+    async def _regenerate_plot(
+        self,
+        story: Dict[str, Any],
+        outputs: Dict[str, str],
+        fields: Dict[str, Any],
+        recomputed: List[str],
+        cascade: bool
+    ) -> Dict[str, Any]:
+        parameters = story["parameters"]
+        # Called directly: the memoized plot for these inputs is the one
+        # being replaced
+        async with track_stage("plot"):
+            plot = await self._agent("plot_strategist", parameters).develop_plot(
+                complexity=parameters["complexity"],
+                arc_type=parameters["arc_type"],
+                outline=story["outline"],
+                characters=fields.get("characters", story["characters"])
+            )
+        outputs["plot"] = await self.versions.record(
+            story["_id"],
+            "plot",
+            plot["result"],
+            {dep: outputs[dep] for dep in STAGE_DEPENDENCIES["plot"]}
+        )
+        fields = {**fields, "plot": plot["result"]}
+        recomputed = recomputed + ["plot"]
+        reused: List[str] = []
+        if cascade:
+            async with track_stage("illustrations"):
+                redrawn, reused = await self._reillustrate(story, outputs, plot["result"])
+            recomputed += redrawn
+        return await self._commit_edit(story, outputs, fields, recomputed, reused)
+
+    async def regenerate_illustration(
+        self,
+        story_id: ObjectId,
+        scene: int,
+        prompt: Optional[str] = None
+    ) -> Dict[str, Any]:
+        # One image call; nothing depends on an illustration
+        async with self._edit_lock(story_id):
+            story, outputs = await self._load_for_edit(story_id)
+            # Stories degraded under load keep their scene cap
+            prompts = self._extract_illustration_prompts(story["plot"])[:story["parameters"].get("max_scenes")]
+            if not 0 <= scene < len(prompts):
+                raise ValueError(f"Scene {scene} not found")
+            key = scene_key(scene)
+            record = await self._render_scene(
+                story_id,
+                prompt or prompts[scene],
+                story["parameters"]["illustration_style"]
+            )
+            await self.writer.save_illustrations([record])
+            outputs[key] = await self.versions.record(
+                story_id,
+                key,
+                {"prompt": record["metadata"]["prompt"], "url": record["url"]},
+                {"plot": outputs["plot"]}
+            )
+            return await self._commit_edit(story, outputs, {}, [key], [])
+
+    async def regenerate_plot(self, story_id: ObjectId, cascade: bool = True) -> Dict[str, Any]:
+        # One LLM call, plus images for the scenes that changed when cascading
+        async with self._edit_lock(story_id):
+            story, outputs = await self._load_for_edit(story_id)
+            return await self._regenerate_plot(story, outputs, {}, [], cascade)
+
+    async def regenerate_character(
+        self,
+        story_id: ObjectId,
+        name: str,
+        instructions: Optional[str] = None,
+        cascade: bool = False
+    ) -> Dict[str, Any]:
+        # One LLM call. The plot was written around the old character, so it
+        # is marked stale, or rewritten too when cascading.
+        async with self._edit_lock(story_id):
+            story, outputs = await self._load_for_edit(story_id)
+            current = str(story.get("characters") or "")
+            if name.lower() not in current.lower():
+                raise ValueError(f"Character {name} not found")
+            async with track_stage("characters"):
+                characters = await self._agent("character_designer", story["parameters"]).redesign_character(
+                    name,
+                    characters=current,
+                    story_context=story["outline"],
+                    instructions=instructions
+                )
+            outputs["characters"] = await self.versions.record(
+                story_id,
+                "characters",
+                characters["result"],
+                {dep: outputs[dep] for dep in STAGE_DEPENDENCIES["characters"]}
+            )
+            fields = {"characters": characters["result"]}
+            if cascade:
+                return await self._regenerate_plot(story, outputs, fields, ["characters"], cascade=True)
+            return await self._commit_edit(story, outputs, fields, ["characters"], [])
+
     async def rollback_story(self, story_id: str) -> None:
         try:
             story = await self.db.stories.find_one({"_id": story_id})
@@ -0,0 +1,98 @@
+import hashlib
+from datetime import datetime
+from typing import Dict, Any, AsyncIterator, Iterable, List, Optional, Set
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from .cache import canonical_json
+from .pagination import stream_page
+
+# Stage -> the stages whose output it consumes. Illustrations are versioned
+# per scene ("illustration:3") and depend on the plot they were drawn from.
+STAGE_DEPENDENCIES = {
+    "outline": (),
+    "validation": ("outline",),
+    "characters": ("outline",),
+    "plot": ("outline", "characters"),
+    "illustration": ("plot",),
+}
+
+
+class StoryNotReady(Exception):
+    pass
+
+
+class StoryEditConflict(Exception):
+    pass
+
+
+def stage_of(key: str) -> str:
+    return key.split(":", 1)[0]
+
+
+def scene_key(index: int) -> str:
+    return f"illustration:{index}"
+
+
+def downstream(keys: Iterable[str], changed: Iterable[str]) -> Set[str]:
+    # Keys whose stage transitively consumes any of the changed stages
+    reached = {stage_of(key) for key in changed}
+    stale_stages: Set[str] = set()
+    grew = True
+    while grew:
+        grew = False
+        for stage, inputs in STAGE_DEPENDENCIES.items():
+            if stage not in stale_stages and reached.intersection(inputs):
+                stale_stages.add(stage)
+                reached.add(stage)
+                grew = True
+    return {key for key in keys if stage_of(key) in stale_stages}
+
+
+class StoryVersions:
+    # Every stage output a story has had, stored once per distinct result and
+    # inputs. The story document only points at the current version of each
+    # output, so an output that survives an edit is referenced, not copied.
+    def __init__(self, db: AsyncIOMotorDatabase):
+        self.db = db
+
+    @staticmethod
+    def version_id(story_id: Any, key: str, result: Any, inputs: Dict[str, str]) -> str:
+        return hashlib.sha256(canonical_json({
+            "story": str(story_id),
+            "key": key,
+            "result": result,
+            "inputs": inputs,
+        })).hexdigest()
+
+    async def record(self, story_id: Any, key: str, result: Any, inputs: Dict[str, str]) -> str:
+        version = self.version_id(story_id, key, result, inputs)
+        await self.db.story_outputs.update_one(
+            {"_id": version},
+            {"$setOnInsert": {
+                "story_id": story_id,
+                "key": key,
+                "stage": stage_of(key),
+                "result": result,
+                "inputs": inputs,
+                "created_at": datetime.utcnow(),
+            }},
+            upsert=True
+        )
+        return version
+
+    async def get_many(self, versions: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        cursor = self.db.story_outputs.find({"_id": {"$in": list(versions)}})
+        return {doc["_id"]: doc async for doc in cursor}
+
+    def history(
+        self,
+        story_id: Any,
+        key: Optional[str] = None,
+        projection: Optional[Dict[str, int]] = None,
+        cursor: Optional[str] = None,
+        limit: Optional[int] = None
+    ) -> AsyncIterator[bytes]:
+        # One keyset page of versions, newest first, streamed like the listings
+        query = {"story_id": story_id}
+        if key is not None:
+            query["key"] = key
+        return stream_page(self.db.story_outputs, query, projection, cursor, limit)
@@ -0,0 +1,191 @@
+import asyncio
+import hashlib
+import logging
+from typing import Dict, Any, List, Optional
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from .cache import canonical_json
+from .metrics import track_mongo_write
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# stage:     every progress update is written before the pipeline moves on
+# coalesced: updates are merged and written at most once per flush interval
+# final:     only the completed (or failed) story is written
+# In every mode illustrations are inserted in batches of
+# illustration_batch_size, and whatever is left goes with the next stage
+# write or the completing one; a crash loses at most one partial batch,
+# which a resumed story illustrates again
+DURABILITY_MODES = ("stage", "coalesced", "final")
+
+
+def _fingerprint(value: Any) -> str:
+    return hashlib.sha256(canonical_json(value)).hexdigest()
+
+
+class PendingStoryWrite:
+    def __init__(self):
+        self.set_fields: Dict[str, Any] = {}
+        self.max_fields: Dict[str, Any] = {}
+        self.steps: List[str] = []
+        self.copies: Dict[str, str] = {}
+        self.illustrations: List[Dict[str, Any]] = []
+        self.sent: Dict[str, str] = {}
+        self.flush_task: Optional[asyncio.Task] = None
+
+    @property
+    def dirty(self) -> bool:
+        return bool(self.set_fields or self.max_fields or self.steps or self.copies or self.illustrations)
+
+
+class StoryWriter:
+    def __init__(
+        self,
+        db: AsyncIOMotorDatabase,
+        durability: str = "stage",
+        flush_interval: float = 2.0,
+        illustration_batch_size: int = 8
+    ):
+        if durability not in DURABILITY_MODES:
+            raise ValueError(f"Unknown durability mode: {durability}")
+        self.db = db
+        self.durability = durability
+        self.flush_interval = flush_interval
+        self.illustration_batch_size = illustration_batch_size
+        self.pending: Dict[Any, PendingStoryWrite] = {}
+
+    def _pending(self, story_id: Any) -> PendingStoryWrite:
+        pending = self.pending.get(story_id)
+        if pending is None:
+            pending = self.pending[story_id] = PendingStoryWrite()
+        return pending
+
+    async def update_progress(self, story_id: Any, step: str, result: Any, progress: int) -> None:
+        pending = self._pending(story_id)
+        pending.set_fields[step] = result
+        pending.max_fields["progress"] = max(progress, pending.max_fields.get("progress", 0))
+        pending.steps.append(step)
+        await self._after_update(story_id, pending)
+
+    async def add_illustration(self, story_id: Any, record: Dict[str, Any]) -> None:
+        pending = self._pending(story_id)
+        pending.illustrations.append(record)
+        if len(pending.illustrations) >= self.illustration_batch_size:
+            await self._flush_illustrations(pending)
+
+    async def _after_update(self, story_id: Any, pending: PendingStoryWrite) -> None:
+        if self.durability == "stage":
+            await self.flush(story_id)
+        elif self.durability == "coalesced" and pending.flush_task is None:
+            pending.flush_task = asyncio.create_task(self._delayed_flush(story_id))
+
+    async def _delayed_flush(self, story_id: Any) -> None:
+        await asyncio.sleep(self.flush_interval)
+        pending = self.pending.get(story_id)
+        if pending is not None:
+            pending.flush_task = None
+            try:
+                await self.flush(story_id)
+            except Exception as e:
+                logger.error(f"Error flushing story {story_id}: {str(e)}")
+
+    async def _flush_illustrations(self, pending: PendingStoryWrite) -> None:
+        if not pending.illustrations:
+            return
+        records, pending.illustrations = pending.illustrations, []
+        await self.save_illustrations(records)
+
+    async def save_illustrations(self, records: List[Dict[str, Any]]) -> None:
+        # Written straight away whatever the durability; edits have no
+        # completing write that would flush them later
+        if not records:
+            return
+        async with track_mongo_write("insert_illustrations"):
+            await self.db.illustrations.insert_many(records, ordered=False)
+
+    async def commit_revision(self, story_id: Any, revision: Optional[int], fields: Dict[str, Any]) -> bool:
+        # Only applies on top of the revision the edit started from; False when
+        # another edit, on this worker or another, committed first
+        async with track_mongo_write("commit_revision"):
+            result = await self.db.stories.update_one({"_id": story_id, "revision": revision}, {"$set": fields})
+        return bool(result.matched_count)
+
+    async def flush(self, story_id: Any) -> None:
+        pending = self.pending.get(story_id)
+        if pending is None or not pending.dirty:
+            return
+
+        # Swap the buffers out first so updates arriving during the write are kept
+        set_fields, max_fields, steps, copies = pending.set_fields, pending.max_fields, pending.steps, pending.copies
+        pending.set_fields, pending.max_fields, pending.steps, pending.copies = {}, {}, [], {}
+
+        # Pipeline-style update so fields already on the document can be copied
+        # server-side instead of being sent again
+        stage: Dict[str, Any] = {field: {"$literal": value} for field, value in set_fields.items()}
+        for field, value in max_fields.items():
+            if field not in stage:
+                stage[field] = {"$max": [{"$ifNull": [f"${field}", value]}, value]}
+        if steps:
+            stage["steps"] = {"$concatArrays": [{"$ifNull": ["$steps", []]}, steps]}
+        pipeline = [{"$set": stage}] if stage else []
+        # Copies run in a later stage so they also see values set just above
+        if copies:
+            pipeline.append({"$set": {field: f"${source}" for field, source in copies.items()}})
+
+        if pipeline:
+            try:
+                async with track_mongo_write("update_story"):
+                    await self.db.stories.update_one({"_id": story_id}, pipeline)
+            except Exception:
+                pending.set_fields = {**set_fields, **pending.set_fields}
+                pending.max_fields = {**max_fields, **pending.max_fields}
+                pending.steps = steps + pending.steps
+                pending.copies = {**copies, **pending.copies}
+                raise
+            for field, value in set_fields.items():
+                pending.sent[field] = _fingerprint(value)
+        await self._flush_illustrations(pending)
+
+    async def complete(
+        self,
+        story_id: Any,
+        fields: Dict[str, Any],
+        aliases: Optional[Dict[str, str]] = None
+    ) -> None:
+        # Values that progress updates already stored (under the field itself or
+        # an aliased step field) are not sent to Mongo a second time
+        pending = self._pending(story_id)
+        aliases = aliases or {}
+        for field, value in fields.items():
+            fingerprint = _fingerprint(value)
+            if pending.sent.get(field) == fingerprint:
+                pending.set_fields.pop(field, None)
+                continue
+            source = aliases.get(field)
+            if source and (
+                pending.sent.get(source) == fingerprint
+                or (source in pending.set_fields and _fingerprint(pending.set_fields[source]) == fingerprint)
+            ):
+                pending.set_fields.pop(field, None)
+                pending.copies[field] = source
+                continue
+            pending.set_fields[field] = value
+        pending.max_fields.pop("progress", None)
+        await self.close(story_id)
+
+    async def fail(self, story_id: Any, error: str) -> None:
+        pending = self._pending(story_id)
+        pending.set_fields.update({"status": "failed", "error": error})
+        await self.close(story_id)
+
+    async def close(self, story_id: Any) -> None:
+        pending = self.pending.get(story_id)
+        if pending is None:
+            return
+        if pending.flush_task is not None:
+            pending.flush_task.cancel()
+            pending.flush_task = None
+        try:
+            await self.flush(story_id)
+        finally:
+            self.pending.pop(story_id, None)
@@ -0,0 +1,126 @@
+import asyncio
+import logging
+import time
+from typing import Dict, Any, Optional, List
+from bson import ObjectId
+from .job_queue import Job, JobQueue
+from .story_pipeline import StoryPipeline
+from .admission import AdmissionController
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class StoryWorkerPool:
+    def __init__(
+        self,
+        queue: JobQueue,
+        pipeline: StoryPipeline,
+        concurrency: int = 4,
+        max_attempts: int = 3,
+        poll_interval: float = 1.0,
+        retry_delay: float = 5.0,
+        max_retry_delay: float = 300.0,
+        admission: Optional[AdmissionController] = None
+    ):
+        self.queue = queue
+        self.pipeline = pipeline
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self.poll_interval = poll_interval
+        # Failed jobs come back after retry_delay, doubling per attempt
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        # Jobs take background admission slots, separate from interactive requests
+        self.admission = admission
+        self._tasks: List[asyncio.Task] = []
+
+    def start(self) -> None:
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._run(i)) for i in range(self.concurrency)]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _run(self, worker_index: int) -> None:
+        while True:
+            try:
+                await self.queue.requeue_expired()
+                job = await self.queue.dequeue()
+            except Exception as e:
+                logger.error(f"Worker {worker_index} could not fetch a job: {str(e)}")
+                job = None
+            if job is None:
+                await asyncio.sleep(self.poll_interval)
+                continue
+            try:
+                await self._process(job)
+            except Exception as e:
+                # e.g. the queue was unreachable for the ack; the job is
+                # redelivered once its lease expires
+                logger.error(f"Worker {worker_index} could not settle job {job.job_id}: {str(e)}")
+
+    def _backoff(self, job: Job) -> float:
+        return min(self.retry_delay * 2 ** (job.attempts - 1), self.max_retry_delay)
+
+    async def _heartbeat(self, job: Job) -> None:
+        # Keeps the job invisible to other workers while it is still running;
+        # returns once the lease is lost
+        renewed_at = time.monotonic()
+        while True:
+            await asyncio.sleep(self.queue.visibility_timeout / 3)
+            try:
+                if not await self.queue.extend(job):
+                    logger.error(f"Story job {job.job_id} was handed to another worker")
+                    return
+                renewed_at = time.monotonic()
+            except Exception as e:
+                logger.warning(f"Could not extend story job {job.job_id}: {str(e)}")
+                if time.monotonic() - renewed_at >= self.queue.visibility_timeout:
+                    logger.error(f"Lease on story job {job.job_id} expired")
+                    return
+
+    async def _run_story(self, story_id: ObjectId, parameters: Dict[str, Any]) -> None:
+        # Waiting for a slot happens under the job's heartbeat too
+        if self.admission is None:
+            await self.pipeline.run_story(story_id, parameters, resume=True)
+            return
+        async with self.admission.admit("jobs", background=True):
+            await self.pipeline.run_story(story_id, parameters, resume=True)
+
+    async def _process(self, job: Job) -> None:
+        heartbeat = asyncio.create_task(self._heartbeat(job))
+        run: Optional[asyncio.Task] = None
+        try:
+            story_id = ObjectId(job.payload["story_id"])
+            run = asyncio.create_task(self._run_story(story_id, job.payload["parameters"]))
+            await asyncio.wait({run, heartbeat}, return_when=asyncio.FIRST_COMPLETED)
+            if not run.done():
+                # Another worker may already be running the story; stop writing
+                # to it and leave the job to that worker
+                run.cancel()
+                await asyncio.gather(run, return_exceptions=True)
+                return
+            run.result()
+            await self.queue.ack(job)
+        except asyncio.CancelledError:
+            # Shutting down: hand the job back so another worker resumes it
+            if run is not None:
+                run.cancel()
+            await self.queue.nack(job)
+            raise
+        except Exception as e:
+            if job.attempts < self.max_attempts:
+                delay = self._backoff(job)
+                logger.warning(
+                    f"Story job {job.job_id} failed (attempt {job.attempts}), retrying in {delay:.1f}s: {str(e)}"
+                )
+                await self.queue.nack(job, delay=delay)
+            else:
+                logger.error(f"Story job {job.job_id} failed after {job.attempts} attempts: {str(e)}")
+                await self.queue.ack(job)
+        finally:
+            heartbeat.cancel()
@@ -0,0 +1,114 @@
+import asyncio
+import pytest
+from services.admission import AdmissionController, AdmissionRejected, degrade
+
+
+def controller(**kwargs):
+    return AdmissionController(**{"max_wait": 5.0, "expected_duration": 0.05, **kwargs})
+
+
+async def test_interactive_story_is_admitted_while_a_full_batch_waits():
+    admission = controller(max_in_flight=2, max_background=4)
+    parked = asyncio.Event()
+
+    async def batch_story():
+        # Holds its background slot for as long as a provider batch takes
+        async with admission.admit("batch:1", background=True):
+            await parked.wait()
+
+    batch = [asyncio.create_task(batch_story()) for _ in range(10)]
+    await asyncio.sleep(0)
+    assert admission.stats()["background_in_flight"] == 4
+    assert admission.stats()["queued_background"] == 6
+
+    granted = await asyncio.wait_for(admission.acquire("client"), 0.5)
+    assert granted.level == 0
+    assert admission.in_flight == 1
+    granted.release()
+    parked.set()
+    await asyncio.gather(*batch)
+    assert admission.stats()["background_in_flight"] == 0
+
+
+async def test_background_work_is_never_rejected_or_degraded():
+    admission = controller(max_in_flight=1, max_queue=1, max_background=1)
+    first = await admission.acquire("jobs", background=True)
+    tickets = [admission.enqueue("jobs", background=True) for _ in range(5)]
+    first.release()
+    for ticket in tickets:
+        granted = await ticket.wait()
+        assert granted.level == 0
+        granted.release()
+
+
+async def test_tenants_are_served_round_robin():
+    admission = controller(max_in_flight=1, max_queue=10, tenant_queue_share=1.0)
+    holder = await admission.acquire("a")
+    order = []
+
+    async def request(tenant):
+        async with admission.admit(tenant):
+            order.append(tenant)
+
+    waiting = [asyncio.create_task(request(tenant)) for tenant in ("a", "a", "a", "b")]
+    await asyncio.sleep(0)
+    holder.release()
+    await asyncio.gather(*waiting)
+    assert order == ["a", "b", "a", "a"]
+
+
+async def test_full_queue_is_rejected_with_retry_after():
+    admission = controller(max_in_flight=1, max_queue=2, tenant_queue_share=1.0)
+    holder = await admission.acquire("a")
+    tickets = [admission.enqueue("a"), admission.enqueue("b")]
+    with pytest.raises(AdmissionRejected) as rejected:
+        admission.enqueue("c")
+    assert rejected.value.retry_after >= 1
+    for ticket in tickets:
+        ticket.cancel()
+    holder.release()
+    assert admission.stats()["rejected"] == 1
+
+
+async def test_one_tenant_cannot_fill_the_queue():
+    admission = controller(max_in_flight=1, max_queue=4, tenant_queue_share=0.5)
+    holder = await admission.acquire("a")
+    tickets = [admission.enqueue("a"), admission.enqueue("a")]
+    with pytest.raises(AdmissionRejected):
+        admission.enqueue("a")
+    tickets.append(admission.enqueue("b"))
+    for ticket in tickets:
+        ticket.cancel()
+    holder.release()
+
+
+async def test_waiting_past_max_wait_times_out():
+    admission = controller(max_in_flight=1, max_wait=0.05)
+    holder = await admission.acquire("a")
+    with pytest.raises(AdmissionRejected):
+        await admission.acquire("b")
+    assert admission.stats()["timed_out"] == 1
+    assert admission.queued == 0
+    holder.release()
+
+
+async def test_stories_are_degraded_as_load_rises():
+    admission = controller(max_in_flight=4, degrade_at=(0.5, 1.0))
+    first = await admission.acquire("a")
+    assert first.level == 0
+    second = await admission.acquire("a")
+    assert second.level == 1
+    assert second.apply({"theme": "courage"})["max_scenes"] == 4
+    # Background work is left out of the load
+    background = await admission.acquire("jobs", background=True)
+    assert background.level == 0
+    assert admission.load() == 0.5
+    for granted in (first, second, background):
+        granted.release()
+
+
+def test_degraded_parameters_keep_the_smaller_scene_cap():
+    degraded = degrade({"max_scenes": 2, "illustration_style": {"engine": "dalle"}}, 2, model_tiers=False)
+    assert degraded["max_scenes"] == 2
+    assert degraded["illustration_style"] == {"engine": "dalle", "size": 512}
+    assert "agent_parameters" not in degraded
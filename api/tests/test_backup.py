@@ -0,0 +1,76 @@
+import os
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+from services.backup import BackupEngine
+from services.blob_store import BlobStore
+
+
+async def story_with_illustration(db, blobs, image=b"image bytes"):
+    story = await db.stories.insert_one({"theme": "courage", "status": "completed"})
+    blob = await blobs.put(image)
+    await db.illustrations.insert_one({"story_id": story.inserted_id, "blob": blob["digest"], "filepath": blob["path"]})
+    return story.inserted_id, blob
+
+
+def engine_for(tmp_path, **kwargs):
+    db = AsyncMongoMockClient().test_backup
+    asset_dir = str(tmp_path / "assets")
+    blobs = BlobStore(db, os.path.join(asset_dir, "blobs"))
+    return BackupEngine(db, asset_dir=asset_dir, root=str(tmp_path / "backups"), **kwargs), db, blobs
+
+
+async def test_backups_only_copy_changed_files(tmp_path):
+    engine, db, blobs = engine_for(tmp_path)
+    await story_with_illustration(db, blobs)
+    first = await engine.backup()
+    assert first["files"] == first["files_copied"] == 1
+    await story_with_illustration(db, blobs, b"other image")
+    second = await engine.backup()
+    assert second["files"] == 2
+    assert second["files_copied"] == 1
+    assert second["documents"] == {"stories": 2, "illustrations": 2, "blobs": 2}
+
+
+async def test_metadata_is_split_into_segments(tmp_path):
+    engine, db, blobs = engine_for(tmp_path, segment_size=2)
+    for i in range(5):
+        await db.stories.insert_one({"theme": f"theme {i}"})
+    summary = await engine.backup()
+    meta = engine._load_meta(summary["snapshot_id"])
+    assert len(meta["collections"]["stories"]["segments"]) == 3
+    assert meta["collections"]["stories"]["count"] == 5
+
+
+async def test_story_restore_brings_back_records_files_and_refs(tmp_path):
+    engine, db, blobs = engine_for(tmp_path)
+    story_id, blob = await story_with_illustration(db, blobs)
+    summary = await engine.backup(str(story_id))
+    await db.stories.delete_one({"_id": story_id})
+    await db.illustrations.delete_many({"story_id": story_id})
+    await blobs.release(blob["digest"])
+    assert not os.path.exists(blob["path"])
+
+    restored = await engine.restore(summary["snapshot_id"])
+    assert restored["files"]["restored"] == 1
+    assert os.path.exists(blob["path"])
+    assert await db.stories.find_one({"_id": story_id}) is not None
+    assert (await blobs.get(blob["digest"]))["refs"] == 1
+
+
+async def test_restoring_twice_does_not_add_references(tmp_path):
+    engine, db, blobs = engine_for(tmp_path)
+    story_id, blob = await story_with_illustration(db, blobs)
+    summary = await engine.backup(str(story_id))
+    await engine.restore(summary["snapshot_id"])
+    await engine.restore(summary["snapshot_id"])
+    assert (await blobs.get(blob["digest"]))["refs"] == 1
+
+
+async def test_latest_snapshot_and_unknown_snapshot(tmp_path):
+    engine, db, blobs = engine_for(tmp_path)
+    story_id, _ = await story_with_illustration(db, blobs)
+    summary = await engine.backup(str(story_id))
+    assert await engine.latest_snapshot(str(story_id)) == summary["snapshot_id"]
+    assert await engine.latest_snapshot() is None
+    with pytest.raises(ValueError):
+        await engine.restore("full-missing")
@@ -0,0 +1,75 @@
+import asyncio
+import os
+import threading
+from mongomock_motor import AsyncMongoMockClient
+from services.blob_store import BlobStore
+
+
+def store_for(tmp_path, **kwargs):
+    return BlobStore(AsyncMongoMockClient().test_blobs, str(tmp_path / "blobs"), **kwargs)
+
+
+async def test_identical_content_is_stored_once(tmp_path):
+    store = store_for(tmp_path)
+    first = await store.put(b"image bytes")
+    second = await store.put(b"image bytes")
+    assert first == second
+    assert BlobStore.is_digest(first["digest"])
+    assert (await store.get(first["digest"]))["refs"] == 2
+    assert await store.db.blobs.count_documents({}) == 1
+
+
+async def test_files_are_removed_with_the_last_reference(tmp_path):
+    store = store_for(tmp_path)
+    blob = await store.put(b"image bytes")
+    await store.put_derived(blob["digest"], "webp", b"rendition")
+    await store.acquire(blob["digest"])
+    await store.release(blob["digest"])
+    assert os.path.exists(blob["path"])
+    await store.release(blob["digest"])
+    assert not os.path.exists(blob["path"])
+    assert not os.path.exists(store.path_for(blob["digest"], "webp"))
+    assert await store.get(blob["digest"]) is None
+
+
+async def test_acquire_skips_missing_and_tombstoned_blobs(tmp_path):
+    store = store_for(tmp_path)
+    assert await store.acquire("0" * 64) is None
+    blob = await store.put(b"image bytes")
+    await store.db.blobs.update_one({"_id": blob["digest"]}, {"$set": {"removing": "token"}})
+    assert await store.acquire(blob["digest"]) is None
+
+
+async def test_put_during_removal_rewrites_the_file(tmp_path):
+    store = store_for(tmp_path, removal_timeout=0.1)
+    blob = await store.put(b"image bytes")
+    # A release tombstoned the blob and removed its file, then died
+    await store.db.blobs.update_one({"_id": blob["digest"]}, {"$set": {"refs": 0, "removing": "token"}})
+    os.remove(blob["path"])
+    again = await store.put(b"image bytes")
+    assert os.path.exists(again["path"])
+    stored = await store.get(blob["digest"])
+    assert stored["refs"] == 1
+    assert "removing" not in stored
+
+
+async def test_release_keeps_a_blob_referenced_during_removal(tmp_path):
+    store = store_for(tmp_path)
+    blob = await store.put(b"image bytes")
+    remove_files, started, proceed = store._remove_files, threading.Event(), threading.Event()
+
+    def slow_remove(digest):
+        started.set()
+        proceed.wait(2)
+        remove_files(digest)
+
+    store._remove_files = slow_remove
+    release = asyncio.create_task(store.release(blob["digest"]))
+    await asyncio.to_thread(started.wait, 2)
+    # Another story references the blob while its files are being removed
+    await store.db.blobs.update_one({"_id": blob["digest"]}, {"$inc": {"refs": 1}})
+    proceed.set()
+    await release
+    stored = await store.get(blob["digest"])
+    assert stored["refs"] == 1
+    assert "removing" not in stored
@@ -0,0 +1,68 @@
+import fakeredis
+import pytest
+from services.cache import LRUCache, MemoryCacheBackend, RedisCacheBackend, ResultCache, Serializer, cache_key
+
+
+class BrokenBackend(MemoryCacheBackend):
+    async def get(self, key):
+        raise ConnectionError("Redis is down")
+
+    async def set(self, key, value, expire):
+        raise ConnectionError("Redis is down")
+
+    async def delete(self, key):
+        raise ConnectionError("Redis is down")
+
+
+STORY = {"title": "Anansi", "scenes": ["a" * 2000, "b"], "progress": 100}
+
+
+def test_cache_key_ignores_dict_order():
+    assert cache_key("story", {"a": 1, "b": 2}) == cache_key("story", {"b": 2, "a": 1})
+    assert cache_key("story", {"a": 1}) != cache_key("stage", {"a": 1})
+
+
+@pytest.mark.parametrize("fmt", ["orjson", "msgpack"])
+@pytest.mark.parametrize("compress", [False, True])
+def test_serializer_round_trip(fmt, compress):
+    serializer = Serializer(fmt, compress=compress)
+    assert serializer.loads(serializer.dumps(STORY)) == STORY
+
+
+async def test_result_cache_round_trip():
+    backend = MemoryCacheBackend()
+    cache = ResultCache(backend, Serializer(compress=True))
+    await cache.set("story:1", STORY)
+    assert await cache.get("story:1") == STORY
+
+    # A fresh process only has the shared backend
+    assert await ResultCache(backend, Serializer(compress=True)).get("story:1") == STORY
+
+    await cache.delete("story:1")
+    assert await cache.get("story:1") is None
+    assert await backend.get("story:1") is None
+
+
+async def test_result_cache_round_trip_through_redis():
+    backend = RedisCacheBackend(fakeredis.aioredis.FakeRedis())
+    cache = ResultCache(backend, local=LRUCache(max_entries=0))
+    await cache.set("story:1", STORY, expire=60)
+    assert await cache.get("story:1") == STORY
+    await cache.delete("story:1")
+    assert await cache.get("story:1") is None
+    await cache.close()
+
+
+async def test_expired_entries_are_misses():
+    cache = ResultCache(MemoryCacheBackend(), local=LRUCache(ttl=0))
+    await cache.set("story:1", STORY, expire=0)
+    assert await cache.get("story:1") is None
+
+
+async def test_backend_outage_degrades_to_local_tier():
+    cache = ResultCache(BrokenBackend())
+    await cache.set("story:1", STORY)
+    # Served from the local tier; the failed backend write is only logged
+    assert await cache.get("story:1") == STORY
+    await cache.delete("story:1")
+    assert await cache.get("story:1") is None
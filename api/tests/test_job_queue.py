@@ -0,0 +1,100 @@
+import asyncio
+from services.job_queue import InMemoryJobQueue
+from services.worker import StoryWorkerPool
+
+
+async def test_dequeue_orders_by_priority_then_fifo():
+    queue = InMemoryJobQueue()
+    await queue.enqueue("low", {}, priority=0)
+    await queue.enqueue("high", {}, priority=5)
+    await queue.enqueue("low-2", {}, priority=0)
+    assert [(await queue.dequeue()).job_id for _ in range(3)] == ["high", "low", "low-2"]
+    assert await queue.dequeue() is None
+
+
+async def test_ack_removes_the_job():
+    queue = InMemoryJobQueue()
+    await queue.enqueue("job", {"story_id": "s"})
+    job = await queue.dequeue()
+    assert job.attempts == 1
+    await queue.ack(job)
+    assert await queue.depth() == {"pending": 0, "inflight": 0}
+    assert await queue.requeue_expired() == 0
+
+
+async def test_nack_redelivers_with_the_next_attempt():
+    queue = InMemoryJobQueue()
+    await queue.enqueue("job", {})
+    job = await queue.dequeue()
+    await queue.nack(job)
+    redelivered = await queue.dequeue()
+    assert redelivered.job_id == "job"
+    assert redelivered.attempts == 2
+
+
+async def test_nack_with_delay_holds_the_job_back():
+    queue = InMemoryJobQueue()
+    await queue.enqueue("job", {})
+    await queue.nack(await queue.dequeue(), delay=0.05)
+    assert await queue.requeue_expired() == 0
+    assert await queue.dequeue() is None
+    await asyncio.sleep(0.06)
+    assert await queue.requeue_expired() == 1
+    assert (await queue.dequeue()).attempts == 2
+
+
+async def test_unacked_job_is_redelivered_after_the_visibility_timeout():
+    queue = InMemoryJobQueue(visibility_timeout=0.05)
+    await queue.enqueue("job", {})
+    stale = await queue.dequeue()
+    assert await queue.dequeue() is None
+    await asyncio.sleep(0.06)
+    assert await queue.requeue_expired() == 1
+    fresh = await queue.dequeue()
+    assert fresh.attempts == 2
+    # The first consumer lost its lease and cannot renew it
+    assert not await queue.extend(stale)
+    assert await queue.extend(fresh)
+
+
+class FlakyPipeline:
+    def __init__(self, failures):
+        self.failures = failures
+        self.runs = 0
+
+    async def run_story(self, story_id, parameters, resume=False):
+        self.runs += 1
+        if self.runs <= self.failures:
+            raise RuntimeError("agent failed")
+        return {"story_id": str(story_id)}
+
+
+async def run_pool(pool, queue, until):
+    pool.start()
+    try:
+        for _ in range(200):
+            if until():
+                return
+            await asyncio.sleep(0.01)
+    finally:
+        await pool.stop()
+
+
+async def test_worker_retries_with_backoff_then_acks():
+    queue = InMemoryJobQueue()
+    pipeline = FlakyPipeline(failures=1)
+    await queue.enqueue("job", {"story_id": "6ad3fd10429b544b428e40f5", "parameters": {}})
+    pool = StoryWorkerPool(queue, pipeline, concurrency=1, poll_interval=0.01, retry_delay=0.05)
+    await run_pool(pool, queue, lambda: not queue.jobs)
+    assert pipeline.runs == 2
+    assert not queue.jobs
+
+
+async def test_worker_gives_up_after_max_attempts():
+    queue = InMemoryJobQueue()
+    pipeline = FlakyPipeline(failures=10)
+    await queue.enqueue("job", {"story_id": "6ad3fd10429b544b428e40f5", "parameters": {}})
+    pool = StoryWorkerPool(queue, pipeline, concurrency=1, max_attempts=3, poll_interval=0.01, retry_delay=0.01)
+    await run_pool(pool, queue, lambda: not queue.jobs)
+    assert pipeline.runs == 3
+    assert not queue.jobs
@@ -0,0 +1,90 @@
+import asyncio
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+from benchmarks.fakes import FakeBatchProvider, LatencyModel
+from services.llm_batch import LLMBatcher
+from services.llm_router import LLMRouter
+
+
+@pytest.fixture
+def db():
+    return AsyncMongoMockClient().test_batches
+
+
+def batch_provider(error_rate=0.0):
+    return FakeBatchProvider(
+        "anthropic",
+        LatencyModel(0.0, sigma=0.0),
+        LatencyModel(0.02, sigma=0.0, error_rate=error_rate)
+    )
+
+
+def batcher_for(provider, db):
+    return LLMBatcher(LLMRouter([provider], hedge=False), db, window=0.01, poll_interval=0.01)
+
+
+async def complete_all(batcher, prompts):
+    with batcher.activate():
+        return await asyncio.gather(*(batcher.router.complete("system", prompt, {}) for prompt in prompts))
+
+
+async def test_calls_go_out_as_one_batch_and_are_checkpointed(db):
+    provider = batch_provider()
+    batcher = batcher_for(provider, db)
+    responses = await complete_all(batcher, ["a", "b", "c", "a"])
+    assert [response.text for response in responses] == ["a", "b", "c", "a"]
+    assert len(provider.batches) == 1
+    assert provider.batched_requests == 3
+    assert batcher.counts["deduplicated"] == 1
+    assert await db.llm_batch_requests.count_documents({"status": "done"}) == 3
+
+
+async def test_resumed_run_reuses_finished_results(db):
+    await complete_all(batcher_for(batch_provider(), db), ["a", "b"])
+
+    # As after a restart: a new batcher and provider, same checkpoints
+    provider = batch_provider()
+    batcher = batcher_for(provider, db)
+    responses = await complete_all(batcher, ["a", "b", "c"])
+    assert [response.text for response in responses] == ["a", "b", "c"]
+    assert batcher.counts["resumed"] == 2
+    assert provider.batched_requests == 1
+
+
+async def test_resumed_run_collects_a_submitted_batch(db):
+    provider = batch_provider()
+    batcher = batcher_for(provider, db)
+    request_id = batcher.request_id("system", "a", {})
+    batch_id = await provider.submit_batch({request_id: ("system", "a", {})})
+    await db.llm_batch_requests.insert_one({
+        "_id": request_id, "provider": provider.name, "batch_id": batch_id, "status": "submitted"
+    })
+
+    responses = await complete_all(batcher, ["a"])
+    assert responses[0].text == "a"
+    assert batcher.counts["resumed"] == 1
+    # Collected from the earlier batch, not submitted again
+    assert len(provider.batches) == 1
+    assert (await db.llm_batch_requests.find_one({"_id": request_id}))["status"] == "done"
+
+
+async def test_failed_batch_requests_are_sent_directly(db):
+    provider = batch_provider(error_rate=1.0)
+    batcher = batcher_for(provider, db)
+    responses = await complete_all(batcher, ["a", "b"])
+    assert [response.text for response in responses] == ["a", "b"]
+    assert batcher.counts["direct"] == 2
+
+
+async def test_refused_submission_falls_back_to_direct_calls(db):
+    provider = batch_provider()
+
+    async def refuse(requests):
+        raise RuntimeError("batch API unavailable")
+
+    provider.submit_batch = refuse
+    batcher = batcher_for(provider, db)
+    responses = await complete_all(batcher, ["a", "b"])
+    assert [response.text for response in responses] == ["a", "b"]
+    assert batcher.counts["direct"] == 2
+    assert batcher.counts["batches"] == 0
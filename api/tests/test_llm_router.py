@@ -0,0 +1,70 @@
+import asyncio
+import pytest
+from benchmarks.fakes import FakeProvider, LatencyModel
+from services.llm_router import LLMRouter, LLMUsage
+
+
+def provider(name, mean=0.0, error_rate=0.0, text=None):
+    return FakeProvider(name, LatencyModel(mean, sigma=0.0, error_rate=error_rate), text=text or name)
+
+
+async def test_routes_to_the_fastest_provider():
+    slow, fast = provider("slow", 0.05), provider("fast", 0.01)
+    router = LLMRouter([slow, fast], hedge=False)
+    # Both are tried once while unmeasured, then the faster one is preferred
+    for _ in range(2):
+        await router.complete("system", "prompt", {})
+    response = await router.complete("system", "prompt", {})
+    assert response.text == "fast"
+    assert router.ranked()[0] is fast
+
+
+async def test_fails_over_to_the_next_provider():
+    broken, backup = provider("broken", error_rate=1.0), provider("backup", 0.01)
+    router = LLMRouter([broken, backup], hedge=False)
+    response = await router.complete("system", "prompt", {})
+    assert response.text == "backup"
+    assert broken.calls == 1
+    assert router.stats["broken"].errors == 1
+
+
+async def test_raises_when_every_provider_fails():
+    router = LLMRouter([provider("a", error_rate=1.0), provider("b", error_rate=1.0)], hedge=False)
+    with pytest.raises(RuntimeError):
+        await router.complete("system", "prompt", {})
+
+
+async def test_failing_provider_cools_down():
+    broken, backup = provider("broken", error_rate=1.0), provider("backup", 0.01)
+    router = LLMRouter([broken, backup], hedge=False, cooldown_threshold=2, cooldown=60)
+    for _ in range(2):
+        router.stats["broken"].record_error(router.cooldown, router.cooldown_threshold)
+    assert router.ranked() == [backup, broken]
+
+
+async def test_hedges_a_slow_provider_and_cancels_the_loser():
+    slow, fast = provider("slow", 0.5), provider("fast", 0.01)
+    router = LLMRouter([slow, fast], hedge=True, hedge_delay=0.05, min_hedge_delay=0.0)
+    # Unmeasured providers rank by order, so the slow one goes first
+    response = await router.complete("system", "prompt", {})
+    await asyncio.sleep(0)
+    assert response.text == "fast"
+    assert slow.calls == fast.calls == 1
+    assert slow.cancelled == 1
+
+
+async def test_no_hedge_before_the_delay():
+    first, second = provider("first", 0.01), provider("second", 0.01)
+    router = LLMRouter([first, second], hedge=True, hedge_delay=1.0)
+    response = await router.complete("system", "prompt", {})
+    assert response.text == "first"
+    assert second.calls == 0
+
+
+async def test_stream_fails_over_before_the_first_chunk():
+    broken = provider("broken", error_rate=1.0)
+    backup = FakeProvider("backup", LatencyModel(0.01, sigma=0.0), text="once upon a time")
+    router = LLMRouter([broken, backup], hedge=False)
+    chunks = [chunk async for chunk in router.stream("system", "prompt", {})]
+    assert "".join(chunk for chunk in chunks if isinstance(chunk, str)) == "once upon a time"
+    assert isinstance(chunks[-1], LLMUsage)
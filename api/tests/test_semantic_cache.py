@@ -0,0 +1,123 @@
+import numpy as np
+from benchmarks.fakes import FakeNarrativeArchitect, LatencyModel
+from services.cache import MemoryCacheBackend, ResultCache
+from services.semantic_cache import HASHED_THRESHOLD, HashedNgramEmbedder, SemanticCache, VectorIndex
+from services.stage_memo import StageMemo
+
+# Labelled theme pairs the hashed embedder's threshold is calibrated on
+SAME_THEME = [
+    ("A girl befriends a lion", "the girl befriends the lion!"),
+    ("girl befriends lion", "girls befriending lions"),
+    ("a boy learns to share", "a boy learning to share"),
+    ("Anansi the spider tricks the sky god", "anansi the spider tricked the sky god"),
+    ("a brave girl befriends a lion", "a brave little girl befriends a lion"),
+]
+DIFFERENT_THEME = [
+    ("girl befriends lion", "lion befriends girl"),
+    ("the hare beats the tortoise", "the tortoise beats the hare"),
+    ("afraid", "not afraid"),
+    ("a girl who is afraid of the dark", "a girl who is not afraid of the dark"),
+    ("a boy learns to share", "a girl learns to share"),
+]
+
+
+class SynonymEmbedder:
+    # Stands in for a sentence model: synonyms share a dimension
+    dim = 4
+    offload = False
+    CONCEPTS = {"brave": 0, "courageous": 0, "honest": 1, "truthful": 1, "greedy": 2}
+
+    def embed(self, text):
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for word in text.lower().split():
+            vector[self.CONCEPTS.get(word, 3)] += 1.0
+        return vector / np.linalg.norm(vector)
+
+
+def similarity(embedder, a, b):
+    return float(embedder.embed(a) @ embedder.embed(b))
+
+
+def test_hashed_embedder_matches_rewordings_only():
+    embedder = HashedNgramEmbedder()
+    for a, b in SAME_THEME:
+        assert similarity(embedder, a, b) >= HASHED_THRESHOLD, (a, b)
+    for a, b in DIFFERENT_THEME:
+        assert similarity(embedder, a, b) < HASHED_THRESHOLD, (a, b)
+
+
+async def test_paraphrase_hits():
+    cache = SemanticCache(SynonymEmbedder(), threshold=0.9)
+    await cache.store("scope", "brave", {"status": "success", "result": "outline"})
+    assert await cache.lookup("outline", "scope", "courageous") == {"status": "success", "result": "outline"}
+    assert await cache.lookup("outline", "scope", "honest") is None
+    assert cache.stats()["hits"] == 1
+
+
+async def test_role_swap_misses():
+    cache = SemanticCache(HashedNgramEmbedder(), threshold=HASHED_THRESHOLD)
+    await cache.store("scope", "a girl befriends a lion", {"status": "success", "result": "girl first"})
+    assert await cache.lookup("outline", "scope", "the lion befriends the girl") is None
+    assert await cache.lookup("outline", "scope", "the girl befriends the lion") is not None
+
+
+async def test_entries_only_match_within_their_scope():
+    cache = SemanticCache(SynonymEmbedder(), threshold=0.9)
+    await cache.store("ages 6-8", "brave", {"status": "success", "result": "young"})
+    assert await cache.lookup("outline", "ages 9-12", "brave") is None
+    assert await cache.lookup("outline", "ages 6-8", "brave") == {"status": "success", "result": "young"}
+
+
+def test_least_recently_used_entry_is_evicted():
+    embedder = HashedNgramEmbedder()
+    index = VectorIndex(embedder.dim, max_entries=2)
+    for text in ("lion", "tortoise"):
+        index.add("scope", VectorIndex.key_for("scope", text), embedder.embed(text), text)
+    index.touch(index.slots[VectorIndex.key_for("scope", "lion")])
+    index.add("scope", VectorIndex.key_for("scope", "spider"), embedder.embed("spider"), "spider")
+    assert sorted(index.payloads[:index.size]) == ["lion", "spider"]
+    assert index.evicted == 1
+
+
+async def test_index_survives_a_restart(tmp_path):
+    path = str(tmp_path / "semantic.npz")
+    cache = SemanticCache(HashedNgramEmbedder(), threshold=HASHED_THRESHOLD, path=path, save_every=1)
+    await cache.store("scope", "a girl befriends a lion", {"status": "success", "result": "outline"})
+    assert cache.unsaved == 0
+    restarted = SemanticCache(HashedNgramEmbedder(), threshold=HASHED_THRESHOLD, path=path)
+    assert await restarted.lookup("outline", "scope", "girl befriending a lion") == {"status": "success", "result": "outline"}
+
+
+async def test_workers_merge_their_entries_into_the_shared_file(tmp_path):
+    path = str(tmp_path / "semantic.npz")
+    first, second = (
+        SemanticCache(HashedNgramEmbedder(), threshold=HASHED_THRESHOLD, path=path, save_every=10)
+        for _ in range(2)
+    )
+    await first.store("scope", "a girl befriends a lion", {"status": "success", "result": "lion"})
+    await second.store("scope", "the tortoise races the hare", {"status": "success", "result": "race"})
+    await first.save()
+    await second.save()
+    # The second worker picked up the first's entry, and the file has both
+    assert await second.lookup("outline", "scope", "girl befriends lion") is not None
+    restarted = SemanticCache(HashedNgramEmbedder(), path=path)
+    assert restarted.index.size == 2
+
+
+async def test_failed_save_keeps_entries_unsaved(tmp_path):
+    cache = SemanticCache(HashedNgramEmbedder(), path=str(tmp_path / "missing" / "semantic.npz"), save_every=10)
+    await cache.store("scope", "a girl befriends a lion", {"status": "success", "result": "lion"})
+    await cache.save()
+    assert cache.unsaved == 1
+
+
+async def test_stage_memo_serves_near_duplicate_outlines():
+    semantic = SemanticCache(HashedNgramEmbedder(), threshold=HASHED_THRESHOLD)
+    memo = StageMemo(ResultCache(MemoryCacheBackend()), semantic=semantic)
+    agent = FakeNarrativeArchitect("Narrative Architect", LatencyModel(0.0, sigma=0.0))
+    first = await memo.call("outline", agent, "generate_outline", theme="A girl befriends a lion", age_group="6-8", tone="warm")
+    again = await memo.call("outline", agent, "generate_outline", theme="the girl befriends the lion", age_group="6-8", tone="warm")
+    other_age = await memo.call("outline", agent, "generate_outline", theme="the girl befriends the lion", age_group="9-12", tone="warm")
+    assert again == first
+    assert other_age != first
+    assert memo.stats()["outline"]["semantic_hits"] == 1
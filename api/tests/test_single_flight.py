@@ -0,0 +1,110 @@
+import asyncio
+import pytest
+from services.llm_router import current_llm_batch
+from services.single_flight import SingleFlight, InMemoryLeaseStore, flight_key
+
+
+def worker(leases, **kwargs):
+    # One SingleFlight per simulated process, sharing the lease store
+    return SingleFlight("test", leases, lease_ttl=0.3, poll_interval=0.01, **kwargs)
+
+
+async def test_concurrent_local_calls_share_one_computation():
+    flights, calls = SingleFlight("test"), []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.02)
+        return "result"
+
+    results = await asyncio.gather(*(flights.do("key", compute) for _ in range(4)))
+    assert results == ["result"] * 4
+    assert len(calls) == 1
+    assert flights.stats()["coalesced_local"] == 3
+
+
+async def test_remote_caller_waits_for_the_leader():
+    leases, cache, calls = InMemoryLeaseStore(), {}, []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        cache["key"] = "result"
+        return "result"
+
+    async def lookup():
+        return cache.get("key")
+
+    leader, follower = worker(leases), worker(leases)
+    leading = asyncio.create_task(leader.do("key", compute, lookup=lookup))
+    await asyncio.sleep(0.01)
+    assert await follower.do("key", compute, lookup=lookup) == "result"
+    assert await leading == "result"
+    assert len(calls) == 1
+    assert follower.coalesced["remote"] == 1
+
+
+async def test_expired_lease_is_taken_over():
+    leases, calls = InMemoryLeaseStore(), []
+    # A leader that died mid-computation: its lease is never renewed
+    await leases.acquire("test:key", "dead", 0.05)
+
+    async def compute():
+        calls.append(1)
+        return "result"
+
+    async def lookup():
+        return None
+
+    assert await worker(leases).do("key", compute, lookup=lookup) == "result"
+    assert calls == [1]
+    assert not await leases.held("test:key")
+
+
+async def test_leader_failure_hands_over_to_a_waiter():
+    leases, cache = InMemoryLeaseStore(), {}
+
+    async def failing():
+        await asyncio.sleep(0.03)
+        raise RuntimeError("provider down")
+
+    async def compute():
+        return "result"
+
+    async def lookup():
+        return cache.get("key")
+
+    leading = asyncio.create_task(worker(leases).do("key", failing, lookup=lookup))
+    await asyncio.sleep(0.01)
+    assert await worker(leases).do("key", compute, lookup=lookup) == "result"
+    with pytest.raises(RuntimeError):
+        await leading
+
+
+async def test_long_running_leader_keeps_its_lease():
+    leases, calls = InMemoryLeaseStore(), []
+
+    async def compute():
+        calls.append(1)
+        # Outlives the lease ttl; the leader renews it meanwhile
+        await asyncio.sleep(0.5)
+        return "result"
+
+    async def lookup():
+        return None
+
+    leading = asyncio.create_task(worker(leases).do("key", compute, lookup=lookup))
+    await asyncio.sleep(0.4)
+    assert await leases.held("test:key")
+    await leading
+    assert calls == [1]
+
+
+def test_batch_calls_get_their_own_flights():
+    token = current_llm_batch.set(object())
+    try:
+        batched = flight_key("key")
+    finally:
+        current_llm_batch.reset(token)
+    assert flight_key("key") == "key"
+    assert batched != "key"
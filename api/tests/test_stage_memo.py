@@ -0,0 +1,62 @@
+import asyncio
+from benchmarks.fakes import FakeNarrativeArchitect, LatencyModel
+from services.cache import MemoryCacheBackend, ResultCache
+from services.stage_memo import StageMemo
+
+
+class CountingArchitect(FakeNarrativeArchitect):
+    def __init__(self, temperature=0.7):
+        super().__init__("Narrative Architect", LatencyModel(0.01, sigma=0.0))
+        self.parameters.values["temperature"] = temperature
+        self.calls = 0
+
+    async def generate_outline(self, theme, age_group, tone):
+        self.calls += 1
+        return await super().generate_outline(theme, age_group, tone)
+
+
+def memo():
+    return StageMemo(ResultCache(MemoryCacheBackend()))
+
+
+async def test_repeated_stage_is_served_from_the_memo():
+    stage_memo, agent = memo(), CountingArchitect()
+    first = await stage_memo.call("outline", agent, "generate_outline", theme="courage", age_group="6-8", tone="warm")
+    second = await stage_memo.call("outline", agent, "generate_outline", theme="courage", age_group="6-8", tone="warm")
+    assert first == second
+    assert agent.calls == 1
+    assert stage_memo.stats()["outline"]["hits"] == 1
+
+
+async def test_whitespace_does_not_change_the_key():
+    stage_memo, agent = memo(), CountingArchitect()
+    await stage_memo.call("outline", agent, "generate_outline", theme="courage  and\nfriendship", age_group="6-8", tone="warm")
+    await stage_memo.call("outline", agent, "generate_outline", theme=" courage and friendship", age_group="6-8", tone="warm")
+    assert agent.calls == 1
+
+
+async def test_different_inputs_or_parameters_miss():
+    stage_memo = memo()
+    agent, hotter = CountingArchitect(), CountingArchitect(temperature=0.9)
+    await stage_memo.call("outline", agent, "generate_outline", theme="courage", age_group="6-8", tone="warm")
+    await stage_memo.call("outline", agent, "generate_outline", theme="courage", age_group="9-12", tone="warm")
+    await stage_memo.call("outline", hotter, "generate_outline", theme="courage", age_group="6-8", tone="warm")
+    assert agent.calls == 2
+    assert hotter.calls == 1
+
+
+async def test_failed_results_are_not_memoized():
+    stage_memo, agent = memo(), CountingArchitect()
+    inputs = {"theme": "courage", "age_group": "6-8", "tone": "warm"}
+    await stage_memo.store("outline", agent, inputs, {"status": "error", "error": "timeout"})
+    assert await stage_memo.lookup("outline", agent, inputs) is None
+
+
+async def test_concurrent_identical_stages_share_one_call():
+    stage_memo, agent = memo(), CountingArchitect()
+    results = await asyncio.gather(*(
+        stage_memo.call("outline", agent, "generate_outline", theme="courage", age_group="6-8", tone="warm")
+        for _ in range(5)
+    ))
+    assert agent.calls == 1
+    assert all(result == results[0] for result in results)
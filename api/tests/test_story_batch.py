@@ -0,0 +1,62 @@
+from datetime import datetime, timedelta
+from mongomock_motor import AsyncMongoMockClient
+from services.story_batch import StoryBatchRunner
+
+
+class RecordingPipeline:
+    def __init__(self, db):
+        self.db = db
+        self.runs = []
+
+    async def create_stories(self, parameter_sets):
+        result = await self.db.stories.insert_many([{"parameters": p, "status": "queued"} for p in parameter_sets])
+        return result.inserted_ids
+
+    async def run_story(self, story_id, parameters, resume=False):
+        self.runs.append((story_id, resume))
+        await self.db.stories.update_one({"_id": story_id}, {"$set": {"status": "completed"}})
+
+
+def runner_for():
+    pipeline = RecordingPipeline(AsyncMongoMockClient().test_batches)
+    return StoryBatchRunner(pipeline, max_concurrency=2), pipeline
+
+
+async def test_batch_runs_every_story():
+    runner, pipeline = runner_for()
+    batch_id = await runner.create([{"theme": f"theme {i}"} for i in range(3)])
+    state = await runner.run(batch_id)
+    assert state["status"] == "completed"
+    assert state["completed"] == 3
+    assert len(pipeline.runs) == 3
+
+
+async def test_resume_only_runs_unfinished_stories():
+    runner, pipeline = runner_for()
+    batch_id = await runner.create([{"theme": f"theme {i}"} for i in range(3)])
+    batch = await pipeline.db.story_batches.find_one({"_id": batch_id})
+    done = batch["story_ids"][0]
+    await pipeline.db.stories.update_one({"_id": done}, {"$set": {"status": "completed"}})
+    await pipeline.db.story_batches.update_one({"_id": batch_id}, {"$set": {"status": "interrupted"}})
+
+    await runner.run(batch_id, resume=True)
+    assert sorted(story_id for story_id, _ in pipeline.runs) == sorted(batch["story_ids"][1:])
+    assert all(resume for _, resume in pipeline.runs)
+
+
+async def test_a_running_batch_is_claimed_once():
+    runner, pipeline = runner_for()
+    batch_id = await runner.create([{"theme": "theme"}])
+    assert await runner.claim(batch_id)
+    # Another worker, or a second resume request, is refused
+    assert not await StoryBatchRunner(pipeline).claim(batch_id)
+
+
+async def test_a_batch_left_by_a_dead_worker_can_be_claimed():
+    runner, pipeline = runner_for()
+    batch_id = await runner.create([{"theme": "theme"}])
+    await pipeline.db.story_batches.update_one({"_id": batch_id}, {"$set": {
+        "status": "running",
+        "heartbeat_at": datetime.utcnow() - timedelta(seconds=runner.lease_timeout + 1),
+    }})
+    assert await runner.claim(batch_id)
@@ -0,0 +1,62 @@
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+from benchmarks.run import build_pipeline, parse_args, story_parameters
+
+
+def pipeline_for(tmp_path):
+    args = parse_args(["--llm-latency", "0", "--image-latency", "0", "--scenes", "2"])
+    return build_pipeline(args, AsyncMongoMockClient(), str(tmp_path))
+
+
+async def test_story_runs_every_stage(tmp_path):
+    pipeline = pipeline_for(tmp_path)
+    parameters = story_parameters(0, 0.0)
+    story_id = await pipeline.create_story(parameters)
+    await pipeline.run_story(story_id, parameters)
+    story = await pipeline.db.stories.find_one({"_id": story_id})
+    assert story["status"] == "completed"
+    assert set(pipeline.STAGE_PROGRESS[stage][1] for stage in pipeline.STAGE_PROGRESS) <= set(story["steps"])
+
+
+async def test_resume_skips_recorded_stages(tmp_path):
+    pipeline = pipeline_for(tmp_path)
+    parameters = story_parameters(1, 0.0)
+    story_id = await pipeline.create_story(parameters)
+    # A previous attempt got through the outline before its worker died
+    await pipeline.db.stories.update_one(
+        {"_id": story_id},
+        {"$set": {"outline_generated": "Premise: a saved outline."}, "$push": {"steps": "outline_generated"}}
+    )
+
+    async def no_outline(**inputs):
+        raise AssertionError("outline regenerated on resume")
+
+    pipeline._fake_agents["narrative_architect"].generate_outline = no_outline
+    await pipeline.run_story(story_id, parameters, resume=True)
+    story = await pipeline.db.stories.find_one({"_id": story_id})
+    assert story["status"] == "completed"
+    assert story["outline_generated"] == "Premise: a saved outline."
+
+
+async def test_failed_stage_marks_the_story_failed(tmp_path):
+    pipeline = pipeline_for(tmp_path)
+    parameters = story_parameters(2, 0.0)
+    story_id = await pipeline.create_story(parameters)
+
+    async def broken(**inputs):
+        return {"status": "error", "error": "provider down"}
+
+    pipeline._fake_agents["narrative_architect"].generate_outline = broken
+    with pytest.raises(Exception):
+        await pipeline.run_story(story_id, parameters)
+    story = await pipeline.db.stories.find_one({"_id": story_id})
+    assert story["status"] == "failed"
+
+
+async def test_batch_stories_are_created_in_one_insert(tmp_path):
+    pipeline = pipeline_for(tmp_path)
+    story_ids = await pipeline.create_stories([story_parameters(i, 0.0) for i in range(3)])
+    assert len(story_ids) == 3
+    stories = await pipeline.db.stories.find({"_id": {"$in": story_ids}}).to_list(length=None)
+    assert {story["status"] for story in stories} == {"in_progress"}
+    assert [story["parameters"]["theme"] for story in stories] == ["Folktale 0", "Folktale 1", "Folktale 2"]
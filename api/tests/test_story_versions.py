@@ -0,0 +1,40 @@
+import orjson
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+from benchmarks.run import build_pipeline, parse_args, story_parameters
+
+
+async def read_page(stream):
+    return orjson.loads(b"".join([chunk async for chunk in stream]))
+
+
+async def completed_story(tmp_path, **overrides):
+    args = parse_args(["--llm-latency", "0", "--image-latency", "0", "--scenes", "3"])
+    pipeline = build_pipeline(args, AsyncMongoMockClient(), str(tmp_path))
+    parameters = {**story_parameters(0, 0.0), **overrides}
+    story_id = await pipeline.create_story(parameters)
+    await pipeline.run_story(story_id, parameters)
+    return pipeline, story_id
+
+
+async def test_history_is_paged_newest_first(tmp_path):
+    pipeline, story_id = await completed_story(tmp_path)
+    for i in range(3):
+        await pipeline.versions.record(story_id, "plot", f"plot {i}", {"outline": "o"})
+
+    # Timestamps may collide; the cursor still never skips or repeats a version
+    first = await read_page(pipeline.versions.history(story_id, "plot", limit=2))
+    assert len(first["items"]) == 2
+    assert first["next_cursor"]
+    rest = await read_page(pipeline.versions.history(story_id, "plot", cursor=first["next_cursor"], limit=2))
+    assert rest["next_cursor"] is None
+    ids = [item["_id"] for item in first["items"] + rest["items"]]
+    assert len(set(ids)) == len(ids) == 3
+
+
+async def test_regenerated_illustration_respects_the_scene_cap(tmp_path):
+    pipeline, story_id = await completed_story(tmp_path, max_scenes=1)
+    story = await pipeline.regenerate_illustration(story_id, 0)
+    assert len(story["illustrations"]) == 1
+    with pytest.raises(ValueError):
+        await pipeline.regenerate_illustration(story_id, 1)
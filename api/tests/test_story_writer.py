@@ -0,0 +1,80 @@
+import asyncio
+from mongomock_motor import AsyncMongoMockClient
+from services.story_writer import StoryWriter
+
+
+async def writer_with_story(durability, **kwargs):
+    db = AsyncMongoMockClient().test_writer
+    result = await db.stories.insert_one({"status": "in_progress", "progress": 0, "steps": []})
+    return StoryWriter(db, durability=durability, **kwargs), db, result.inserted_id
+
+
+def count_illustration_batches(writer):
+    batches = []
+    save = writer.save_illustrations
+
+    async def counting(records):
+        batches.append(len(records))
+        await save(records)
+
+    writer.save_illustrations = counting
+    return batches
+
+
+async def test_stage_mode_writes_each_stage():
+    writer, db, story_id = await writer_with_story("stage")
+    await writer.update_progress(story_id, "outline_generated", "An outline", 20)
+    story = await db.stories.find_one({"_id": story_id})
+    assert story["outline_generated"] == "An outline"
+    assert story["progress"] == 20
+    assert story["steps"] == ["outline_generated"]
+
+
+async def test_coalesced_mode_merges_updates_within_the_interval():
+    writer, db, story_id = await writer_with_story("coalesced", flush_interval=0.05)
+    await writer.update_progress(story_id, "outline_generated", "An outline", 20)
+    await writer.update_progress(story_id, "cultural_validated", "Validated", 40)
+    assert "outline_generated" not in await db.stories.find_one({"_id": story_id})
+    await asyncio.sleep(0.1)
+    story = await db.stories.find_one({"_id": story_id})
+    assert story["steps"] == ["outline_generated", "cultural_validated"]
+    assert story["progress"] == 40
+
+
+async def test_final_mode_only_writes_on_completion():
+    writer, db, story_id = await writer_with_story("final")
+    await writer.update_progress(story_id, "outline_generated", "An outline", 20)
+    assert "outline_generated" not in await db.stories.find_one({"_id": story_id})
+    await writer.complete(story_id, {"status": "completed", "outline": "An outline"}, aliases={"outline": "outline_generated"})
+    story = await db.stories.find_one({"_id": story_id})
+    assert story["status"] == "completed"
+    assert story["outline"] == "An outline"
+    assert writer.pending == {}
+
+
+async def test_stage_mode_batches_illustrations():
+    writer, db, story_id = await writer_with_story("stage", illustration_batch_size=3)
+    batches = count_illustration_batches(writer)
+    for scene in range(4):
+        await writer.add_illustration(story_id, {"story_id": story_id, "scene": scene})
+    assert batches == [3]
+    await writer.complete(story_id, {"status": "completed"})
+    assert batches == [3, 1]
+    assert await db.illustrations.count_documents({"story_id": story_id}) == 4
+
+
+async def test_stage_write_carries_pending_illustrations():
+    writer, db, story_id = await writer_with_story("stage")
+    batches = count_illustration_batches(writer)
+    await writer.add_illustration(story_id, {"story_id": story_id, "scene": 0})
+    assert batches == []
+    await writer.update_progress(story_id, "plot_developed", "A plot", 80)
+    assert batches == [1]
+
+
+async def test_failure_is_recorded():
+    writer, db, story_id = await writer_with_story("final")
+    await writer.fail(story_id, "provider down")
+    story = await db.stories.find_one({"_id": story_id})
+    assert story["status"] == "failed"
+    assert story["error"] == "provider down"
@@ -0,0 +1,27 @@
+import asyncio
+import logging
+import os
+from main import create_worker_pool, story_events, mongo_client, cache
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Standalone generation worker: pulls story jobs from the shared Redis queue
+# so API nodes and workers scale independently
+async def run_workers() -> None:
+    pool = create_worker_pool(int(os.getenv("WORKER_CONCURRENCY", "4")))
+    # Progress reaches /api/story/{id}/events subscribers on the API nodes
+    # through the relay, and coalesced stories follow flights run elsewhere
+    story_events.start()
+    pool.start()
+    logger.info(f"Story worker started with concurrency {pool.concurrency}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await pool.stop()
+        await story_events.stop()
+        await cache.close()
+        mongo_client.close()
+
+if __name__ == "__main__":
+    asyncio.run(run_workers())
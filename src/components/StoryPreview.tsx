@@ -1,6 +1,6 @@
 import React from 'react';
 import ReactMarkdown from 'react-markdown';
-import { Story } from '../services/api';
+import { Story, illustrationSrc, illustrationSrcSet } from '../services/api';
 import { Edit2, Save, X } from 'lucide-react';
 import * as Slider from '@radix-ui/react-slider';
 
@@ -169,7 +169,11 @@ export const StoryPreview: React.FC<StoryPreviewProps> = ({ story, onSave }) =>
         {story.illustrations.map((url, index) => (
           <div key={index} className="relative aspect-square group">
             <img
-              src={url}
+              src={illustrationSrc(url, 512)}
+              srcSet={illustrationSrcSet(url)}
+              sizes="(min-width: 896px) 416px, 50vw"
+              loading="lazy"
+              decoding="async"
               alt={`Story illustration ${index + 1}`}
               className="rounded-lg shadow-md object-cover w-full h-full"
               style={{
@@ -30,9 +30,25 @@ export interface Story {
   illustrations: string[];
   parameters: StoryParameters;
   status: string;
+  progress?: number;
   created_at: string;
 }
 
+export const RENDITION_SIZES = [256, 512, 1024] as const;
+
+export const API_ORIGIN = API_BASE_URL.replace(/\/api$/, '');
+
+// Illustrations stored as /api/assets/<digest> can be fetched as resized WebP
+export const illustrationSrc = (url: string, size?: number) => {
+  if (!url.startsWith('/api/assets/')) return url;
+  return size ? `${API_ORIGIN}${url}?size=${size}&format=webp` : `${API_ORIGIN}${url}`;
+};
+
+export const illustrationSrcSet = (url: string) => {
+  if (!url.startsWith('/api/assets/')) return undefined;
+  return RENDITION_SIZES.map((size) => `${illustrationSrc(url, size)} ${size}w`).join(', ');
+};
+
 export const generateStory = async (parameters: StoryParameters) => {
   try {
     const response = await axios.post<{
@@ -47,6 +63,53 @@ export const generateStory = async (parameters: StoryParameters) => {
   }
 };
 
+export interface StoryEvent {
+  event: 'queued' | 'stage' | 'illustration' | 'completed' | 'failed' | 'snapshot';
+  data: {
+    step?: string;
+    progress?: number;
+    result?: unknown;
+    scene?: number;
+    filepath?: string;
+    url?: string;
+    story?: Story;
+    error?: string;
+  };
+}
+
+export const startStory = async (parameters: StoryParameters) => {
+  try {
+    const response = await axios.post<{
+      status: string;
+      story_id: string;
+      events_url: string;
+    }>(`${API_BASE_URL}/story/start`, parameters);
+    return response.data;
+  } catch (error) {
+    console.error('Error starting story:', error);
+    throw error;
+  }
+};
+
+export const subscribeToStory = (
+  storyId: string,
+  onEvent: (event: StoryEvent) => void
+) => {
+  const source = new EventSource(`${API_BASE_URL}/story/${storyId}/events`);
+  const eventTypes: StoryEvent['event'][] = ['queued', 'stage', 'illustration', 'completed', 'failed', 'snapshot'];
+
+  eventTypes.forEach((type) => {
+    source.addEventListener(type, (message) => {
+      onEvent({ event: type, data: JSON.parse((message as MessageEvent).data) });
+      if (type === 'completed' || type === 'failed') {
+        source.close();
+      }
+    });
+  });
+
+  return () => source.close();
+};
+
 export const getStory = async (storyId: string) => {
   try {
     const response = await axios.get<Story>(`${API_BASE_URL}/story/${storyId}`);
@@ -57,9 +120,19 @@ export const getStory = async (storyId: string) => {
   }
 };
 
+export interface ExportState {
+  status: 'running' | 'ready';
+  export_id: string;
+  format: 'pdf' | 'epub';
+  progress: number;
+  download_url?: string;
+}
+
+// Starts the export, or reports on the one already running; call again until
+// status is 'ready'. Unchanged stories come back ready straight from the cache.
 export const exportStory = async (storyId: string, format: 'pdf' | 'epub') => {
   try {
-    const response = await axios.get(
+    const response = await axios.get<ExportState>(
       `${API_BASE_URL}/story/${storyId}/export/${format}`
     );
     return response.data;
@@ -67,4 +140,34 @@ export const exportStory = async (storyId: string, format: 'pdf' | 'epub') => {
     console.error('Error exporting story:', error);
     throw error;
   }
-};
\ No newline at end of file
+};
+export interface Regeneration {
+  status: string;
+  revision: number;
+  recomputed: string[];
+  reused: string[];
+  // Outputs built from something that has since changed, e.g. 'plot' or 'illustration:2'
+  stale: string[];
+  characters?: string;
+  plot?: string;
+  illustrations: string[];
+}
+
+const regenerate = async (path: string, body?: object) => {
+  try {
+    const response = await axios.post<Regeneration>(`${API_BASE_URL}/story/${path}`, body);
+    return response.data;
+  } catch (error) {
+    console.error('Error regenerating story:', error);
+    throw error;
+  }
+};
+
+export const regenerateIllustration = (storyId: string, scene: number, prompt?: string) =>
+  regenerate(`${storyId}/regenerate/illustration/${scene}`, prompt ? { prompt } : undefined);
+
+export const regenerateCharacter = (storyId: string, name: string, instructions?: string, cascade = false) =>
+  regenerate(`${storyId}/regenerate/character?cascade=${cascade}`, { name, instructions });
+
+export const regeneratePlot = (storyId: string, cascade = true) =>
+  regenerate(`${storyId}/regenerate/plot?cascade=${cascade}`);
@@ -1,7 +1,7 @@
 import create from 'zustand';
-import { exportStory as apiExportStory } from '../services/api';
-import { toPdf } from 'html-to-image';
-import { jsPDF } from 'jspdf';
+import { exportStory as apiExportStory, API_ORIGIN } from '../services/api';
+
+const EXPORT_POLL_MS = 500;
 
 interface ExportState {
   isExporting: boolean;
@@ -29,21 +29,19 @@ export const useExportStore = create<ExportState>((set) => ({
         error: null,
       });
 
-      // Simulate progress updates
-      const progressInterval = setInterval(() => {
-        set((state) => ({
-          exportProgress: Math.min(state.exportProgress + 10, 90),
-        }));
-      }, 500);
-
-      const result = await apiExportStory(storyId, format);
+      // The server renders the file; follow its progress until it is ready
+      let result = await apiExportStory(storyId, format);
+      while (result.status !== 'ready') {
+        set({ exportProgress: result.progress });
+        await new Promise((resolve) => setTimeout(resolve, EXPORT_POLL_MS));
+        result = await apiExportStory(storyId, format);
+      }
 
-      clearInterval(progressInterval);
       set({ exportProgress: 100 });
 
       // Trigger download
       const link = document.createElement('a');
-      link.href = result.download_url;
+      link.href = `${API_ORIGIN}${result.download_url}`;
       link.download = `story-${storyId}.${format}`;
       document.body.appendChild(link);
       link.click();
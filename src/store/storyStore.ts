@@ -1,5 +1,5 @@
 import create from 'zustand';
-import { StoryParameters, Story, generateStory } from '../services/api';
+import { StoryParameters, Story, startStory, subscribeToStory } from '../services/api';
 
 interface StoryState {
   isGenerating: boolean;
@@ -27,23 +27,31 @@ export const useStoryStore = create<StoryState>((set, get) => ({
 
   generateStory: async () => {
     try {
-      set({ isGenerating: true, error: null });
+      set({ isGenerating: true, error: null, generationProgress: 0 });
 
-      // Simulate progress updates
-      const progressInterval = setInterval(() => {
-        set((state) => ({
-          generationProgress: Math.min(state.generationProgress + 10, 90),
-        }));
-      }, 1000);
+      const { story_id } = await startStory(get().parameters as StoryParameters);
 
-      const result = await generateStory(get().parameters as StoryParameters);
-      
-      clearInterval(progressInterval);
-      
-      set({
-        currentStory: result.story,
-        generationProgress: 100,
-        isGenerating: false,
+      // Progress and partial results are pushed by the server as stages finish
+      await new Promise<void>((resolve, reject) => {
+        subscribeToStory(story_id, ({ event, data }) => {
+          // A snapshot is sent when the story is not running on the server
+          // that answered; the EventSource reconnects to follow it
+          const progress = event === 'snapshot' ? data.story?.progress : data.progress;
+          if ((event === 'stage' || event === 'snapshot') && progress !== undefined) {
+            set((state) => ({
+              generationProgress: Math.max(state.generationProgress, progress ?? 0),
+            }));
+          } else if (event === 'completed' && data.story) {
+            set({
+              currentStory: data.story,
+              generationProgress: 100,
+              isGenerating: false,
+            });
+            resolve();
+          } else if (event === 'failed') {
+            reject(new Error(data.error ?? 'Story generation failed'));
+          }
+        });
       });
     } catch (error) {
       set({